@@ -1,8 +1,9 @@
 from django.contrib import admin
 from .models import (
-    Barbershop, UserProfile, Barber, Service, Customer, CustomerBarbershop, LoyaltyReward, Appointment,
-    Availability, ScheduleException, Transaction, Promotion, Product
+    Barbershop, UserProfile, Barber, Service, Customer, CustomerBarbershop, LoyaltyLedger, LoyaltyReward, Appointment,
+    Availability, ScheduleException, Transaction, DailyFinancialRollup, Promotion, Product
 )
+from .rollups import record_transactions
 
 @admin.register(Barbershop)
 class BarbershopAdmin(admin.ModelAdmin):
@@ -31,6 +32,25 @@ class CustomerAdmin(admin.ModelAdmin):
 class CustomerBarbershopAdmin(admin.ModelAdmin):
     list_display = ['customer', 'barbershop', 'total_spent', 'points', 'last_visit']
     list_filter = ['barbershop', 'last_visit']
+    # Saldo em cache do LoyaltyLedger: alterações passam pelo LoyaltyService
+    readonly_fields = ['points']
+
+
+@admin.register(LoyaltyLedger)
+class LoyaltyLedgerAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'barbershop', 'kind', 'points', 'description', 'created_at']
+    list_filter = ['barbershop', 'kind']
+    search_fields = ['customer__name', 'customer__phone']
+
+    # Somente leitura: lançamentos e saldo são gravados juntos pelo LoyaltyService
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(LoyaltyReward)
@@ -64,6 +84,19 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ['barbershop', 'type', 'status', 'category', 'payment_method']
     search_fields = ['description']
 
+    def delete_queryset(self, request, queryset):
+        # Exclusão em massa não passa pelo Transaction.delete(): desconta dos rollups antes
+        from django.db import transaction
+        with transaction.atomic():
+            record_transactions(queryset, sign=-1)
+            queryset.delete()
+
+@admin.register(DailyFinancialRollup)
+class DailyFinancialRollupAdmin(admin.ModelAdmin):
+    list_display = ['barbershop', 'day', 'type', 'status', 'payment_method', 'total', 'count']
+    list_filter = ['barbershop', 'type', 'status', 'payment_method']
+    date_hierarchy = 'day'
+    readonly_fields = ['barbershop', 'day', 'type', 'status', 'payment_method', 'total', 'count']
 
 @admin.register(Promotion)
 class PromotionAdmin(admin.ModelAdmin):
@@ -0,0 +1,284 @@
+"""
+Séries de analytics por barbearia: faturamento por barbeiro, agendamentos por dia
+da semana, ocupação das cadeiras e receitas/despesas, agrupados por dia/semana/mês.
+
+Os agendamentos são lidos de `AppointmentDailyRollup`, atualizado de forma
+incremental a cada consulta: só os pares (barbeiro, dia) com agendamentos
+alterados desde a última atualização (marca d'água em
+`Barbershop.rollups_refreshed_at`) ou marcados como `stale` são recalculados.
+As finanças vêm de `DailyFinancialRollup`. A ocupação (minutos reservados ÷
+minutos disponíveis) é calculada com NumPy sobre a matriz barbeiro × dia montada a partir das jornadas semanais e exceções.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import ExtractWeekDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    Appointment, AppointmentDailyRollup, Availability, Barber, Barbershop, DailyAvailability,
+    DailyFinancialRollup, ScheduleException,
+)
+
+BUCKETS = ('day', 'week', 'month')
+MAX_RANGE_DAYS = 1096
+ANALYTICS_CACHE_TIMEOUT = 600
+# Folga da marca d'água, como SYNC_OVERLAP_SECONDS em api.changes
+ROLLUP_OVERLAP_SECONDS = 5
+
+# Status que ocupam a cadeira para fins de ocupação e contagem de agendamentos
+OCCUPYING_STATUSES = ('confirmed', 'completed', 'pending')
+WEEKDAY_LABELS = ['Domingo', 'Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado']
+
+
+def _day_bounds(first_day, last_day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(first_day, datetime.min.time()), tz)
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), datetime.min.time()), tz)
+    return start, end
+
+
+def _touched_filter(touched, barber_field, day_lookup):
+    """Q que cobre só os pares (barbeiro, dia) afetados: um termo por dia com os barbeiros daquele dia"""
+    by_day = defaultdict(set)
+    for barber_id, day in touched:
+        by_day[day].add(barber_id)
+    condition = Q(pk__in=[])
+    for day, barber_ids in by_day.items():
+        condition |= Q(**{f'{barber_field}__in': barber_ids, **day_lookup(day)})
+    return condition
+
+
+def _appointment_day(day):
+    start, end = _day_bounds(day, day)
+    return {'date__gte': start, 'date__lt': end}
+
+
+def refresh_appointment_rollups(barbershop):
+    """
+    Recalcula os pares (barbeiro, dia) afetados desde a última atualização.
+    Retorna quantos foram reconstruídos (0 quando nada mudou).
+
+    Roda com a linha da barbearia travada (select_for_update): duas consultas
+    simultâneas não apagam e recriam os mesmos dias ao mesmo tempo. A marca
+    d'água volta ROLLUP_OVERLAP_SECONDS para pegar agendamentos gravados antes
+    do início da última atualização mas ainda não commitados naquele momento.
+    """
+    with transaction.atomic():
+        watermark = (
+            Barbershop.objects.select_for_update().filter(pk=barbershop.pk)
+            .values_list('rollups_refreshed_at', flat=True).first()
+        )
+        started = timezone.now()
+        rollups = AppointmentDailyRollup.objects.filter(barbershop=barbershop)
+
+        changed = Appointment.objects.filter(barbershop=barbershop)
+        if watermark:
+            changed = changed.filter(updated_at__gte=watermark - timedelta(seconds=ROLLUP_OVERLAP_SECONDS))
+        touched = {
+            (barber_id, timezone.localdate(date))
+            for barber_id, date in changed.values_list('barber_id', 'date').iterator()
+        }
+        touched |= set(rollups.filter(stale=True).values_list('barber_id', 'day'))
+        if not touched:
+            return 0
+
+        appointments = (
+            Appointment.objects.filter(_touched_filter(touched, 'barber_id', _appointment_day), barbershop=barbershop)
+            .order_by()
+            .values('id', 'barber_id', 'date', 'status', 'slot__start_time', 'slot__end_time')
+            .annotate(revenue=Sum('services__price'))
+        )
+        totals = defaultdict(lambda: [0, 0, Decimal('0')])
+        for row in appointments.iterator():
+            entry = totals[(row['barber_id'], timezone.localdate(row['date']), row['status'])]
+            entry[0] += 1
+            if row['slot__start_time'] and row['slot__end_time']:
+                entry[1] += int((row['slot__end_time'] - row['slot__start_time']).total_seconds() // 60)
+            entry[2] += row['revenue'] or 0
+
+        rollups.filter(_touched_filter(touched, 'barber_id', lambda day: {'day': day})).delete()
+        AppointmentDailyRollup.objects.bulk_create(
+            [
+                AppointmentDailyRollup(
+                    barbershop=barbershop, barber_id=barber_id, day=day, status=status,
+                    bookings=bookings, booked_minutes=minutes, service_revenue=revenue, refreshed_at=started,
+                )
+                for (barber_id, day, status), (bookings, minutes, revenue) in totals.items()
+            ],
+            batch_size=1000,
+        )
+        # Marca d'água explícita: avança mesmo quando os dias afetados ficaram sem linhas
+        Barbershop.objects.filter(pk=barbershop.pk).update(rollups_refreshed_at=started)
+    return len(touched)
+
+
+def _bucket_expression(bucket):
+    return {'day': F('day'), 'week': TruncWeek('day'), 'month': TruncMonth('day')}[bucket]
+
+
+def _bucket_starts(days, bucket):
+    """Início do bucket de cada dia (datetime64[D]), igual ao TruncWeek/TruncMonth do banco"""
+    if bucket == 'week':
+        # 1970-01-01 foi quinta-feira: desloca para a segunda-feira da semana ISO
+        monday_offset = (days.astype('int64') + 3) % 7
+        return days - monday_offset.astype('timedelta64[D]')
+    if bucket == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+
+def _minutes(start_time, end_time):
+    return (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+
+
+def available_minutes(barbershop, barber_ids, first_day, last_day):
+    """
+    Matriz (barbeiros × dias) de minutos disponíveis, seguindo a mesma prioridade
+    do cálculo de horários: bloqueio do dia inteiro > DailyAvailability >
+    horário estendido > jornada semanal; bloqueios parciais são descontados.
+    """
+    days = np.arange(np.datetime64(first_day), np.datetime64(last_day) + 1, dtype='datetime64[D]')
+    index = {barber_id: i for i, barber_id in enumerate(barber_ids)}
+
+    def day_index(day):
+        return (np.datetime64(day) - days[0]).astype(int)
+
+    # Jornada semanal: minutos por barbeiro e dia da semana (0=Domingo), espalhados por todos os dias
+    template = np.zeros((len(barber_ids), 7))
+    for barber_id, dow, start, end in Availability.objects.filter(
+        barbershop=barbershop, barber_id__in=barber_ids, is_active=True
+    ).values_list('barber_id', 'day_of_week', 'start_time', 'end_time'):
+        template[index[barber_id], dow] += max(_minutes(start, end), 0)
+    weekdays = (days.astype('int64') + 4) % 7
+    available = template[:, weekdays]
+
+    # Substituições por data: DailyAvailability tem prioridade sobre horário estendido
+    overrides = defaultdict(float)
+    overridden_by_daily = set()
+    for barber_id, date, start, end in DailyAvailability.objects.filter(
+        barbershop=barbershop, barber_id__in=barber_ids, is_active=True, date__gte=first_day, date__lte=last_day
+    ).values_list('barber_id', 'date', 'start_time', 'end_time'):
+        overrides[(barber_id, date)] += max(_minutes(start, end), 0)
+        overridden_by_daily.add((barber_id, date))
+
+    exceptions = list(
+        ScheduleException.objects.filter(
+            Q(barber_id__in=barber_ids) | Q(barber__isnull=True),
+            barbershop=barbershop, date__gte=first_day, date__lte=last_day,
+        ).values_list('barber_id', 'date', 'type', 'start_time', 'end_time')
+    )
+    for barber_id, date, type, start, end in exceptions:
+        if type == 'extended' and barber_id and start and end and (barber_id, date) not in overridden_by_daily:
+            overrides[(barber_id, date)] += max(_minutes(start, end), 0)
+
+    for (barber_id, date), minutes in overrides.items():
+        available[index[barber_id], day_index(date)] = minutes
+
+    for barber_id, date, type, start, end in exceptions:
+        if type != 'blocked':
+            continue
+        rows = [index[barber_id]] if barber_id else slice(None)
+        col = day_index(date)
+        if start is None and end is None:
+            available[rows, col] = 0
+        elif start and end:
+            available[rows, col] = np.maximum(available[rows, col] - max(_minutes(start, end), 0), 0)
+
+    return days, available
+
+
+def utilization_series(barbershop, barbers, first_day, last_day, bucket):
+    barber_ids = [b.id for b in barbers]
+    if not barber_ids:
+        return []
+    days, available = available_minutes(barbershop, barber_ids, first_day, last_day)
+
+    booked = np.zeros_like(available)
+    index = {barber_id: i for i, barber_id in enumerate(barber_ids)}
+    for barber_id, day, minutes in (
+        AppointmentDailyRollup.objects.filter(
+            barbershop=barbershop, barber_id__in=barber_ids, day__gte=first_day, day__lte=last_day,
+            status__in=OCCUPYING_STATUSES,
+        ).values_list('barber_id', 'day').annotate(minutes=Sum('booked_minutes'))
+    ):
+        booked[index[barber_id], (np.datetime64(day) - days[0]).astype(int)] = minutes
+
+    # Soma por bucket com uma multiplicação de matrizes (dias -> buckets)
+    bucket_keys, inverse = np.unique(_bucket_starts(days, bucket), return_inverse=True)
+    one_hot = np.zeros((len(days), len(bucket_keys)))
+    one_hot[np.arange(len(days)), inverse] = 1
+    available_by_bucket = available @ one_hot
+    booked_by_bucket = booked @ one_hot
+    ratio = np.divide(
+        booked_by_bucket, available_by_bucket,
+        out=np.zeros_like(booked_by_bucket), where=available_by_bucket > 0,
+    )
+
+    series = []
+    for b, barber in enumerate(barbers):
+        for k, key in enumerate(bucket_keys):
+            series.append({
+                'bucket': str(key),
+                'barber_id': barber.id,
+                'barber_name': barber.name,
+                'booked_minutes': int(booked_by_bucket[b, k]),
+                'available_minutes': int(available_by_bucket[b, k]),
+                'utilization': round(float(ratio[b, k]), 4),
+            })
+    return series
+
+
+def build_analytics(barbershop, first_day, last_day, bucket):
+    refresh_appointment_rollups(barbershop)
+    bucket_expr = _bucket_expression(bucket)
+    rollups = AppointmentDailyRollup.objects.filter(barbershop=barbershop, day__gte=first_day, day__lte=last_day)
+    barbers = list(Barber.objects.filter(barbershop=barbershop).only('id', 'name').order_by('name'))
+    names = {b.id: b.name for b in barbers}
+
+    revenue = [
+        {
+            'bucket': row['bucket'].isoformat(),
+            'barber_id': row['barber_id'],
+            'barber_name': names.get(row['barber_id']),
+            'revenue': float(row['revenue']),
+            'bookings': row['bookings'],
+        }
+        for row in rollups.filter(status='completed').annotate(bucket=bucket_expr)
+        .values('bucket', 'barber_id').annotate(revenue=Sum('service_revenue'), bookings=Sum('bookings'))
+        .order_by('bucket', 'barber_id')
+    ]
+
+    by_weekday = dict(
+        rollups.filter(status__in=OCCUPYING_STATUSES).annotate(weekday=ExtractWeekDay('day'))
+        .values_list('weekday').annotate(total=Sum('bookings')).order_by()
+    )
+    # ExtractWeekDay: 1=Domingo ... 7=Sábado
+    bookings_by_weekday = [
+        {'weekday': i, 'label': label, 'bookings': by_weekday.get(i + 1, 0)}
+        for i, label in enumerate(WEEKDAY_LABELS)
+    ]
+
+    finance = [
+        {'bucket': row['bucket'].isoformat(), 'income': float(row['income']), 'expense': float(row['expense'])}
+        for row in DailyFinancialRollup.objects.filter(
+            barbershop=barbershop, day__gte=first_day, day__lte=last_day, status='paid'
+        ).annotate(bucket=bucket_expr).values('bucket').annotate(
+            income=Sum('total', filter=Q(type='income'), default=0),
+            expense=Sum('total', filter=Q(type='expense'), default=0),
+        ).order_by('bucket')
+    ]
+
+    return {
+        'start': first_day.isoformat(),
+        'end': last_day.isoformat(),
+        'bucket': bucket,
+        'revenue_by_barber': revenue,
+        'bookings_by_weekday': bookings_by_weekday,
+        'utilization': utilization_series(barbershop, barbers, first_day, last_day, bucket),
+        'finance': finance,
+    }
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # Registra as lápides (post_delete) usadas pela sincronização incremental
+        from . import changes  # noqa: F401
+        # Publica os eventos ao vivo da agenda (SSE)
+        from . import events  # noqa: F401
+        # Versão 'config' (ETag) e cache de slugs invalidados nas escritas
+        from . import conditional  # noqa: F401
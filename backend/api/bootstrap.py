@@ -0,0 +1,135 @@
+"""
+Carga inicial da página de agendamento (`/b/<slug>/`) numa única resposta.
+
+Em vez de config, serviços, barbeiros e uma consulta de horários por dia, o
+PWA busca `public/bootstrap/`: barbearia, serviços e barbeiros ativos e, para
+os próximos BOOTSTRAP_DAYS dias, se há algum horário livre (e com quais
+barbeiros). A disponibilidade de todos os barbeiros e dias sai de um número
+fixo de consultas, independente de quantos barbeiros ou dias há, e o cálculo
+reaproveita `BookingService.compute_available_slots` com o serviço mais curto.
+
+A resposta fica em cache por barbearia e dia, com a versão 'config'
+(api.conditional) e a versão 'slots', incrementada junto de cada evento
+`slots.changed` (api.events). O TTL curto cobre os horários de hoje que vão
+ficando no passado.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import tenant_cache_key, tenant_version
+from .models import Availability, Barber, DailyAvailability, ScheduleException, Service, TimeSlot
+from .serializers import BarberSerializer, BarbershopSerializer, ServiceSerializer
+from .services import BookingService
+
+BOOTSTRAP_DAYS = 7
+
+
+def cache_key(request, barbershop, today):
+    # O host entra na chave: as URLs absolutas de imagem dependem dele
+    return tenant_cache_key(
+        barbershop.id, 'slots', 'bootstrap', tenant_version(barbershop.id, 'config'), today.isoformat(), request.get_host(),
+    )
+
+
+def _week_queries(barbershop, barber_ids, start, end):
+    """Mesmos filtros de `BookingService._slot_queries`, para vários barbeiros e dias de uma vez"""
+    return {
+        'exceptions': ScheduleException.objects.filter(
+            Q(barber_id__in=barber_ids) | Q(barber__isnull=True),
+            barbershop=barbershop, date__range=(start, end), type__in=['blocked', 'extended'],
+        ).values_list('barber_id', 'date', 'type', 'start_time', 'end_time', 'reason'),
+        'daily': DailyAvailability.objects.filter(
+            barber_id__in=barber_ids, barbershop=barbershop, date__range=(start, end), is_active=True
+        ).values_list('barber_id', 'date', 'start_time', 'end_time'),
+        'weekly': Availability.objects.filter(
+            barber_id__in=barber_ids, barbershop=barbershop, is_active=True
+        ).values_list('barber_id', 'day_of_week', 'start_time', 'end_time'),
+        'busy': TimeSlot.objects.filter(
+            appointment__barber_id__in=barber_ids,
+            appointment__barbershop=barbershop,
+            appointment__status__in=['confirmed', 'blocked'],
+            start_time__date__range=(start, end),
+        ).order_by('start_time').values_list('appointment__barber_id', 'start_time', 'end_time'),
+    }
+
+
+def _slot_inputs(barber, service, day, rows):
+    """Entrada de `compute_available_slots` para um barbeiro e dia, na mesma prioridade do caminho por dia"""
+    inputs = {
+        'duration': service.duration,
+        'buffer': max(service.buffer_time, barber.buffer_minutes),
+        'day_block': None,
+        'intervals': [],
+        'busy': [],
+        'partial_blocks': [],
+    }
+    blocked = [row for row in rows['blocked'][day] if row[0] in (barber.id, None)]
+    day_block = [reason for _, start, end, reason in blocked if start is None and end is None]
+    if day_block:
+        inputs['day_block'] = day_block
+        return inputs
+
+    django_day = (day.weekday() + 1) % 7
+    for intervals in (rows['daily'][barber.id, day], rows['extended'][barber.id, day], rows['weekly'][barber.id, django_day]):
+        if intervals:
+            inputs['intervals'] = intervals
+            break
+    if inputs['intervals']:
+        inputs['busy'] = rows['busy'][barber.id, day]
+        inputs['partial_blocks'] = [
+            (start, end, reason) for _, start, end, reason in blocked if start is not None and end is not None
+        ]
+    return inputs
+
+
+async def _availability(barbershop, barbers, services, today):
+    days = [today + timedelta(days=i) for i in range(BOOTSTRAP_DAYS)]
+    summary = {day.isoformat(): {'has_slots': False, 'barbers': []} for day in days}
+    if not barbers or not services:
+        return summary
+
+    # O serviço mais curto decide: se ele não cabe no dia, nenhuma combinação cabe
+    shortest = min(services, key=lambda s: (s.duration + s.buffer_time, s.id))
+    queries = _week_queries(barbershop, [b.id for b in barbers], days[0], days[-1])
+    rows = {
+        'blocked': defaultdict(list), 'extended': defaultdict(list),
+        'daily': defaultdict(list), 'weekly': defaultdict(list), 'busy': defaultdict(list),
+    }
+    async for barber_id, day, type, start, end, reason in queries['exceptions']:
+        if type == 'blocked':
+            rows['blocked'][day].append((barber_id, start, end, reason))
+        elif barber_id is not None:
+            rows['extended'][barber_id, day].append((start, end))
+    async for barber_id, day, start, end in queries['daily']:
+        rows['daily'][barber_id, day].append((start, end))
+    async for barber_id, django_day, start, end in queries['weekly']:
+        rows['weekly'][barber_id, django_day].append((start, end))
+    async for barber_id, start, end in queries['busy']:
+        rows['busy'][barber_id, timezone.localdate(start)].append((start, end))
+
+    now = timezone.now()
+    for day in days:
+        entry = summary[day.isoformat()]
+        for barber in barbers:
+            slots, _ = BookingService.compute_available_slots(_slot_inputs(barber, shortest, day, rows), day, now=now)
+            if slots:
+                entry['barbers'].append(barber.id)
+        entry['has_slots'] = bool(entry['barbers'])
+    return summary
+
+
+async def build_bootstrap(request, barbershop):
+    """Monta a resposta (barbearia já resolvida): 6 consultas, quaisquer que sejam barbeiros e dias"""
+    services = [s async for s in Service.objects.filter(barbershop=barbershop, is_active=True)]
+    barbers = [b async for b in Barber.objects.filter(barbershop=barbershop, is_active=True)]
+    return {
+        'barbershop': BarbershopSerializer(barbershop, context={'request': request}).data,
+        'services': ServiceSerializer(services, many=True).data,
+        'barbers': BarberSerializer(barbers, many=True, context={'request': request}).data,
+        'availability': await _availability(barbershop, barbers, services, timezone.localdate()),
+        'generated_at': timezone.now(),
+    }
+
@@ -0,0 +1,51 @@
+"""
+Cache por barbearia com invalidação por versão.
+
+Cada barbearia tem um contador por escopo (ex.: 'analytics'). As chaves das
+respostas incluem a versão atual; alterar os dados só incrementa o contador e
+as entradas antigas deixam de ser lidas (e expiram pelo TTL). Assim a
+invalidação é O(1), sem listar ou apagar chaves.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(barbershop_id, scope):
+    return f"tenant:{barbershop_id}:{scope}:version"
+
+
+def _initial_version():
+    # Se o contador sumiu do cache (reinício/evicção), começa num valor novo para
+    # nunca reaproveitar uma versão que já teve respostas gravadas
+    return int(time.time() * 1000)
+
+
+def tenant_version(barbershop_id, scope):
+    key = _version_key(barbershop_id, scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_tenant_version(barbershop_id, scope):
+    """Invalida o escopo da barbearia depois do commit da transação atual"""
+    if not barbershop_id:
+        return
+
+    def bump():
+        key = _version_key(barbershop_id, scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), timeout=None)
+
+    transaction.on_commit(bump)
+
+
+def tenant_cache_key(barbershop_id, scope, *parts):
+    suffix = ':'.join(str(p) for p in parts)
+    return f"tenant:{barbershop_id}:{scope}:v{tenant_version(barbershop_id, scope)}:{suffix}"
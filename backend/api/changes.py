@@ -0,0 +1,151 @@
+"""
+Sincronização incremental (delta sync) para o painel e o PWA.
+
+O cliente carrega as listas uma vez e depois chama `/changes/?since=<token>`:
+recebe só as linhas criadas/alteradas (por `updated_at`, com índice
+(barbershop, updated_at)) e os ids excluídos (lápides em `Tombstone`) desde o
+token, além do token para a próxima chamada.
+
+O token é o instante da consulta. Como `updated_at` é preenchido antes do
+commit, a busca volta SYNC_OVERLAP_SECONDS para não perder escritas que
+confirmaram atrasadas; as linhas repetidas são inofensivas (o cliente aplica
+por id).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Appointment, Customer, CustomerBarbershop, Product, Service, Tombstone
+
+SYNC_TYPES = ('appointments', 'customers', 'services', 'products')
+SYNC_OVERLAP_SECONDS = 5
+# Acima disso por tipo, é mais barato recarregar as listas do que aplicar o delta
+SYNC_MAX_ROWS = 1000
+
+
+class SyncError(ValueError):
+    def __init__(self, code, message, status=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def encode_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def decode_token(token):
+    try:
+        micros = int(token)
+        return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise SyncError('INVALID_SYNC_TOKEN', "Token de sincronização inválido.")
+
+
+def parse_types(value):
+    if not value:
+        return SYNC_TYPES
+    types = tuple(t for t in value.split(',') if t)
+    unknown = set(types) - set(SYNC_TYPES)
+    if unknown:
+        raise SyncError('INVALID_PARAMS', f"Tipos aceitos: {', '.join(SYNC_TYPES)}")
+    return types
+
+
+def _changed_rows(barbershop, type, since):
+    if type == 'appointments':
+        return (
+            Appointment.objects.filter(barbershop=barbershop, updated_at__gt=since)
+            .select_related('barber', 'customer', 'slot').prefetch_related('services')
+        )
+    if type == 'services':
+        return Service.objects.filter(barbershop=barbershop, updated_at__gt=since)
+    if type == 'products':
+        return Product.objects.filter(barbershop=barbershop, updated_at__gt=since)
+    # Clientes são globais: mudou o cadastro do cliente ou o vínculo com esta barbearia
+    links = CustomerBarbershop.objects.filter(barbershop=barbershop)
+    return Customer.objects.filter(
+        Q(id__in=links.filter(updated_at__gt=since).values('customer_id'))
+        | Q(id__in=links.values('customer_id'), updated_at__gt=since)
+    ).select_related('user')
+
+
+def _serializer_class(type):
+    from .serializers import AppointmentSerializer, CustomerSerializer, ProductSerializer, ServiceSerializer
+    return {
+        'appointments': AppointmentSerializer,
+        'customers': CustomerSerializer,
+        'services': ServiceSerializer,
+        'products': ProductSerializer,
+    }[type]
+
+
+def collect_changes(request, barbershop, token, types):
+    """Monta o delta desde o token (None: só devolve o token inicial)"""
+    now = timezone.now()
+    result = {"token": encode_token(now), "changes": {}}
+    if token is None:
+        return result
+
+    since = decode_token(token)
+    retention = timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+    if since < now - retention:
+        raise SyncError('SYNC_TOKEN_EXPIRED', "Token antigo demais: recarregue as listas.", status=410)
+    since -= timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    deleted = {type: [] for type in types}
+    for type, object_id in (
+        Tombstone.objects.filter(barbershop=barbershop, deleted_at__gt=since, type__in=types)
+        .order_by('deleted_at').values_list('type', 'object_id')
+    ):
+        deleted[type].append(str(object_id))
+
+    context = {'request': request}
+    for type in types:
+        rows = list(_changed_rows(barbershop, type, since).order_by('updated_at', 'id')[:SYNC_MAX_ROWS + 1])
+        if len(rows) > SYNC_MAX_ROWS:
+            raise SyncError('SYNC_TOO_MANY_CHANGES', "Muitas alterações: recarregue as listas.", status=410)
+        # Um id recriado depois de excluído não existe: a exclusão vale só se a linha não voltou
+        updated = _serializer_class(type)(rows, many=True, context=context).data
+        present = {str(row.id) for row in rows}
+        result["changes"][type] = {
+            "updated": updated,
+            "deleted": [object_id for object_id in deleted[type] if object_id not in present],
+        }
+    return result
+
+
+def _tombstone(type, barbershop_id, object_id):
+    if barbershop_id:
+        Tombstone.objects.create(barbershop_id=barbershop_id, type=type, object_id=object_id)
+
+
+@receiver(post_delete, sender=Appointment, dispatch_uid='tombstone_appointment')
+def _appointment_deleted(sender, instance, **kwargs):
+    _tombstone('appointments', instance.barbershop_id, instance.pk)
+
+
+@receiver(post_delete, sender=Service, dispatch_uid='tombstone_service')
+def _service_deleted(sender, instance, **kwargs):
+    _tombstone('services', instance.barbershop_id, instance.pk)
+
+
+@receiver(post_delete, sender=Product, dispatch_uid='tombstone_product')
+def _product_deleted(sender, instance, **kwargs):
+    _tombstone('products', instance.barbershop_id, instance.pk)
+
+
+@receiver(post_delete, sender=CustomerBarbershop, dispatch_uid='tombstone_customer')
+def _customer_unlinked(sender, instance, **kwargs):
+    # Cliente excluído (cascata) ou desvinculado: some da lista desta barbearia
+    _tombstone('customers', instance.barbershop_id, instance.customer_id)
+
+
+def purge_tombstones(days):
+    """Apaga lápides mais antigas que a retenção; tokens anteriores recebem 410"""
+    return Tombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
@@ -0,0 +1,185 @@
+"""
+GET condicional (ETag/304) para a configuração pública da barbearia.
+
+Config, serviços, barbeiros, recompensas e o manifest do PWA são buscados a
+cada abertura do app, mas quase nunca mudam. Cada barbearia tem uma versão
+'config' (api.caching) incrementada em qualquer escrita desses modelos; o ETag
+forte é essa versão + a variante da requisição (host, caminho com query,
+Accept e o dia local, em que o `trial_days_left` muda).
+
+Com o slug resolvido pelo cache (`cached_barbershop`, usado também pelo
+BarbershopMiddleware), um If-None-Match que ainda vale recebe 304 sem nenhuma
+query. As respostas levam `Cache-Control: public, max-age=0, must-revalidate,
+s-maxage=CONFIG_CACHE_SECONDS`: o navegador sempre revalida e o nginx
+(proxy_cache + proxy_cache_revalidate) guarda a cópia por alguns segundos.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .caching import bump_tenant_version, tenant_version
+from .models import Barber, Barbershop, LoyaltyReward, Service
+
+CONFIG_SCOPE = 'config'
+
+
+def _barbershop_key(slug):
+    return f"barbershop:slug:{slug}"
+
+
+def cached_barbershop(slug):
+    """Barbearia ativa pelo slug, lida do cache (ou do banco na primeira vez)"""
+    key = _barbershop_key(slug)
+    barbershop = cache.get(key)
+    if barbershop is None:
+        barbershop = Barbershop.objects.filter(slug=slug, is_active=True).first()
+        if barbershop is not None:
+            cache.set(key, barbershop, settings.BARBERSHOP_CACHE_SECONDS)
+    return barbershop
+
+
+async def acached_barbershop(slug):
+    key = _barbershop_key(slug)
+    barbershop = await cache.aget(key)
+    if barbershop is None:
+        barbershop = await Barbershop.objects.filter(slug=slug, is_active=True).afirst()
+        if barbershop is not None:
+            await cache.aset(key, barbershop, settings.BARBERSHOP_CACHE_SECONDS)
+    return barbershop
+
+
+def forget_barbershop(*slugs):
+    """Remove o slug do cache agora e de novo após o commit (uma leitura concorrente pode tê-lo regravado)"""
+    keys = [_barbershop_key(slug) for slug in set(slugs) if slug]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def config_changed(barbershop_id):
+    bump_tenant_version(barbershop_id, CONFIG_SCOPE)
+
+
+def image_processed(model, pk):
+    """O pipeline de imagens grava com update(): logo/banner/foto mudam fora dos sinais"""
+    if model is Barbershop:
+        slug = Barbershop.objects.filter(pk=pk).values_list('slug', flat=True).first()
+        forget_barbershop(slug)
+        config_changed(pk)
+    elif model is Barber:
+        config_changed(Barber.objects.filter(pk=pk).values_list('barbershop_id', flat=True).first())
+
+
+def config_etag(request, barbershop_id):
+    variant = '|'.join([
+        request.get_host(),
+        request.get_full_path(),
+        request.headers.get('Accept', ''),
+        settings.JSON_BACKEND,
+        timezone.localdate().isoformat(),
+    ])
+    digest = hashlib.sha1(variant.encode('utf-8')).hexdigest()[:16]
+    return f'"{barbershop_id}-{tenant_version(barbershop_id, CONFIG_SCOPE)}-{digest}"'
+
+
+def _barbershop_id(request, kwargs):
+    # Mesma ordem das views: middleware, slug da URL e ?barbershop_slug=. Sem slug
+    # (barbearia vinda do usuário logado) a resposta sai sem ETag.
+    barbershop = getattr(request, 'barbershop', None)
+    if barbershop is None:
+        slug = kwargs.get('barbershop_slug') or kwargs.get('slug') or request.GET.get('barbershop_slug')
+        barbershop = cached_barbershop(slug) if slug else None
+    return barbershop.id if barbershop else None
+
+
+def _request_etag(request, kwargs):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    barbershop_id = _barbershop_id(request, kwargs)
+    return config_etag(request, barbershop_id) if barbershop_id else None
+
+
+def _finalize(response, etag):
+    # O 304 repete ETag e Cache-Control (RFC 9110)
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=0, must_revalidate=True, s_maxage=settings.CONFIG_CACHE_SECONDS,
+        )
+        patch_vary_headers(response, ['Accept', 'X-Barbershop-Slug'])
+    return response
+
+
+def conditional_config(view):
+    """
+    Decorator de view (síncrona ou assíncrona): ETag da versão 'config' e 304
+    para If-None-Match atual, antes de autenticação, view e ORM.
+
+    A versão é lida antes da view: se uma escrita acontecer no meio, a resposta
+    sai com o ETag antigo e a próxima requisição recebe o conteúdo novo.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            etag = await sync_to_async(_request_etag)(request, kwargs)
+            if etag is None:
+                return await view(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return _finalize(response, etag)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        etag = _request_etag(request, kwargs)
+        if etag is None:
+            return view(request, *args, **kwargs)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return _finalize(response, etag)
+    return wrapper
+
+
+class ConditionalConfigMixin:
+    """ViewSets de configuração: o `list` passa pelo conditional_config"""
+    def dispatch(self, request, *args, **kwargs):
+        dispatch = super().dispatch
+        if self.action_map.get(request.method.lower()) == 'list':
+            dispatch = conditional_config(dispatch)
+        return dispatch(request, *args, **kwargs)
+
+
+@receiver(post_save, sender=Barbershop, dispatch_uid='config_barbershop_saved')
+@receiver(post_delete, sender=Barbershop, dispatch_uid='config_barbershop_deleted')
+def _barbershop_changed(sender, instance, **kwargs):
+    forget_barbershop(instance.slug, getattr(instance, '_loaded_slug', None))
+    config_changed(instance.pk)
+
+
+@receiver(post_save, sender=Service, dispatch_uid='config_service_saved')
+@receiver(post_delete, sender=Service, dispatch_uid='config_service_deleted')
+@receiver(post_save, sender=Barber, dispatch_uid='config_barber_saved')
+@receiver(post_delete, sender=Barber, dispatch_uid='config_barber_deleted')
+@receiver(post_save, sender=LoyaltyReward, dispatch_uid='config_reward_saved')
+@receiver(post_delete, sender=LoyaltyReward, dispatch_uid='config_reward_deleted')
+def _tenant_config_changed(sender, instance, **kwargs):
+    config_changed(instance.barbershop_id)
+
+
+@receiver(post_save, sender=User, dispatch_uid='config_barber_user_saved')
+def _barber_user_changed(sender, instance, created, update_fields=None, **kwargs):
+    # Barbeiros com ?expand=user mostram dados do usuário; o login só grava last_login
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    config_changed(Barber.objects.filter(user=instance).values_list('barbershop_id', flat=True).first())
@@ -0,0 +1,286 @@
+"""
+Eventos ao vivo da agenda (Server-Sent Events).
+
+As escritas publicam eventos pequenos depois do commit (`publish_after_commit`)
+num canal por barbearia; a view assíncrona `events_stream` mantém uma fila
+asyncio por conexão, então um processo ASGI segura milhares de conexões ociosas
+sem ocupar threads.
+
+O broker é plugável (settings.EVENTS_BROKER):
+- `LocalBroker`: pub/sub em memória, basta com um único processo;
+- `PostgresBroker`: publica com NOTIFY e cada processo escuta com LISTEN e
+  repassa para o seu LocalBroker (vários workers/containers).
+"""
+import asyncio
+import json
+import logging
+import secrets
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .caching import bump_tenant_version
+from .models import Appointment, Availability, DailyAvailability, ScheduleException
+
+logger = logging.getLogger(__name__)
+
+# Eventos por conexão aguardando envio; se o cliente não consumir, recebe um 'resync'
+SUBSCRIBER_QUEUE_SIZE = 100
+PG_CHANNEL = 'autoopera_events'
+
+
+def tenant_channel(barbershop_id):
+    return f"barbershop:{barbershop_id}"
+
+
+class Subscription:
+    """Fila de uma conexão; `deliver` pode ser chamado de qualquer thread"""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """Próximo evento, ou None se nada chegou dentro do timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def __aenter__(self):
+        self.broker.add(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.broker.remove(self)
+
+
+class LocalBroker:
+    """Pub/sub em memória (um processo)"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, subscription):
+        with self._lock:
+            self._subscribers[subscription.channel].add(subscription)
+
+    def remove(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def subscribe(self, channel):
+        return Subscription(self, channel)
+
+    def publish(self, channel, event):
+        self.dispatch(channel, event)
+
+    def dispatch(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+
+class PostgresBroker(LocalBroker):
+    """
+    Publica com pg_notify; cada processo mantém uma conexão assíncrona em LISTEN
+    (aberta na primeira assinatura) e entrega os eventos às suas filas locais.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def publish(self, channel, event):
+        payload = json.dumps({'channel': channel, 'event': event}, default=str)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [PG_CHANNEL, payload])
+
+    def subscribe(self, channel):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return super().subscribe(channel)
+
+    @staticmethod
+    def _conninfo():
+        from psycopg.conninfo import make_conninfo
+        db = settings.DATABASES['default']
+        return make_conninfo(
+            dbname=db.get('NAME'), user=db.get('USER'), password=db.get('PASSWORD'),
+            host=db.get('HOST') or None, port=db.get('PORT') or None,
+        )
+
+    async def _listen(self):
+        import psycopg
+
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self._conninfo(), autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {PG_CHANNEL}")
+                    async for notify in conn.notifies():
+                        message = json.loads(notify.payload)
+                        self.dispatch(message['channel'], message['event'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Conexão LISTEN de eventos caiu; reconectando")
+                await asyncio.sleep(2)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENTS_BROKER)()
+    return _broker
+
+
+def _ticket_key(ticket):
+    return f"sse:ticket:{ticket}"
+
+
+def issue_stream_ticket(user_id, barbershop_id):
+    """
+    Ticket de uso único para o stream: o EventSource não envia cabeçalhos, e o JWT
+    na URL ficaria nos logs de acesso do nginx/uvicorn. O ticket vale
+    SSE_TICKET_SECONDS, só para abrir o stream desta barbearia.
+    """
+    ticket = secrets.token_urlsafe(32)
+    cache.set(_ticket_key(ticket), (user_id, barbershop_id), settings.SSE_TICKET_SECONDS)
+    return ticket
+
+
+def redeem_stream_ticket(ticket):
+    """(user_id, barbershop_id) do ticket, ou None se não existe, expirou ou já foi usado"""
+    key = _ticket_key(ticket)
+    value = cache.get(key)
+    # Só quem conseguiu apagar a chave usa o ticket (duas conexões com o mesmo ticket: uma vence)
+    if value is None or not cache.delete(key):
+        return None
+    return value
+
+
+def publish_after_commit(barbershop_id, event):
+    """Publica o evento no canal da barbearia quando a transação atual confirmar"""
+    if not barbershop_id:
+        return
+
+    def publish():
+        try:
+            get_broker().publish(tenant_channel(barbershop_id), event)
+        except Exception:
+            # Eventos ao vivo são melhor esforço: nunca derrubam a escrita
+            logger.exception("Falha ao publicar evento %s", event.get('type'))
+
+    transaction.on_commit(publish)
+
+
+def appointment_event(type, appointment_id, barber_id, date, status):
+    return {
+        'type': type,
+        'appointment_id': appointment_id,
+        'barber_id': barber_id,
+        'date': timezone.localtime(date).isoformat() if date else None,
+        'status': status,
+    }
+
+
+def slots_event(barber_id, day):
+    """Horários livres mudaram; barber_id/date None = todos os barbeiros/dias"""
+    return {'type': 'slots.changed', 'barber_id': barber_id, 'date': day.isoformat() if day else None}
+
+
+def slots_changed(barbershop_id, barber_id, day):
+    """Publica `slots.changed` e invalida o resumo de disponibilidade em cache (bootstrap)"""
+    bump_tenant_version(barbershop_id, 'slots')
+    publish_after_commit(barbershop_id, slots_event(barber_id, day))
+
+
+STATUS_EVENTS = {'cancelled': 'appointment.cancelled', 'completed': 'appointment.completed'}
+# Status que ocupam o horário no cálculo de slots (BookingService e api.bootstrap)
+BUSY_STATUSES = ('confirmed', 'blocked')
+
+
+@receiver(post_save, sender=Appointment, dispatch_uid='events_appointment_saved')
+def _appointment_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_loaded_schedule', None)
+    current = (instance.status, instance.barber_id, instance.date)
+    instance._loaded_schedule = current
+
+    if created:
+        type = 'appointment.created'
+    elif previous and previous[0] != instance.status and instance.status in STATUS_EVENTS:
+        type = STATUS_EVENTS[instance.status]
+    else:
+        type = 'appointment.updated'
+    publish_after_commit(
+        instance.barbershop_id,
+        appointment_event(type, instance.pk, instance.barber_id, instance.date, instance.status),
+    )
+
+    # Criar, cancelar, mover ou entrar/sair dos status que ocupam o horário
+    # (pending -> confirmed, confirmed -> completed...) muda os horários livres
+    moved = previous is not None and previous[1:] != current[1:]
+    busy_changed = previous is not None and (previous[0] in BUSY_STATUSES) != (instance.status in BUSY_STATUSES)
+    if created or type == 'appointment.cancelled' or moved or busy_changed:
+        days = {(instance.barber_id, timezone.localdate(instance.date))}
+        if moved and previous[2]:
+            days.add((previous[1], timezone.localdate(previous[2])))
+        for barber_id, day in days:
+            slots_changed(instance.barbershop_id, barber_id, day)
+
+
+@receiver(post_delete, sender=Appointment, dispatch_uid='events_appointment_deleted')
+def _appointment_deleted(sender, instance, **kwargs):
+    publish_after_commit(
+        instance.barbershop_id,
+        appointment_event('appointment.deleted', instance.pk, instance.barber_id, instance.date, instance.status),
+    )
+    if instance.date:
+        slots_changed(instance.barbershop_id, instance.barber_id, timezone.localdate(instance.date))
+
+
+def _schedule_changed(sender, instance, **kwargs):
+    day = getattr(instance, 'date', None)
+    slots_changed(instance.barbershop_id, instance.barber_id, day)
+
+
+for _model, _uid in ((Availability, 'availability'), (DailyAvailability, 'daily_availability'), (ScheduleException, 'schedule_exception')):
+    post_save.connect(_schedule_changed, sender=_model, dispatch_uid=f'events_{_uid}_saved')
+    post_delete.connect(_schedule_changed, sender=_model, dispatch_uid=f'events_{_uid}_deleted')
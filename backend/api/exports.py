@@ -0,0 +1,250 @@
+"""
+Exportação de históricos (transações e agendamentos) em CSV ou XLSX via streaming.
+
+As linhas são lidas com `iterator(chunk_size=...)` (cursor no servidor no Postgres)
+e escritas conforme chegam; nem a queryset nem o arquivo ficam inteiros em memória.
+O XLSX é montado à mão (SpreadsheetML com strings inline) dentro de um zip gravado
+num buffer que é esvaziado a cada bloco de linhas.
+"""
+import csv
+import re
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Caracteres de controle não são permitidos em XML
+XML_INVALID_RE = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+# Textos que o Excel interpretaria como fórmula
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+
+
+class ExportError(ValueError):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def parse_date_range(params):
+    """
+    Lê start/end (YYYY-MM-DD, inclusivos) e devolve limites em datetime local
+    [início, fim) para usar o índice de `date` em vez de `date__date`.
+    """
+    try:
+        start = datetime.strptime(params['start'], '%Y-%m-%d').date() if params.get('start') else None
+        end = datetime.strptime(params['end'], '%Y-%m-%d').date() if params.get('end') else None
+    except ValueError:
+        raise ExportError('INVALID_DATE_FORMAT', "Use datas no formato YYYY-MM-DD.")
+    if start and end and end < start:
+        raise ExportError('INVALID_DATE_RANGE', "A data final deve ser posterior à inicial.")
+
+    tz = timezone.get_current_timezone()
+    start_at = timezone.make_aware(datetime.combine(start, datetime.min.time()), tz) if start else None
+    end_before = timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz) if end else None
+    return start_at, end_before
+
+
+def filter_date_range(queryset, params, field='date'):
+    start_at, end_before = parse_date_range(params)
+    if start_at:
+        queryset = queryset.filter(**{f"{field}__gte": start_at})
+    if end_before:
+        queryset = queryset.filter(**{f"{field}__lt": end_before})
+    return queryset
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if timezone.is_aware(value) else value.strftime('%Y-%m-%d %H:%M')
+    return str(value)
+
+
+def _csv_cell(value):
+    text = _cell_text(value)
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+class _Echo:
+    """Pseudo-arquivo para o csv.writer: devolve a linha em vez de gravá-la"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(_Echo(), delimiter=';')
+    # BOM para o Excel abrir UTF-8 com acentos corretamente
+    yield '\ufeff' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([_csv_cell(v) for v in row])
+
+
+class _StreamBuffer:
+    """Destino do zip sem seek: acumula bytes até o gerador consumi-los"""
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _column_name(index):
+    name = ''
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        name = chr(65 + rest) + name
+    return name
+
+
+def _xlsx_row(number, values):
+    cells = []
+    for i, value in enumerate(values):
+        ref = f"{_column_name(i)}{number}"
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+        else:
+            text = escape(XML_INVALID_RE.sub('', _cell_text(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+XLSX_STATIC_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _workbook_xml(sheet_name):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def iter_xlsx(header, rows, sheet_name='Dados'):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in XLSX_STATIC_PARTS.items():
+            zf.writestr(name, content)
+        zf.writestr('xl/workbook.xml', _workbook_xml(sheet_name))
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(1, header).encode('utf-8'))
+            block = []
+            for number, row in enumerate(rows, start=2):
+                block.append(_xlsx_row(number, row))
+                if len(block) >= EXPORT_CHUNK_SIZE:
+                    sheet.write(''.join(block).encode('utf-8'))
+                    block = []
+                    yield buffer.drain()
+            sheet.write(''.join(block).encode('utf-8'))
+            sheet.write(b'</sheetData></worksheet>')
+        yield buffer.drain()
+    yield buffer.drain()
+
+
+def streaming_export(header, rows, fmt, filename):
+    """Resposta em streaming para as linhas (um iterável de tuplas)"""
+    if fmt == 'xlsx':
+        response = StreamingHttpResponse(iter_xlsx(header, rows), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(iter_csv(header, rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+TRANSACTION_EXPORT_COLUMNS = [
+    ('date', 'Data'),
+    ('description', 'Descrição'),
+    ('category', 'Categoria'),
+    ('type', 'Tipo'),
+    ('status', 'Status'),
+    ('payment_method', 'Forma de Pagamento'),
+    ('amount', 'Valor'),
+]
+
+
+def transaction_rows(queryset):
+    fields = [field for field, _ in TRANSACTION_EXPORT_COLUMNS]
+    return queryset.order_by('date', 'id').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+APPOINTMENT_EXPORT_HEADER = [
+    'Data', 'Cliente', 'Telefone', 'Barbeiro', 'Serviços', 'Valor', 'Status', 'Pagamento', 'Origem'
+]
+
+
+def appointment_rows(queryset):
+    appointments = (
+        queryset.order_by('date', 'id')
+        .select_related('barber')
+        .prefetch_related('services')
+        .only('date', 'client_name', 'client_phone', 'status', 'payment_status', 'platform', 'barber__name')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for appointment in appointments:
+        services = list(appointment.services.all())
+        yield (
+            appointment.date,
+            appointment.client_name,
+            appointment.client_phone,
+            appointment.barber.name,
+            ", ".join(s.name for s in services),
+            sum((s.price for s in services), Decimal('0')),
+            appointment.status,
+            appointment.payment_status,
+            appointment.platform,
+        )
@@ -0,0 +1,256 @@
+"""
+Pipeline de processamento de imagens fora do ciclo da requisição.
+
+O upload original é gravado como veio; depois do commit, o redimensionamento e a
+recodificação rodam num pool de processos. Quando o arquivo otimizado fica pronto
+ele substitui o original no ImageField e `image_status` volta para 'ready'.
+
+Os jobs vivem só na memória do processo web: um restart ou deploy no meio do
+caminho deixa a linha em 'processing'. O comando `requeue_stale_images`
+reprocessa essas linhas.
+"""
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import features
+
+from .utils import ImageTooLarge, process_image_file, render_variant
+
+logger = logging.getLogger(__name__)
+
+# Largura máxima por campo de imagem
+IMAGE_MAX_WIDTHS = {
+    'logo': 800,
+    'banner': 1200,
+    'profile_picture': 800,
+}
+
+_executor = None
+
+
+def _get_executor():
+    """Pool de processos criado sob demanda (um por processo do servidor web, gunicorn ou uvicorn)"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=getattr(settings, 'IMAGE_PROCESSING_WORKERS', 2))
+    return _executor
+
+
+def schedule_image_processing(instance, field_names):
+    """Agenda a otimização dos campos informados para depois do commit da transação"""
+    model = instance.__class__
+    originals = {name: getattr(instance, name).name for name in field_names}
+    transaction.on_commit(partial(_submit, model, instance.pk, originals))
+
+
+def _build_jobs(originals):
+    jobs = []
+    for field_name, original_name in originals.items():
+        fd, tmp_path = tempfile.mkstemp(suffix='.jpg')
+        os.close(fd)
+        jobs.append((field_name, original_name, default_storage.path(original_name), tmp_path, IMAGE_MAX_WIDTHS.get(field_name, 800)))
+    return jobs
+
+
+def _run_jobs(jobs, max_pixels):
+    """Executado no processo filho: otimiza cada arquivo do lote"""
+    for _, _, src_path, tmp_path, max_width in jobs:
+        process_image_file(src_path, tmp_path, max_width=max_width, max_pixels=max_pixels)
+    return jobs
+
+
+def process_images_now(model, pk, originals):
+    """Processa no processo atual, sem o pool (IMAGE_PROCESSING_ASYNC=False e `requeue_stale_images`)"""
+    jobs = _build_jobs(originals)
+    try:
+        _run_jobs(jobs, settings.IMAGE_MAX_PIXELS)
+    except Exception:
+        logger.exception("Falha ao processar imagens de %s #%s", model.__name__, pk)
+        _mark_failed(model, pk, jobs)
+        return False
+    _swap_in(model, pk, jobs)
+    return True
+
+
+def _submit(model, pk, originals):
+    if not getattr(settings, 'IMAGE_PROCESSING_ASYNC', True):
+        process_images_now(model, pk, originals)
+        return
+
+    jobs = _build_jobs(originals)
+    future = _get_executor().submit(_run_jobs, jobs, settings.IMAGE_MAX_PIXELS)
+    future.add_done_callback(partial(_on_done, model, pk, jobs))
+
+
+def _on_done(model, pk, jobs, future):
+    # Roda numa thread do pool no processo web: usa conexões próprias e as fecha ao final
+    try:
+        if future.exception():
+            logger.error("Falha ao processar imagens de %s #%s: %s", model.__name__, pk, future.exception())
+            _mark_failed(model, pk, jobs)
+        else:
+            _swap_in(model, pk, jobs)
+    except Exception:
+        logger.exception("Erro ao aplicar imagens otimizadas de %s #%s", model.__name__, pk)
+    finally:
+        connections.close_all()
+
+
+def _swap_in(model, pk, jobs):
+    superseded = False
+    for field_name, original_name, _, tmp_path, _ in jobs:
+        stem = os.path.splitext(original_name)[0]
+        with open(tmp_path, 'rb') as f:
+            new_name = default_storage.save(f"{stem}.jpg", File(f))
+        os.remove(tmp_path)
+
+        # Só troca se o campo ainda aponta para o original (um novo upload vence)
+        updated = model.objects.filter(pk=pk, **{field_name: original_name}).update(**{field_name: new_name})
+        if not updated:
+            superseded = True
+        # Com storage deduplicado o arquivo pode estar em uso por outra linha: a limpeza fica com o gc_media
+        if not getattr(default_storage, 'deduplicates', False):
+            if updated and new_name != original_name:
+                default_storage.delete(original_name)
+            elif not updated:
+                default_storage.delete(new_name)
+
+    # Se houve novo upload no meio do caminho, o job dele é quem finaliza o status
+    if not superseded:
+        model.objects.filter(pk=pk).update(image_status='ready')
+    _invalidate_config(model, pk)
+
+
+def _mark_failed(model, pk, jobs):
+    for *_, tmp_path, _ in jobs:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    # O original continua servindo normalmente; apenas sinalizamos a falha
+    originals = {field_name: original_name for field_name, original_name, *_ in jobs}
+    model.objects.filter(pk=pk, **originals).update(image_status='failed')
+    _invalidate_config(model, pk)
+
+
+def _invalidate_config(model, pk):
+    # update() não dispara sinais: invalida o ETag/cache de configuração da barbearia
+    from .conditional import image_processed
+    image_processed(model, pk)
+
+
+# ---------------------------------------------------------------------------
+# Variantes responsivas (larguras menores + WebP/AVIF), geradas sob demanda
+# ---------------------------------------------------------------------------
+
+VARIANT_PREFIX = 'variants/'
+VARIANT_RE = re.compile(r'^(?P<source>.+)__w(?P<width>\d+)\.(?P<fmt>jpg|webp|avif)$')
+
+
+def variant_formats():
+    """Formatos modernos primeiro; AVIF só se o Pillow instalado suportar"""
+    formats = [fmt for fmt in ('avif', 'webp') if fmt in features.modules and features.check_module(fmt)]
+    formats.append('jpg')
+    return formats
+
+
+def variant_widths(field_name):
+    max_width = IMAGE_MAX_WIDTHS.get(field_name, 800)
+    return [w for w in settings.IMAGE_VARIANT_WIDTHS if w <= max_width]
+
+
+def variant_name(source_name, width, fmt):
+    return f"{VARIANT_PREFIX}{source_name}__w{width}.{fmt}"
+
+
+def build_srcset(instance, field_name):
+    """
+    Mapa formato -> srcset para o campo de imagem, ex.:
+    {"webp": "/media/variants/barbers/a.jpg__w96.webp 96w, ...", "jpg": "..."}
+    Os arquivos não são gerados aqui: a primeira requisição de cada URL gera e grava em disco.
+    """
+    image = getattr(instance, field_name)
+    if not image or getattr(instance, 'image_status', 'ready') != 'ready':
+        return {}
+    widths = variant_widths(field_name)
+    return {
+        fmt: ", ".join(f"{settings.MEDIA_URL}{variant_name(image.name, w, fmt)} {w}w" for w in widths)
+        for fmt in variant_formats()
+    }
+
+
+def parse_variant_name(name):
+    """Valida o nome de uma variante; retorna (source_name, width, fmt) ou None"""
+    if not name.startswith(VARIANT_PREFIX):
+        return None
+    match = VARIANT_RE.match(name[len(VARIANT_PREFIX):])
+    if not match:
+        return None
+    width = int(match.group('width'))
+    fmt = match.group('fmt')
+    if width not in settings.IMAGE_VARIANT_WIDTHS or fmt not in variant_formats():
+        return None
+    return match.group('source'), width, fmt
+
+
+def _variant_is_fresh(src_path, dst_path):
+    return os.path.exists(dst_path) and os.path.getmtime(dst_path) >= os.path.getmtime(src_path)
+
+
+def ensure_variant(name):
+    """
+    Garante que a variante exista em disco (gera se preciso) e retorna o caminho absoluto.
+    Retorna None se o nome for inválido ou o original não existir.
+    """
+    parsed = parse_variant_name(name)
+    if not parsed:
+        return None
+    source_name, width, fmt = parsed
+    if '..' in source_name.split('/'):
+        return None
+
+    src_path = default_storage.path(source_name)
+    if not os.path.isfile(src_path):
+        return None
+
+    dst_path = default_storage.path(name)
+    if not _variant_is_fresh(src_path, dst_path):
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        try:
+            render_variant(src_path, dst_path, width, fmt, settings.IMAGE_MAX_PIXELS)
+        except ImageTooLarge:
+            logger.warning("Original acima do orçamento de pixels: %s", source_name)
+            return None
+    return dst_path
+
+
+def pending_variant_jobs(source_name, field_name, force=False):
+    """Lista (src_path, dst_path, width, fmt) das variantes que ainda faltam para um original"""
+    src_path = default_storage.path(source_name)
+    if not os.path.isfile(src_path):
+        return []
+    jobs = []
+    for fmt in variant_formats():
+        for width in variant_widths(field_name):
+            dst_path = default_storage.path(variant_name(source_name, width, fmt))
+            if force or not _variant_is_fresh(src_path, dst_path):
+                jobs.append((src_path, dst_path, width, fmt))
+    return jobs
+
+
+def _render_variant_job(job, max_pixels):
+    src_path, dst_path, width, fmt = job
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    return render_variant(src_path, dst_path, width, fmt, max_pixels)
+
+
+def render_variant_jobs(jobs):
+    """Gera um lote de variantes no pool de processos (usado pelo backfill); retorna os futures"""
+    executor = _get_executor()
+    return [executor.submit(_render_variant_job, job, settings.IMAGE_MAX_PIXELS) for job in jobs]
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.services import LoyaltyService
+
+
+class Command(BaseCommand):
+    help = "Expira pontos de fidelidade não utilizados em todas as barbearias"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.LOYALTY_POINTS_EXPIRY_DAYS,
+            help="Pontos ganhos há mais de N dias expiram (padrão: LOYALTY_POINTS_EXPIRY_DAYS)"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Só informa o que seria expirado")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        customers, points = LoyaltyService.expire_points(cutoff, dry_run=options['dry_run'])
+        prefix = "[dry-run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}Pontos expirados: {points} ({customers} clientes)"))
@@ -0,0 +1,82 @@
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+
+from api.images import VARIANT_PREFIX, VARIANT_RE
+
+
+def _file_fields():
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.FileField):
+                yield model, field
+
+
+def referenced_media_names():
+    """Todos os nomes de arquivo referenciados por FileField/ImageField de qualquer modelo"""
+    names = set()
+    for model, field in _file_fields():
+        names.update(
+            model._base_manager.exclude(**{field.attname: ''}).exclude(**{f"{field.attname}__isnull": True})
+            .values_list(field.attname, flat=True).iterator()
+        )
+    return names
+
+
+def is_referenced(name):
+    """Consulta pontual no banco, feita logo antes de apagar cada arquivo"""
+    return any(model._base_manager.filter(**{field.attname: name}).exists() for model, field in _file_fields())
+
+
+class Command(BaseCommand):
+    help = "Remove de MEDIA_ROOT os arquivos (e variantes) que nenhum modelo referencia mais"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help="Ignora arquivos mais novos que isso (uploads ainda não commitados)"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Apenas lista o que seria removido")
+
+    def handle(self, *args, **options):
+        root = settings.MEDIA_ROOT
+        referenced = referenced_media_names()
+        cutoff = time.time() - options['grace_hours'] * 3600
+
+        removed = 0
+        freed = 0
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                if name.startswith('.') or os.path.getmtime(path) > cutoff:
+                    continue
+
+                if name.startswith(VARIANT_PREFIX):
+                    # Variante fica enquanto o original dela estiver referenciado
+                    match = VARIANT_RE.match(name[len(VARIANT_PREFIX):])
+                    source = match.group('source') if match else None
+                else:
+                    source = name
+                if source in referenced:
+                    continue
+
+                size = os.path.getsize(path)
+                if options['dry_run']:
+                    self.stdout.write(f"  {name}")
+                else:
+                    # A lista de referências pode ter envelhecido durante a varredura:
+                    # um upload idêntico pode ter reaproveitado o arquivo (mtime) ou
+                    # passado a apontar para ele (banco)
+                    if os.path.getmtime(path) > cutoff or (source and is_referenced(source)):
+                        continue
+                    os.remove(path)
+                removed += 1
+                freed += size
+
+        verb = "Seriam removidos" if options['dry_run'] else "Removidos"
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {removed} arquivos ({freed / 1024 / 1024:.1f} MB)"))
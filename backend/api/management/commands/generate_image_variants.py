@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from api.images import pending_variant_jobs, render_variant_jobs
+from api.models import Barbershop, Barber, Customer
+
+IMAGE_FIELDS = [
+    (Barbershop, 'logo'),
+    (Barbershop, 'banner'),
+    (Barber, 'profile_picture'),
+    (Customer, 'profile_picture'),
+]
+
+
+class Command(BaseCommand):
+    help = "Gera as variantes responsivas (larguras/formatos) que ainda faltam para as imagens existentes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regera mesmo as variantes já existentes")
+        parser.add_argument('--dry-run', action='store_true', help="Apenas conta o que seria gerado")
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, field_name in IMAGE_FIELDS:
+            names = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f"{field_name}__isnull": True})
+                .values_list(field_name, flat=True).iterator()
+            )
+            for name in names:
+                jobs.extend(pending_variant_jobs(name, field_name, force=options['force']))
+
+        self.stdout.write(f"Variantes pendentes: {len(jobs)}")
+        if options['dry_run'] or not jobs:
+            return
+
+        failed = 0
+        for job, future in zip(jobs, render_variant_jobs(jobs)):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f"Falha em {job[0]}: {e}"))
+
+        self.stdout.write(self.style.SUCCESS(f"Variantes geradas: {len(jobs) - failed}"))
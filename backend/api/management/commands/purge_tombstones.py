@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.changes import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "Apaga as lápides da sincronização incremental mais antigas que a retenção"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.SYNC_TOMBSTONE_RETENTION_DAYS,
+            help="Retenção em dias (padrão: SYNC_TOMBSTONE_RETENTION_DAYS)"
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_tombstones(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Lápides removidas: {deleted}"))
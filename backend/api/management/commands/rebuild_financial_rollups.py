@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Barbershop
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recalcula os rollups financeiros diários a partir das transações"
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help="Slugs das barbearias (padrão: todas)")
+
+    def handle(self, *args, **options):
+        barbershop_ids = None
+        if options['slugs']:
+            barbershop_ids = list(Barbershop.objects.filter(slug__in=options['slugs']).values_list('id', flat=True))
+            if len(barbershop_ids) != len(set(options['slugs'])):
+                raise CommandError("Barbearia não encontrada")
+
+        with transaction.atomic():
+            created = rebuild_rollups(barbershop_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rollups recalculados: {created}"))
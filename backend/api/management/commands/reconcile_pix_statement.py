@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Barbershop
+from api.reconciliation import reconcile_statement, detect_format
+
+
+class Command(BaseCommand):
+    help = "Concilia pagamentos Pix de uma barbearia a partir de um extrato bancário (CSV/OFX)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help="Slug da barbearia")
+        parser.add_argument('statement', help="Caminho do arquivo de extrato")
+        parser.add_argument('--format', choices=['csv', 'ofx'], help="Formato do extrato (padrão: pela extensão)")
+        parser.add_argument('--dry-run', action='store_true', help="Apenas simula, sem gravar")
+        parser.add_argument(
+            '--accept-mismatch', action='store_true',
+            help="Dá baixa também nos lançamentos com valor abaixo do esperado"
+        )
+
+    def handle(self, *args, **options):
+        barbershop = Barbershop.objects.filter(slug=options['slug']).first()
+        if not barbershop:
+            raise CommandError(f"Barbearia '{options['slug']}' não encontrada")
+
+        fmt = options['format'] or detect_format(options['statement'])
+        try:
+            with open(options['statement'], 'rb') as statement:
+                result = reconcile_statement(
+                    barbershop, statement, fmt=fmt, dry_run=options['dry_run'],
+                    accept_mismatch=options['accept_mismatch'],
+                )
+        except FileNotFoundError:
+            raise CommandError(f"Arquivo '{options['statement']}' não encontrado")
+
+        self.stdout.write(
+            f"Lançamentos com referência: {result['statement_entries']} | "
+            f"Conciliados: {result['matched']} | "
+            f"Já pagos: {result['already_paid']} | "
+            f"Transações criadas: {result['transactions_created']}"
+        )
+        if result['unmatched']:
+            self.stdout.write(self.style.WARNING(f"Sem agendamento: {', '.join(result['unmatched'][:50])}"))
+        if result['amount_mismatch']:
+            status = "baixados" if result['mismatch_accepted'] else "sem baixa, conferir manualmente"
+            self.stdout.write(self.style.WARNING(
+                f"Valor abaixo do esperado ({status}): {', '.join(result['amount_mismatch'])}"
+            ))
+        self.stdout.write(self.style.SUCCESS("Conciliação concluída" + (" (simulação)" if result['dry_run'] else "")))
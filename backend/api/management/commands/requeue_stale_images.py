@@ -0,0 +1,56 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from api.images import process_images_now
+from api.models import Barbershop, Barber, Customer
+
+MODELS = [Barbershop, Barber, Customer]
+
+
+def _age_seconds(names):
+    """Idade do upload mais recente da linha, pelo mtime dos originais (None se nenhum existir)"""
+    mtimes = [os.path.getmtime(default_storage.path(name)) for name in names if default_storage.exists(name)]
+    return time.time() - max(mtimes) if mtimes else None
+
+
+class Command(BaseCommand):
+    help = (
+        "Reprocessa imagens presas em 'processing' (o job se perdeu num restart "
+        "ou deploy do processo web)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=float, default=15,
+            help="Só linhas cujo upload mais recente é mais antigo que isso (jobs ainda em andamento ficam de fora)"
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Apenas lista o que seria reprocessado")
+
+    def handle(self, *args, **options):
+        min_age = options['minutes'] * 60
+        requeued = failed = 0
+        for model in MODELS:
+            fields = list(model.tracked_image_fields)
+            for row in model.objects.filter(image_status='processing').values('pk', *fields).iterator():
+                # O campo alterado não fica registrado: reprocessa todos os preenchidos
+                # (recodificar um JPEG já otimizado é inofensivo)
+                originals = {name: row[name] for name in fields if row[name]}
+                age = _age_seconds(originals.values())
+                if age is not None and age < min_age:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f"  {model.__name__} #{row['pk']}")
+                    requeued += 1
+                    continue
+                if not originals:
+                    model.objects.filter(pk=row['pk'], image_status='processing').update(image_status='ready')
+                elif not process_images_now(model, row['pk'], originals):
+                    failed += 1
+                    continue
+                requeued += 1
+
+        verb = "Seriam reprocessadas" if options['dry_run'] else "Reprocessadas"
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {requeued} linhas ({failed} falharam)"))
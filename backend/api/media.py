@@ -0,0 +1,132 @@
+"""
+Entrega de arquivos de mídia/estáticos sem passar o corpo pelo worker Python.
+
+A view valida e resolve o caminho, responde GETs condicionais (ETag/Last-Modified)
+e, com `MEDIA_ACCEL_REDIRECT` ligado, devolve só cabeçalhos com `X-Accel-Redirect`:
+o nginx transfere o arquivo (inclusive requisições com Range) a partir de uma
+location `internal`. Sem nginx (desenvolvimento) o arquivo é servido pelo Django
+com suporte a Range de um único intervalo.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import models
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import is_hashed_name
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+IMMUTABLE_MAX_AGE = 31536000
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+_public_media_prefixes = None
+
+
+def public_media_prefixes():
+    """Diretórios de upload dos FileFields (e das variantes): só eles são servidos"""
+    global _public_media_prefixes
+    if _public_media_prefixes is None:
+        from .images import VARIANT_PREFIX
+        prefixes = {VARIANT_PREFIX}
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if isinstance(field, models.FileField) and isinstance(field.upload_to, str) and field.upload_to:
+                    prefixes.add(field.upload_to.rstrip('/') + '/')
+        _public_media_prefixes = tuple(sorted(prefixes))
+    return _public_media_prefixes
+
+
+def file_etag(stat):
+    # Mesmo formato do nginx ("<mtime hex>-<tamanho hex>") para o ETag não mudar entre os dois
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def _resolve(root, path):
+    if not path or any(part.startswith('.') for part in path.split('/')) or path.endswith('.tmp'):
+        raise Http404("Arquivo não encontrado")
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404("Arquivo não encontrado")
+    if not os.path.isfile(full_path):
+        raise Http404("Arquivo não encontrado")
+    return full_path
+
+
+def _range_response(request, full_path, stat, content_type):
+    """Atende `Range: bytes=a-b` (um intervalo); qualquer outra forma recebe o arquivo inteiro"""
+    match = RANGE_RE.match(request.headers.get('Range', ''))
+    if not match or not any(match.groups()):
+        return None
+    size = stat.st_size
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    else:
+        # bytes=-N: os últimos N bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+    if start >= size or start > end:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    with open(full_path, 'rb') as f:
+        f.seek(start)
+        response = HttpResponse(f.read(end - start + 1), status=206, content_type=content_type)
+    response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def serve_file(request, root, path, accel_prefix, immutable=False):
+    full_path = _resolve(root, path)
+    stat = os.stat(full_path)
+    etag = file_etag(stat)
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        content_type = content_type or 'application/octet-stream'
+        if getattr(settings, 'MEDIA_ACCEL_REDIRECT', False):
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = accel_prefix + quote(path)
+        else:
+            response = _range_response(request, full_path, stat, content_type)
+            if response is None:
+                response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Accept-Ranges'] = 'bytes'
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=DEFAULT_MAX_AGE)
+    return response
+
+
+@require_safe
+def media_file(request, path):
+    """Serve arquivos de MEDIA_ROOT que pertencem a algum diretório de upload"""
+    if not path.startswith(public_media_prefixes()):
+        raise Http404("Arquivo não encontrado")
+    return serve_file(request, settings.MEDIA_ROOT, path, settings.MEDIA_ACCEL_PREFIX, immutable=is_hashed_name(path))
+
+
+@require_safe
+def static_file(request, path):
+    """Fallback de estáticos que não foram servidos pelo nginx nem pelo WhiteNoise"""
+    return serve_file(request, settings.STATIC_ROOT, path, settings.STATIC_ACCEL_PREFIX)
@@ -1,17 +1,57 @@
-from urllib import request
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.http import JsonResponse
-from .models import Barbershop
+from .conditional import acached_barbershop, cached_barbershop
 import re
 
 class BarbershopMiddleware:
+    # Compatível com WSGI e ASGI: no ASGI as views assíncronas (api.public, /events)
+    # não pagam a troca de thread de um middleware só síncrono
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         if request.path.startswith('/api/webhooks/'):
             return self.get_response(request)
-            return self.get_response(request)
-        
+
+        slug = self._slug(request)
+        if slug:
+            # Cache por slug: o 304 das leituras de configuração não consulta o banco
+            request.barbershop = cached_barbershop(slug)
+            if request.barbershop is None:
+                response = self._not_found(request)
+                if response:
+                    return response
+        else:
+            request.barbershop = None
+
+        response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        if request.path.startswith('/api/webhooks/'):
+            return await self.get_response(request)
+
+        slug = self._slug(request)
+        if slug:
+            request.barbershop = await acached_barbershop(slug)
+            if request.barbershop is None:
+                response = self._not_found(request)
+                if response:
+                    return response
+        else:
+            request.barbershop = None
+
+        return await self.get_response(request)
+
+    @staticmethod
+    def _slug(request):
         host = request.get_host().split(':')[0]
         slug = None
 
@@ -36,25 +76,13 @@ class BarbershopMiddleware:
         if header_slug:
             slug = header_slug
 
-        # Resolução e Injeção
-        if slug:
-            try:
-                barbershop = Barbershop.objects.get(slug=slug, is_active=True)
-                request.barbershop = barbershop
-            except Barbershop.DoesNotExist:
-                # Se a rota for de cadastro ou login global, ignoramos o erro de slug do host
-                # Também permitimos caminhos de auth que venham dentro de um tenant path: /api/b/<slug>/auth/...
-                if request.path.startswith('/api/auth/') or re.match(r'^/api/b/[^/]+/auth/', request.path):
-                    request.barbershop = None
-                else:
-                    return JsonResponse({"error": "barbershop_not_found", "message": "Barbearia não encontrada ou inativa."}, status=404)
-        else:
-            # Se for uma rota de API que exige tenant e não tem slug, bloqueamos
-            # Rota de admin ou auth global permitidas sem tenant
-            if request.path.startswith('/api/') and not request.path.startswith('/api/auth/') and not slug:
-                # Opcional: permitir rotas globais
-                pass
-            request.barbershop = None
+        return slug
 
-        response = self.get_response(request)
-        return response
+    @staticmethod
+    def _not_found(request):
+        # Se a rota for de cadastro ou login global, ignoramos o erro de slug do host
+        # Também permitimos caminhos de auth que venham dentro de um tenant path: /api/b/<slug>/auth/...
+        if request.path.startswith('/api/auth/') or re.match(r'^/api/b/[^/]+/auth/', request.path):
+            request.barbershop = None
+            return None
+        return JsonResponse({"error": "barbershop_not_found", "message": "Barbearia não encontrada ou inativa."}, status=404)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_alter_appointment_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barber',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Pronta'), ('processing', 'Processando'), ('failed', 'Falhou')], default='ready', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='barbershop',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Pronta'), ('processing', 'Processando'), ('failed', 'Falhou')], default='ready', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='image_status',
+            field=models.CharField(choices=[('ready', 'Pronta'), ('processing', 'Processando'), ('failed', 'Falhou')], default='ready', max_length=20),
+        ),
+    ]
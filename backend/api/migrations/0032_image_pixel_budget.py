@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:44
+
+import api.utils
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_image_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='barber',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, upload_to='barbers/', validators=[api.utils.validate_image_pixels]),
+        ),
+        migrations.AlterField(
+            model_name='barbershop',
+            name='banner',
+            field=models.ImageField(blank=True, null=True, upload_to='barbershops/banners/', validators=[api.utils.validate_image_pixels]),
+        ),
+        migrations.AlterField(
+            model_name='barbershop',
+            name='logo',
+            field=models.ImageField(blank=True, null=True, upload_to='barbershops/logos/', validators=[api.utils.validate_image_pixels]),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, upload_to='profiles/', validators=[api.utils.validate_image_pixels]),
+        ),
+    ]
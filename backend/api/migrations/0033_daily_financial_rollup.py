@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    Transaction = apps.get_model('api', 'Transaction')
+    DailyFinancialRollup = apps.get_model('api', 'DailyFinancialRollup')
+    grouped = (
+        Transaction.objects.filter(barbershop__isnull=False).order_by()
+        .annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()), method=Coalesce('payment_method', Value('')))
+        .values('barbershop_id', 'day', 'type', 'status', 'method')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    DailyFinancialRollup.objects.bulk_create(
+        [
+            DailyFinancialRollup(
+                barbershop_id=row['barbershop_id'], day=row['day'], type=row['type'], status=row['status'],
+                payment_method=row['method'], total=row['total'], count=row['count'],
+            )
+            for row in grouped.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_image_pixel_budget'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFinancialRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('income', 'Receita'), ('expense', 'Despesa')], max_length=20)),
+                ('status', models.CharField(choices=[('paid', 'Pago'), ('pending', 'Pendente')], max_length=20)),
+                ('payment_method', models.CharField(blank=True, default='', max_length=20)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('barbershop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='financial_rollups', to='api.barbershop')),
+            ],
+            options={
+                'unique_together': {('barbershop', 'day', 'type', 'status', 'payment_method')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
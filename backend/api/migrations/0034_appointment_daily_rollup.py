@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_daily_financial_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('confirmed', 'Confirmado'), ('cancelled', 'Cancelado'), ('completed', 'Concluído'), ('blocked', 'Bloqueado')], max_length=20)),
+                ('bookings', models.IntegerField(default=0)),
+                ('booked_minutes', models.IntegerField(default=0)),
+                ('service_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('stale', models.BooleanField(default=False, help_text='Dia precisa ser recalculado (agendamento movido/apagado)')),
+                ('refreshed_at', models.DateTimeField()),
+                ('barber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_rollups', to='api.barber')),
+                ('barbershop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_rollups', to='api.barbershop')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['barbershop', 'day'], name='api_appoint_barbers_cf546f_idx')],
+                'unique_together': {('barber', 'day', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:58
+
+import uuid
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def opening_balances(apps, schema_editor):
+    """Saldo atual de cada cliente vira um lançamento de ajuste (abertura do ledger)"""
+    CustomerBarbershop = apps.get_model('api', 'CustomerBarbershop')
+    LoyaltyLedger = apps.get_model('api', 'LoyaltyLedger')
+    batch = uuid.uuid4()
+    now = timezone.now()
+    LoyaltyLedger.objects.bulk_create(
+        (
+            LoyaltyLedger(
+                customer_id=row['customer_id'], barbershop_id=row['barbershop_id'], kind='adjust',
+                points=row['points'], description='Saldo inicial', batch=batch, created_at=now,
+            )
+            for row in CustomerBarbershop.objects.exclude(points=0).values('customer_id', 'barbershop_id', 'points').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_appointment_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoyaltyLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('earn', 'Acúmulo'), ('redeem', 'Resgate'), ('adjust', 'Ajuste'), ('expire', 'Expiração')], max_length=10)),
+                ('points', models.IntegerField(help_text='Positivo para créditos, negativo para débitos')),
+                ('description', models.CharField(blank=True, default='', max_length=255)),
+                ('batch', models.UUIDField(db_index=True, help_text='Lote de gravação (lançamentos gravados juntos)')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('appointment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.appointment')),
+                ('barbershop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loyalty_ledger', to='api.barbershop')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='loyalty_ledger', to='api.customer')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['barbershop', 'customer', 'created_at'], name='api_loyalty_barbers_a122b5_idx')],
+            },
+        ),
+        migrations.RunPython(opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_loyalty_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='appointment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transactions', to='api.appointment'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='kind',
+            field=models.CharField(blank=True, choices=[('', 'Manual'), ('completion', 'Conclusão do atendimento'), ('payment', 'Pagamento do agendamento')], default='', max_length=20),
+        ),
+        migrations.AlterUniqueTogether(
+            name='transaction',
+            unique_together={('appointment', 'kind')},
+        ),
+    ]
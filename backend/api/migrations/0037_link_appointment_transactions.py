@@ -0,0 +1,131 @@
+"""
+Vincula as receitas antigas aos agendamentos que as geraram, a partir das
+descrições gravadas por complete_appointment, confirm_payment e pela
+conciliação Pix. Só vínculos inequívocos são feitos: a referência Pix é exata;
+nos demais casos, por barbearia e nome do cliente, as transações e os
+agendamentos são pareados em ordem cronológica apenas quando as quantidades
+coincidem. O restante continua sem vínculo (kind vazio).
+"""
+import re
+from collections import defaultdict
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+PIX_PREFIX = 'Pagamento Pix Conciliado - '
+PIX_REFERENCE_RE = re.compile(r'\((AGEND-[0-9A-F]{8})\)$')
+CONFIRMED_PREFIX = 'Pagamento Confirmado - '
+COMPLETION_PREFIX = 'Atendimento: '
+
+
+def _completion_client(description):
+    # "Atendimento: {cliente} ({serviços})"
+    return description[len(COMPLETION_PREFIX):].rpartition(' (')[0]
+
+
+def _confirmed_client(description):
+    return description[len(CONFIRMED_PREFIX):]
+
+
+def link_pix(Appointment, Transaction):
+    linked = set()
+    pending = []
+    transactions = (
+        Transaction.objects.filter(appointment__isnull=True, type='income', description__startswith=PIX_PREFIX)
+        .only('id', 'barbershop_id', 'description').order_by('id')
+    )
+    chunk = []
+
+    def flush():
+        references = {}
+        for tx in chunk:
+            match = PIX_REFERENCE_RE.search(tx.description)
+            if match:
+                references[tx.id] = match.group(1)
+        appointments = {
+            (barbershop_id, payment_id): appointment_id
+            for appointment_id, barbershop_id, payment_id in Appointment.objects.filter(
+                payment_id__in=set(references.values())
+            ).values_list('id', 'barbershop_id', 'payment_id')
+        }
+        for tx in chunk:
+            appointment_id = appointments.get((tx.barbershop_id, references.get(tx.id)))
+            if appointment_id and appointment_id not in linked:
+                linked.add(appointment_id)
+                tx.appointment_id = appointment_id
+                tx.kind = 'payment'
+                pending.append(tx)
+        chunk.clear()
+
+    for tx in transactions.iterator(chunk_size=BATCH_SIZE):
+        chunk.append(tx)
+        if len(chunk) >= BATCH_SIZE:
+            flush()
+    flush()
+    Transaction.objects.bulk_update(pending, ['appointment', 'kind'], batch_size=BATCH_SIZE)
+
+
+def link_by_client(Transaction, barbershop_id, kind, prefix, client_of, appointments):
+    transactions = defaultdict(list)
+    for tx in (
+        Transaction.objects.filter(
+            barbershop_id=barbershop_id, appointment__isnull=True, type='income', description__startswith=prefix
+        ).only('id', 'description', 'date').order_by('date', 'id').iterator(chunk_size=BATCH_SIZE)
+    ):
+        transactions[client_of(tx.description)].append(tx)
+
+    by_client = defaultdict(list)
+    for appointment_id, client_name in (
+        appointments.exclude(transactions__kind=kind).order_by('date', 'id').values_list('id', 'client_name')
+    ):
+        by_client[client_name].append(appointment_id)
+
+    pending = []
+    for client_name, txs in transactions.items():
+        candidates = by_client.get(client_name, [])
+        if len(candidates) != len(txs):
+            continue
+        for tx, appointment_id in zip(txs, candidates):
+            tx.appointment_id = appointment_id
+            tx.kind = kind
+            pending.append(tx)
+    Transaction.objects.bulk_update(pending, ['appointment', 'kind'], batch_size=BATCH_SIZE)
+
+
+def link_transactions(apps, schema_editor):
+    Appointment = apps.get_model('api', 'Appointment')
+    Transaction = apps.get_model('api', 'Transaction')
+
+    link_pix(Appointment, Transaction)
+
+    barbershop_ids = (
+        Transaction.objects.filter(appointment__isnull=True, type='income', barbershop__isnull=False)
+        .values_list('barbershop_id', flat=True).distinct().order_by()
+    )
+    for barbershop_id in list(barbershop_ids):
+        appointments = Appointment.objects.filter(barbershop_id=barbershop_id)
+        link_by_client(
+            Transaction, barbershop_id, 'payment', CONFIRMED_PREFIX, _confirmed_client,
+            appointments.filter(payment_status='PAID'),
+        )
+        link_by_client(
+            Transaction, barbershop_id, 'completion', COMPLETION_PREFIX, _completion_client,
+            appointments.filter(status='completed'),
+        )
+
+
+def unlink_transactions(apps, schema_editor):
+    Transaction = apps.get_model('api', 'Transaction')
+    Transaction.objects.exclude(kind='').update(appointment=None, kind='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_transaction_appointment'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_transactions, unlink_transactions),
+    ]
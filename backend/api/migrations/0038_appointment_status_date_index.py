@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_link_appointment_transactions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['barbershop', 'status', 'date'], name='api_appoint_barbers_84637b_idx'),
+        ),
+    ]
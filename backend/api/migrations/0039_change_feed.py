@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_appointment_status_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('appointments', 'Agendamentos'), ('customers', 'Clientes'), ('services', 'Serviços'), ('products', 'Produtos')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customerbarbershop',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['barbershop', 'updated_at'], name='api_appoint_barbers_d2aa6e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customerbarbershop',
+            index=models.Index(fields=['barbershop', 'updated_at'], name='api_custome_barbers_3ea463_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['barbershop', 'updated_at'], name='api_product_barbers_22ae22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['barbershop', 'updated_at'], name='api_service_barbers_561566_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='barbershop',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.barbershop'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['barbershop', 'deleted_at'], name='api_tombsto_barbers_e2433e_idx'),
+        ),
+    ]
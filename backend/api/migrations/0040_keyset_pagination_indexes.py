@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['barbershop', 'date', 'id'], name='api_appoint_barbers_f0edd3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['created_at', 'id'], name='api_custome_created_762d49_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['barbershop', 'created_at', 'id'], name='api_product_barbers_bebcbd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['barbershop', 'date', 'id'], name='api_transac_barbers_9e4d5e_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0040_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barbershop',
+            name='rollups_refreshed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text="Marca d'água da última atualização dos rollups de agendamentos (api.analytics)", null=True),
+        ),
+    ]
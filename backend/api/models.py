@@ -1,10 +1,70 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
-from .utils import compress_image
+from django.utils import timezone
+from .images import schedule_image_processing
+from .utils import validate_image_pixels
+from .rollups import apply_deltas, state_deltas, transaction_state
+from .caching import bump_tenant_version
+
+
+IMAGE_STATUS_CHOICES = [
+    ('ready', 'Pronta'),
+    ('processing', 'Processando'),
+    ('failed', 'Falhou'),
+]
+
+
+class TrackedImagesMixin:
+    """
+    Detecta uploads novos nos ImageFields sem SELECT extra: guarda os nomes que
+    vieram do banco em `from_db` e compara em memória no `save`. Caminhos em lote
+    (bulk_create/bulk_update/update, ou save com update_fields sem imagens) não
+    passam pelo processamento de imagens.
+    """
+    tracked_image_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_images()
+        return instance
+
+    def _snapshot_images(self):
+        # Campos adiados (only/defer) não estão no __dict__ e não são rastreados
+        self._loaded_images = {
+            name: getattr(self.__dict__[name], 'name', self.__dict__[name])
+            for name in self.tracked_image_fields if name in self.__dict__
+        }
+
+    def _new_image_uploads(self, update_fields=None):
+        loaded = getattr(self, '_loaded_images', {})
+        changed = []
+        for name in self.tracked_image_fields:
+            if update_fields is not None and name not in update_fields:
+                continue
+            if name not in self.__dict__:
+                continue
+            image = getattr(self, name)
+            # Só arquivos ainda não gravados no storage (upload novo) precisam de processamento
+            if image and image != loaded.get(name) and not image._committed:
+                changed.append(name)
+        return changed
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        changed = self._new_image_uploads(update_fields)
+        if changed:
+            self.image_status = 'processing'
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'image_status'}
+        super().save(*args, **kwargs)
+        self._snapshot_images()
+        if changed:
+            schedule_image_processing(self, changed)
 
 
-class Barbershop(models.Model):
+class Barbershop(TrackedImagesMixin, models.Model):
     """Representa uma empresa/estabelecimento (Tenant)"""
     PLAN_CHOICES = [
         ('trial', 'Teste Grátis'),
@@ -16,31 +76,33 @@ class Barbershop(models.Model):
     slug = models.SlugField(unique=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_barbershops')
     plan = models.CharField(max_length=10, choices=PLAN_CHOICES, default='trial')
-    logo = models.ImageField(upload_to='barbershops/logos/', null=True, blank=True)
-    banner = models.ImageField(upload_to='barbershops/banners/', null=True, blank=True)
+    logo = models.ImageField(upload_to='barbershops/logos/', null=True, blank=True, validators=[validate_image_pixels])
+    banner = models.ImageField(upload_to='barbershops/banners/', null=True, blank=True, validators=[validate_image_pixels])
     address = models.CharField(max_length=255, blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
     primary_color = models.CharField(max_length=7, default='#007AFF')
     onboarding_completed = models.BooleanField(default=False)
+    image_status = models.CharField(max_length=20, choices=IMAGE_STATUS_CHOICES, default='ready')
     pix_key = models.CharField(max_length=100, blank=True, null=True, help_text="Chave Pix para recebimento")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    rollups_refreshed_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="Marca d'água da última atualização dos rollups de agendamentos (api.analytics)"
+    )
 
-    def __str__(self):
-        return self.name
+    # Logo/banner novos são gravados como vieram e otimizados fora da requisição
+    tracked_image_fields = ('logo', 'banner')
 
-    def save(self, *args, **kwargs):
-        # Comprimir logo se houver uma nova
-        if self.logo and hasattr(self.logo, 'file') and not isinstance(self.logo.file, bytes):
-            if not self.id or (self.id and Barbershop.objects.get(id=self.id).logo != self.logo):
-                self.logo = compress_image(self.logo)
-        
-        # Comprimir banner se houver um novo
-        if self.banner and hasattr(self.banner, 'file') and not isinstance(self.banner.file, bytes):
-            if not self.id or (self.id and Barbershop.objects.get(id=self.id).banner != self.banner):
-                self.banner = compress_image(self.banner, max_width=1200)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Slug carregado: se mudar, a entrada antiga do cache de slugs também é removida
+        instance._loaded_slug = instance.__dict__.get('slug')
+        return instance
 
-        super().save(*args, **kwargs)
+    def __str__(self):
+        return self.name
 
 
 class UserProfile(models.Model):
@@ -72,53 +134,56 @@ class Service(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['barbershop', 'updated_at']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.barbershop.name if self.barbershop else 'Global'})"
 
 
-class Barber(models.Model):
+class Barber(TrackedImagesMixin, models.Model):
     """Barbeiros da barbearia"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='barber_profile', null=True, blank=True)
     barbershop = models.ForeignKey(Barbershop, on_delete=models.CASCADE, related_name='barbers', null=True)
     name = models.CharField(max_length=200)
     email = models.EmailField(unique=True)
-    profile_picture = models.ImageField(upload_to='barbers/', null=True, blank=True)
+    profile_picture = models.ImageField(upload_to='barbers/', null=True, blank=True, validators=[validate_image_pixels])
+    image_status = models.CharField(max_length=20, choices=IMAGE_STATUS_CHOICES, default='ready')
     description = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     buffer_minutes = models.IntegerField(default=5)
     booking_horizon_days = models.IntegerField(default=30)
     whatsapp = models.CharField(max_length=20, blank=True, null=True, help_text="Telefone com DDD (apenas números)")
 
+    tracked_image_fields = ('profile_picture',)
+
     def __str__(self):
         return f"{self.name} @ {self.barbershop.name if self.barbershop else 'N/A'}"
 
-    def save(self, *args, **kwargs):
-        if self.profile_picture and hasattr(self.profile_picture, 'file') and not isinstance(self.profile_picture.file, bytes):
-            if not self.id or (self.id and Barber.objects.get(id=self.id).profile_picture != self.profile_picture):
-                self.profile_picture = compress_image(self.profile_picture)
-        super().save(*args, **kwargs)
-
 
-class Customer(models.Model):
+class Customer(TrackedImagesMixin, models.Model):
     """Clientes da barbearia (Perfil Global)"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='customer_profile', null=True, blank=True)
     name = models.CharField(max_length=200)
     phone = models.CharField(max_length=20)
     birth_date = models.DateField(null=True, blank=True)
-    profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_picture = models.ImageField(upload_to='profiles/', null=True, blank=True, validators=[validate_image_pixels])
+    image_status = models.CharField(max_length=20, choices=IMAGE_STATUS_CHOICES, default='ready')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    tracked_image_fields = ('profile_picture',)
+
+    class Meta:
+        indexes = [
+            # Paginação por cursor da lista de clientes
+            models.Index(fields=['created_at', 'id']),
+        ]
+
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        if self.profile_picture and hasattr(self.profile_picture, 'file') and not isinstance(self.profile_picture.file, bytes):
-            if not self.id or (self.id and Customer.objects.get(id=self.id).profile_picture != self.profile_picture):
-                self.profile_picture = compress_image(self.profile_picture)
-        super().save(*args, **kwargs)
-
 
 class CustomerBarbershop(models.Model):
     """Dados do cliente em uma barbearia específica (pontos, histórico local)"""
@@ -128,9 +193,44 @@ class CustomerBarbershop(models.Model):
     total_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notes = models.TextField(blank=True, default='')
     points = models.IntegerField(default=0, help_text="Pontos de fidelidade")
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ['customer', 'barbershop']
+        indexes = [
+            models.Index(fields=['barbershop', 'updated_at']),
+        ]
+
+
+class LoyaltyLedger(models.Model):
+    """
+    Histórico imutável dos pontos de fidelidade. `CustomerBarbershop.points` é o
+    saldo em cache: sempre igual à soma dos lançamentos do cliente na barbearia.
+    """
+    KIND_CHOICES = [
+        ('earn', 'Acúmulo'),
+        ('redeem', 'Resgate'),
+        ('adjust', 'Ajuste'),
+        ('expire', 'Expiração'),
+    ]
+
+    barbershop = models.ForeignKey(Barbershop, on_delete=models.CASCADE, related_name='loyalty_ledger')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loyalty_ledger')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    points = models.IntegerField(help_text="Positivo para créditos, negativo para débitos")
+    appointment = models.ForeignKey('Appointment', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    description = models.CharField(max_length=255, blank=True, default='')
+    batch = models.UUIDField(db_index=True, help_text="Lote de gravação (lançamentos gravados juntos)")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['barbershop', 'customer', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id}@{self.barbershop_id} {self.kind} {self.points:+d}"
 
 
 class LoyaltyReward(models.Model):
@@ -191,10 +291,49 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ['date']
+        indexes = [
+            # Próximos agendamentos por status (feed do n8n, agenda do dia)
+            models.Index(fields=['barbershop', 'status', 'date']),
+            models.Index(fields=['barbershop', 'updated_at']),
+            # Paginação por cursor (date, id)
+            models.Index(fields=['barbershop', 'date', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.client_name} - {self.date}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Barbeiro/dia carregados: se mudarem, o rollup do dia antigo precisa ser recalculado
+        if 'barber_id' in instance.__dict__ and 'date' in instance.__dict__:
+            instance._analytics_day = instance._current_analytics_day()
+        # Estado carregado: os eventos ao vivo distinguem cancelamento/conclusão/remarcação
+        if {'status', 'barber_id', 'date'} <= instance.__dict__.keys():
+            instance._loaded_schedule = (instance.status, instance.barber_id, instance.date)
+        return instance
+
+    def _current_analytics_day(self):
+        return self.barber_id, timezone.localdate(self.date) if self.date else None
+
+    def _invalidate_analytics(self, moved_from=None):
+        if moved_from and moved_from[1]:
+            AppointmentDailyRollup.objects.filter(barber_id=moved_from[0], day=moved_from[1]).update(stale=True)
+        bump_tenant_version(self.barbershop_id, 'analytics')
+
+    def save(self, *args, **kwargs):
+        previous = getattr(self, '_analytics_day', None)
+        super().save(*args, **kwargs)
+        self._analytics_day = self._current_analytics_day()
+        # O dia novo é encontrado pelo updated_at; o antigo é marcado aqui
+        self._invalidate_analytics(previous if previous != self._analytics_day else None)
+
+    def delete(self, *args, **kwargs):
+        previous = getattr(self, '_analytics_day', None) or self._current_analytics_day()
+        result = super().delete(*args, **kwargs)
+        self._invalidate_analytics(previous)
+        return result
+
 
 class TimeSlot(models.Model):
     """Representa o slot de tempo reservado para um agendamento"""
@@ -287,6 +426,12 @@ class Transaction(models.Model):
         ('card', 'Cartão'),
         ('pix', 'PIX'),
     ]
+
+    KIND_CHOICES = [
+        ('', 'Manual'),
+        ('completion', 'Conclusão do atendimento'),
+        ('payment', 'Pagamento do agendamento'),
+    ]
     
     barbershop = models.ForeignKey(Barbershop, on_delete=models.CASCADE, related_name='transactions', null=True)
     description = models.CharField(max_length=200)
@@ -296,16 +441,105 @@ class Transaction(models.Model):
     date = models.DateTimeField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='paid')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, null=True, blank=True)
+    # Receitas geradas por um agendamento: no máximo uma por (agendamento, kind)
+    appointment = models.ForeignKey(
+        Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Campos que definem a linha de DailyFinancialRollup da transação
+    ROLLUP_FIELDS = ('barbershop_id', 'date', 'type', 'status', 'payment_method', 'amount')
+
     class Meta:
         ordering = ['-date']
+        # Transações sem agendamento (appointment NULL) não entram na unicidade
+        unique_together = ['appointment', 'kind']
+        indexes = [
+            # Paginação por cursor (date, id)
+            models.Index(fields=['barbershop', 'date', 'id']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado carregado do banco: permite calcular a diferença no save sem reler a linha
+        if all(f in instance.__dict__ for f in cls.ROLLUP_FIELDS):
+            instance._rollup_state = transaction_state(instance)
+        return instance
+
+    def _stored_rollup_state(self):
+        if self._state.adding:
+            return None
+        if hasattr(self, '_rollup_state'):
+            return self._rollup_state
+        stored = Transaction.objects.filter(pk=self.pk).only(*[f.removesuffix('_id') for f in self.ROLLUP_FIELDS]).first()
+        return transaction_state(stored) if stored else None
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {f.removesuffix('_id') for f in self.ROLLUP_FIELDS} & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        with db_transaction.atomic():
+            previous = self._stored_rollup_state()
+            super().save(*args, **kwargs)
+            self._rollup_state = transaction_state(self)
+            apply_deltas(state_deltas(previous, self._rollup_state))
+        bump_tenant_version(self.barbershop_id, 'analytics')
+
+    def delete(self, *args, **kwargs):
+        with db_transaction.atomic():
+            previous = self._stored_rollup_state()
+            result = super().delete(*args, **kwargs)
+            apply_deltas(state_deltas(previous, None))
+        bump_tenant_version(self.barbershop_id, 'analytics')
+        return result
 
     def __str__(self):
         return f"{self.description} - R$ {self.amount} ({self.barbershop.name if self.barbershop else 'Global'})"
 
 
+class DailyFinancialRollup(models.Model):
+    """Totais diários de transações por barbearia, tipo, status e forma de pagamento (mantido por Transaction)"""
+    barbershop = models.ForeignKey(Barbershop, on_delete=models.CASCADE, related_name='financial_rollups')
+    day = models.DateField()
+    type = models.CharField(max_length=20, choices=Transaction.TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=Transaction.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, blank=True, default='')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['barbershop', 'day', 'type', 'status', 'payment_method']
+
+    def __str__(self):
+        return f"{self.barbershop_id} {self.day} {self.type}/{self.status}/{self.payment_method or '-'}: R$ {self.total}"
+
+
+class AppointmentDailyRollup(models.Model):
+    """Agendamentos consolidados por barbeiro, dia e status (base do /analytics)"""
+    barbershop = models.ForeignKey(Barbershop, on_delete=models.CASCADE, related_name='appointment_rollups')
+    barber = models.ForeignKey(Barber, on_delete=models.CASCADE, related_name='appointment_rollups')
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    bookings = models.IntegerField(default=0)
+    booked_minutes = models.IntegerField(default=0)
+    service_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    stale = models.BooleanField(default=False, help_text="Dia precisa ser recalculado (agendamento movido/apagado)")
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['barber', 'day', 'status']
+        indexes = [
+            models.Index(fields=['barbershop', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.barber_id} {self.day} {self.status}: {self.bookings}"
+
+
 class Promotion(models.Model):
     """Promoções e campanhas de marketing"""
     STATUS_CHOICES = [
@@ -368,6 +602,35 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['barbershop', 'updated_at']),
+            # Paginação por cursor (created_at, id)
+            models.Index(fields=['barbershop', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.barbershop.name if self.barbershop else 'Global'})"
+
+
+class Tombstone(models.Model):
+    """Registro de exclusão para a sincronização incremental (/changes)"""
+    TYPE_CHOICES = [
+        ('appointments', 'Agendamentos'),
+        ('customers', 'Clientes'),
+        ('services', 'Serviços'),
+        ('products', 'Produtos'),
+    ]
+
+    # Sem FK real: as lápides sobrevivem à exclusão em cascata e são apagadas pelo purge_tombstones
+    barbershop = models.ForeignKey(Barbershop, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['barbershop', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.barbershop_id} {self.type}#{self.object_id} @ {self.deleted_at}"
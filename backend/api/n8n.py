@@ -0,0 +1,174 @@
+"""
+Feeds compactos para o agente n8n/IA.
+
+O agente consulta estes endpoints o tempo todo:
+- próximos agendamentos: cada resposta leva um ETag calculado por um único
+  aggregate (quantidade, soma dos ids e último `updated_at` da janela e dos
+  clientes) mais a versão 'config' da barbearia. Se nada mudou, a view
+  responde 304 sem carregar nem serializar os agendamentos;
+- resumo do dia: um aggregate condicional + o rollup financeiro, guardados no
+  cache por barbearia e dia e invalidados pela versão 'analytics' (incrementada
+  a cada escrita de agendamento ou transação).
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Prefetch, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .caching import tenant_cache_key, tenant_version
+from .models import Appointment, DailyFinancialRollup, Service
+
+FEED_DEFAULT_HOURS = 168
+FEED_MAX_HOURS = 720
+FEED_DEFAULT_LIMIT = 10
+FEED_MAX_LIMIT = 100
+
+
+class FeedError(ValueError):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def encode_cursor(date, pk):
+    raw = json.dumps([date.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        date_str, pk = json.loads(raw)
+        date = parse_datetime(date_str)
+        if date is None or not isinstance(pk, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise FeedError('INVALID_CURSOR', "Cursor inválido.")
+    return date, pk
+
+
+def _bounded_int(params, name, default, maximum):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = 0
+    if not 1 <= value <= maximum:
+        raise FeedError('INVALID_PARAMS', f"'{name}' deve estar entre 1 e {maximum}.")
+    return value
+
+
+class NextAppointmentsFeed:
+    """Próximos agendamentos confirmados dentro do horizonte, paginados por (date, id)"""
+
+    def __init__(self, barbershop, params, now=None):
+        self.barbershop = barbershop
+        self.hours = _bounded_int(params, 'hours', FEED_DEFAULT_HOURS, FEED_MAX_HOURS)
+        self.limit = _bounded_int(params, 'limit', FEED_DEFAULT_LIMIT, FEED_MAX_LIMIT)
+        self.cursor = params.get('cursor') or ''
+        self.after = decode_cursor(self.cursor) if self.cursor else None
+        self.now = now or timezone.now()
+
+    def window(self):
+        return Appointment.objects.filter(
+            barbershop=self.barbershop,
+            status='confirmed',
+            date__gte=self.now,
+            date__lt=self.now + timedelta(hours=self.hours),
+        )
+
+    def etag(self):
+        """
+        Impressão digital da janela inteira: qualquer inclusão, saída ou alteração
+        muda o valor. Nome do barbeiro e dos serviços entram pela versão 'config'
+        (incrementada quando eles são gravados) e o telefone pelo `updated_at` do cliente.
+        """
+        state = self.window().order_by().aggregate(
+            count=Count('id'), ids=Sum('id'), changed=Max('updated_at'), customers=Max('customer__updated_at'),
+        )
+        fingerprint = json.dumps([
+            state['count'], state['ids'], str(state['changed']), str(state['customers']),
+            tenant_version(self.barbershop.id, 'config'), self.hours, self.limit, self.cursor,
+        ])
+        return f'W/"{hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()}"'
+
+    def page(self):
+        queryset = self.window()
+        if self.after:
+            date, pk = self.after
+            queryset = queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=pk))
+        rows = list(
+            queryset.order_by('date', 'id')
+            .select_related('barber', 'customer')
+            .prefetch_related(Prefetch('services', queryset=Service.objects.only('id', 'name').order_by('id')))
+            .only('id', 'date', 'client_name', 'client_phone', 'barber__name', 'customer__phone')
+            [:self.limit + 1]
+        )
+        has_more = len(rows) > self.limit
+        rows = rows[:self.limit]
+        return {
+            "appointments": [self.item(app) for app in rows],
+            "next_cursor": encode_cursor(rows[-1].date, rows[-1].id) if has_more else None,
+        }
+
+    @staticmethod
+    def item(app):
+        local = timezone.localtime(app.date)
+        phone = (app.customer.phone if app.customer else None) or app.client_phone
+        return {
+            "id": str(app.id),
+            "client": app.client_name,
+            "service": ", ".join(s.name for s in app.services.all()),
+            "barber": app.barber.name,
+            "time": local.strftime("%H:%M"),
+            "date": local.strftime("%d/%m/%Y"),
+            "whatsapp": phone or "N/A",
+        }
+
+
+SUMMARY_CACHE_TIMEOUT = 3600
+
+
+def today_summary(barbershop):
+    """Resumo do dia (no fuso local, como os rollups) para o assistente; sem queries quando está no cache"""
+    today = timezone.localdate()
+    key = tenant_cache_key(barbershop.id, 'analytics', 'today-summary', today.isoformat())
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(today, datetime.min.time()), tz)
+    counts = Appointment.objects.filter(
+        barbershop=barbershop, date__gte=start, date__lt=start + timedelta(days=1)
+    ).aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending')),
+        confirmed=Count('id', filter=Q(status='confirmed')),
+        completed=Count('id', filter=Q(status='completed')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+    )
+    revenue = DailyFinancialRollup.objects.filter(
+        barbershop=barbershop, day=today, type='income', status='paid'
+    ).aggregate(total=Sum('total'))['total'] or 0
+
+    summary = {
+        "barbershop": barbershop.name,
+        "date": today.isoformat(),
+        "total_appointments": counts['total'],
+        "pending": counts['pending'],
+        "confirmed": counts['confirmed'],
+        "completed": counts['completed'],
+        "cancelled": counts['cancelled'],
+        "revenue_today": revenue,
+    }
+    cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
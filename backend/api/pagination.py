@@ -0,0 +1,113 @@
+"""
+Paginação por cursor (keyset) das listas grandes do painel.
+
+Cada página é buscada por `WHERE (chave, id) < (cursor)` na ordem de um índice
+composto, então a página 500 custa o mesmo que a primeira e inclusões no meio
+não duplicam nem pulam linhas. O cursor é opaco: base64 de [chave ISO, id].
+
+Resposta: {"results": [...], "next_cursor": "..." | null}. Query: limit
+(padrão PAGE_SIZE, máx. MAX_PAGE_SIZE) e cursor (valor de `next_cursor`).
+
+Compatibilidade: com o cabeçalho `X-Pagination: legacy` a resposta continua
+sendo a lista simples (formato antigo do frontend), mas limitada a
+LEGACY_MAX_ROWS linhas; quando corta, envia `X-Result-Truncated: true`.
+`?ordering=` só é aceito nesse modo; com cursor a resposta é 400.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat(), pk]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(raw)
+        value = parse_datetime(value)
+        if value is None or not isinstance(pk, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValidationError({"error": "INVALID_CURSOR", "message": "Cursor inválido."})
+    return value, pk
+
+
+class KeysetPagination(BasePagination):
+    """Mais recentes primeiro por (keyset_field, id); a view define `keyset_field`"""
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    LEGACY_MAX_ROWS = 2000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        field = view.keyset_field
+        self.legacy = request.headers.get('X-Pagination', '').lower() == 'legacy'
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM)
+
+        if self.legacy:
+            # Lista simples: ?ordering= (já aplicado pelo OrderingFilter) continua valendo
+            if not ordering:
+                queryset = queryset.order_by(f'-{field}', '-id')
+            rows = list(queryset[:self.LEGACY_MAX_ROWS + 1])
+            self.truncated = len(rows) > self.LEGACY_MAX_ROWS
+            return rows[:self.LEGACY_MAX_ROWS]
+
+        # O cursor só vale na ordem do índice: outra ordenação seria ignorada em silêncio
+        if ordering:
+            raise ValidationError({
+                "error": "INVALID_PARAMS",
+                "message": "'ordering' não é aceito na paginação por cursor; use X-Pagination: legacy.",
+            })
+        queryset = queryset.order_by(f'-{field}', '-id')
+
+        limit = self.get_limit(request)
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            value, pk = decode_cursor(cursor)
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+
+        rows = list(queryset[:limit + 1])
+        self.next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            self.next_cursor = encode_cursor(getattr(rows[-1], field), rows[-1].id)
+        return rows
+
+    def get_limit(self, request):
+        value = request.query_params.get('limit')
+        if value in (None, ''):
+            return self.PAGE_SIZE
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            value = 0
+        if not 1 <= value <= self.MAX_PAGE_SIZE:
+            raise ValidationError({
+                "error": "INVALID_PARAMS", "message": f"'limit' deve estar entre 1 e {self.MAX_PAGE_SIZE}."
+            })
+        return value
+
+    def get_paginated_response(self, data):
+        if self.legacy:
+            response = Response(data)
+            if self.truncated:
+                response['X-Result-Truncated'] = 'true'
+            return response
+        return Response({"results": data, "next_cursor": self.next_cursor})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'results': schema,
+                'next_cursor': {'type': 'string', 'nullable': True},
+            },
+        }
@@ -2,7 +2,9 @@ import qrcode
 import base64
 import unicodedata
 import re
+import os
 from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
 
 class PixGenerator:
     def __init__(self, key, name, city, amount, reference_label):
@@ -109,10 +111,8 @@ class PixGenerator:
                 crc &= 0xFFFF
         return hex(crc).upper()[2:].zfill(4)
 
-def generate_pix_qr_code(key, name, city, amount, reference_label):
-    generator = PixGenerator(key, name, city, amount, reference_label)
-    pix_code = generator.generate_payload()
-    
+def render_qr_code(pix_code):
+    """Renderiza o BR Code como PNG em base64 (data URI)"""
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -126,4 +126,45 @@ def generate_pix_qr_code(key, name, city, amount, reference_label):
     buffered = BytesIO()
     img.save(buffered, format="PNG")
     img_str = base64.b64encode(buffered.getvalue()).decode()
-    return pix_code, f"data:image/png;base64,{img_str}"
+    return f"data:image/png;base64,{img_str}"
+
+def generate_pix_qr_code(key, name, city, amount, reference_label):
+    generator = PixGenerator(key, name, city, amount, reference_label)
+    pix_code = generator.generate_payload()
+    return pix_code, render_qr_code(pix_code)
+
+
+# Abaixo deste número de cobranças o custo de subir o pool supera o ganho
+PIX_BATCH_INLINE_THRESHOLD = 8
+
+_batch_executor = None
+
+
+def _get_batch_executor():
+    """Pool de processos criado sob demanda (um por processo do servidor web, gunicorn ou uvicorn)"""
+    global _batch_executor
+    if _batch_executor is None:
+        from django.conf import settings
+        workers = getattr(settings, 'PIX_BATCH_WORKERS', None) or os.cpu_count() or 2
+        _batch_executor = ProcessPoolExecutor(max_workers=workers)
+    return _batch_executor
+
+
+def generate_pix_batch(key, name, city, charges, render_qr=True):
+    """
+    Gera BR Codes (e opcionalmente QR Codes) para várias cobranças da mesma barbearia.
+
+    `charges` é uma lista de tuplas (amount, reference_label). Retorna um iterador
+    de tuplas (pix_code, qr_code_base64) na mesma ordem; o QR é renderizado num
+    pool de processos quando o lote é grande, e o iterador entrega cada item assim
+    que fica pronto (permite respostas em streaming).
+    """
+    codes = [PixGenerator(key, name, city, amount, ref).generate_payload() for amount, ref in charges]
+    if not render_qr:
+        return ((code, None) for code in codes)
+
+    if len(codes) < PIX_BATCH_INLINE_THRESHOLD:
+        qr_codes = map(render_qr_code, codes)
+    else:
+        qr_codes = _get_batch_executor().map(render_qr_code, codes, chunksize=4)
+    return zip(codes, qr_codes)
@@ -0,0 +1,164 @@
+"""
+Leituras públicas de alto volume (página de agendamento e PWA) como views
+assíncronas com o ORM async do Django.
+
+Rodando no ASGI (serviço uvicorn ao lado do gunicorn), cada requisição espera
+o banco sem prender uma thread de worker: um processo atende muito mais
+clientes simultâneos com a mesma memória. As respostas são as mesmas das rotas DRF equivalentes
+(`config/`, `services/`, `barbers/`, `appointments/available_slots/`), que
+continuam existindo para o painel e para escrita. `public/bootstrap/` junta a
+primeira carga da página de agendamento numa resposta só (api.bootstrap).
+"""
+from datetime import datetime
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+from . import bootstrap
+from .conditional import conditional_config
+from .models import Barber, Barbershop, Service
+from .serializers import BarberSerializer, BarbershopSerializer, ServiceSerializer
+from .services import BookingService
+
+
+def _json(data, status=200):
+    # Mesmo renderer JSON das rotas DRF (settings.JSON_BACKEND): datas, Decimal e UUID saem iguais
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(renderer.render(data), status=status, content_type='application/json')
+
+
+async def _barbershop(request, barbershop_slug=None):
+    """Barbearia resolvida pelo middleware, pelo slug da URL ou por ?barbershop_slug= (PWA/index.html)"""
+    barbershop = getattr(request, 'barbershop', None)
+    slug = barbershop_slug or request.GET.get('barbershop_slug')
+    if not barbershop and slug:
+        barbershop = await Barbershop.objects.filter(slug=slug, is_active=True).afirst()
+    return barbershop
+
+
+def _tenant_required():
+    return _json({"error": "TENANT_REQUIRED", "message": "Contexto de barbearia não encontrado"}, status=404)
+
+
+@require_GET
+@conditional_config
+async def barbershop_config(request, barbershop_slug=None):
+    barbershop = await _barbershop(request, barbershop_slug)
+    if not barbershop:
+        return _tenant_required()
+    return _json(BarbershopSerializer(barbershop, context={'request': request}).data)
+
+
+@require_GET
+@conditional_config
+async def service_list(request, barbershop_slug=None):
+    barbershop = await _barbershop(request, barbershop_slug)
+    if not barbershop:
+        return _json([])
+    services = [s async for s in Service.objects.filter(barbershop=barbershop)]
+    return _json(ServiceSerializer(services, many=True).data)
+
+
+@require_GET
+@conditional_config
+async def barber_list(request, barbershop_slug=None):
+    barbershop = await _barbershop(request, barbershop_slug)
+    if not barbershop:
+        return _json([])
+    barbers = [b async for b in Barber.objects.filter(barbershop=barbershop).select_related('user')]
+    return _json(BarberSerializer(barbers, many=True, context={'request': request}).data)
+
+
+@require_GET
+async def available_slots(request, barbershop_slug=None):
+    """Query: barberId, serviceIds (ou serviceId) e date (AAAA-MM-DD)"""
+    barbershop = await _barbershop(request, barbershop_slug)
+    if not barbershop:
+        return _tenant_required()
+    barber_id = request.GET.get('barberId')
+    service_ids = request.GET.get('serviceIds') or request.GET.get('serviceId')
+    date_str = request.GET.get('date')
+    if not all([barber_id, service_ids, date_str]):
+        return _json({"error": "MISSING_PARAMS"}, status=400)
+
+    try:
+        target_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        slots, block_reason = await BookingService.aget_available_slots(barbershop, barber_id, service_ids, target_date)
+    except ValueError:
+        return _json({"error": "INVALID_PARAMS", "message": "Parâmetros inválidos."}, status=400)
+    except ValidationError as e:
+        return _json({"error": "INVALID_PARAMS", "message": str(e.detail[0])}, status=400)
+    except Barber.DoesNotExist:
+        return _json({"error": "BARBER_NOT_FOUND"}, status=404)
+    return _json({
+        "available_slots": [s.strftime('%H:%M') for s in slots],
+        "block_reason": block_reason,
+    })
+
+
+@require_GET
+async def booking_bootstrap(request, barbershop_slug=None):
+    """Primeira carga da página de agendamento em uma requisição (ver api.bootstrap)"""
+    barbershop = await _barbershop(request, barbershop_slug)
+    if not barbershop:
+        return _tenant_required()
+    key = await sync_to_async(bootstrap.cache_key)(request, barbershop, timezone.localdate())
+    data = await cache.aget(key)
+    if data is None:
+        data = await bootstrap.build_bootstrap(request, barbershop)
+        await cache.aset(key, data, settings.BOOTSTRAP_CACHE_SECONDS)
+    return _json(data)
+
+
+@require_GET
+@conditional_config
+async def pwa_manifest(request, slug=None):
+    """Retorna o manifest.json dinâmico baseado no slug da barbearia"""
+    # Valores padrão
+    name = "AutoOpera"
+    short_name = "AutoOpera"
+    start_url = "/"
+    theme_color = "#0F4C5C"
+    icon_src = "/src/assets/autoopera-logo.png" # Ícone padrão do app
+
+    barbershop = await Barbershop.objects.filter(slug=slug).afirst() if slug else None
+    if barbershop:
+        name = barbershop.name
+        short_name = barbershop.name[:12]
+        start_url = f"/b/{slug}/"
+        if barbershop.logo:
+            # Forçamos o caminho relativo para evitar localhost:8000 no manifest
+            icon_src = urlparse(barbershop.logo.url).path
+
+    manifest = {
+        "name": name,
+        "short_name": short_name,
+        "description": f"{name} | Agendamento Online",
+        "start_url": start_url,
+        "display": "standalone",
+        "background_color": "#F5F5F5",
+        "theme_color": theme_color,
+        "orientation": "portrait",
+        "icons": [
+            {
+                "src": icon_src,
+                "sizes": "192x192",
+                "type": "image/png",
+                "purpose": "any maskable"
+            },
+            {
+                "src": icon_src,
+                "sizes": "512x512",
+                "type": "image/png",
+                "purpose": "any maskable"
+            }
+        ]
+    }
+    return JsonResponse(manifest)
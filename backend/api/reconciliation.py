@@ -0,0 +1,242 @@
+"""
+Conciliação de pagamentos Pix a partir de extratos bancários (CSV/OFX).
+
+O extrato é lido linha a linha (sem carregar o arquivo inteiro em memória), as
+referências `AGEND-XXXXXXXX` geradas em `pix_payment` são indexadas num dicionário
+e os agendamentos correspondentes são buscados em poucos SELECTs por `payment_id`
+(coluna única/indexada). A baixa é feita com um UPDATE e um bulk_create em uma
+única transação.
+"""
+import codecs
+import csv
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Appointment, Transaction
+from .rollups import record_transactions
+
+# O txid do BR Code remove o hífen (AGENDXXXXXXXX); aceitamos as duas formas
+REFERENCE_RE = re.compile(r'AGEND-?([0-9A-F]{8})', re.IGNORECASE)
+
+LOOKUP_CHUNK_SIZE = 1000
+
+AMOUNT_COLUMNS = ('valor', 'amount', 'value', 'trnamt', 'credito', 'crédito')
+DATE_COLUMNS = ('data', 'date', 'dtposted', 'data lançamento', 'data lancamento')
+OFX_TAG_RE = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+
+@dataclass
+class StatementEntry:
+    reference: str
+    amount: Decimal
+    date: datetime | None = None
+
+
+def normalize_reference(text):
+    """Extrai a referência de pagamento de um texto livre do extrato"""
+    match = REFERENCE_RE.search(text or '')
+    if not match:
+        return None
+    return f"AGEND-{match.group(1).upper()}"
+
+
+def parse_amount(value):
+    """
+    Aceita '1.234,56', '1,234.56', '1234.56', 'R$ 50,00' e '-20,00': o último
+    separador é a vírgula/ponto decimal, os anteriores são de milhar. Um único
+    tipo de separador repetido ('1.234.567') é só de milhar.
+    """
+    if value is None:
+        return None
+    value = re.sub(r'[^\d,.\-]', '', str(value))
+    if not value:
+        return None
+    last = max(value.rfind(','), value.rfind('.'))
+    if last >= 0:
+        if value.count(value[last]) > 1:
+            value = re.sub(r'[,.]', '', value)
+        else:
+            value = f"{re.sub(r'[,.]', '', value[:last])}.{value[last + 1:]}"
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+
+def parse_date(value):
+    if not value:
+        return None
+    # OFX: 20260115120000[-3:BRT] ou 20260115120000.000
+    value = value.split('[')[0].strip()
+    if re.match(r'^\d{8,}', value):
+        value = value[:14] if len(value) >= 14 else value[:8]
+    for fmt in ('%Y%m%d%H%M%S', '%Y%m%d', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return timezone.make_aware(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def _text_lines(stream, encoding='utf-8'):
+    """Decodifica um arquivo binário (upload ou arquivo local) linha a linha"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending = ''
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        pending += chunk if isinstance(chunk, str) else decoder.decode(chunk)
+        *lines, pending = pending.split('\n')
+        for line in lines:
+            yield line.rstrip('\r')
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending.rstrip('\r')
+
+
+def iter_csv_entries(stream):
+    lines = _text_lines(stream)
+    header_line = next(lines, '')
+    delimiter = ';' if header_line.count(';') > header_line.count(',') else ','
+    header = [h.strip().lower() for h in next(csv.reader([header_line], delimiter=delimiter))]
+
+    amount_idx = next((i for i, h in enumerate(header) if h in AMOUNT_COLUMNS), None)
+    date_idx = next((i for i, h in enumerate(header) if h in DATE_COLUMNS), None)
+
+    for row in csv.reader(lines, delimiter=delimiter):
+        if not row:
+            continue
+        # A referência pode estar em qualquer coluna (descrição, identificador, histórico...)
+        reference = normalize_reference(' '.join(row))
+        if not reference:
+            continue
+        amount = parse_amount(row[amount_idx]) if amount_idx is not None and amount_idx < len(row) else None
+        date = parse_date(row[date_idx]) if date_idx is not None and date_idx < len(row) else None
+        yield StatementEntry(reference=reference, amount=amount, date=date)
+
+
+def iter_ofx_entries(stream):
+    current = None
+    for line in _text_lines(stream, encoding='latin-1'):
+        for closing, tag, value in OFX_TAG_RE.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    reference = normalize_reference(' '.join(current.get(k, '') for k in ('MEMO', 'NAME', 'FITID', 'REFNUM', 'CHECKNUM')))
+                    if reference:
+                        yield StatementEntry(
+                            reference=reference,
+                            amount=parse_amount(current.get('TRNAMT')),
+                            date=parse_date(current.get('DTPOSTED')),
+                        )
+                    current = None
+                elif not closing:
+                    current = {}
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+
+def detect_format(filename):
+    return 'ofx' if (filename or '').lower().endswith('.ofx') else 'csv'
+
+
+def iter_statement_entries(stream, fmt):
+    if fmt == 'ofx':
+        return iter_ofx_entries(stream)
+    return iter_csv_entries(stream)
+
+
+def reconcile_statement(barbershop, stream, fmt='csv', dry_run=False, accept_mismatch=False):
+    """
+    Concilia um extrato com os agendamentos da barbearia.
+
+    Lançamentos com valor abaixo do esperado ficam sem baixa para conferência
+    manual, a menos que `accept_mismatch` seja informado. Retorna um resumo com
+    as contagens e as referências pagas, não encontradas e com divergência de valor.
+    """
+    index = {}
+    total_entries = 0
+    for entry in iter_statement_entries(stream, fmt):
+        total_entries += 1
+        # Débitos (estornos, tarifas) não quitam agendamentos
+        if entry.amount is not None and entry.amount <= 0:
+            continue
+        index.setdefault(entry.reference, entry)
+
+    references = list(index)
+    appointments = []
+    for i in range(0, len(references), LOOKUP_CHUNK_SIZE):
+        appointments.extend(
+            Appointment.objects.filter(barbershop=barbershop, payment_id__in=references[i:i + LOOKUP_CHUNK_SIZE])
+            .annotate(total_price=Sum('services__price'))
+            .only('id', 'client_name', 'payment_id', 'payment_status')
+        )
+
+    found = {a.payment_id for a in appointments}
+    to_pay = [a for a in appointments if a.payment_status != 'PAID']
+    mismatched = [
+        a.payment_id for a in to_pay
+        if index[a.payment_id].amount is not None and a.total_price is not None
+        and index[a.payment_id].amount < a.total_price
+    ]
+    held = set() if accept_mismatch else set(mismatched)
+    to_pay = [a for a in to_pay if a.payment_id not in held]
+
+    now = timezone.now()
+
+    def build_transaction(appointment):
+        entry = index[appointment.payment_id]
+        return Transaction(
+            barbershop=barbershop,
+            appointment_id=appointment.id,
+            kind='payment',
+            category='service',
+            amount=entry.amount if entry.amount is not None else (appointment.total_price or 0),
+            type='income',
+            status='paid',
+            payment_method='pix',
+            description=f"Pagamento Pix Conciliado - {appointment.client_name} ({appointment.payment_id})",
+            date=entry.date or now,
+        )
+
+    transactions = []
+    if not dry_run and to_pay:
+        with transaction.atomic():
+            # Trava as linhas e descarta as que foram pagas por outra requisição nesse meio tempo
+            locked_ids = set(
+                Appointment.objects.select_for_update()
+                .filter(id__in=[a.id for a in to_pay])
+                .exclude(payment_status='PAID')
+                .values_list('id', flat=True)
+            )
+            to_pay = [a for a in to_pay if a.id in locked_ids]
+            Appointment.objects.filter(id__in=locked_ids).update(payment_status='PAID', updated_at=now)
+            # Pagamento já registrado (unicidade appointment/kind): só atualiza o status
+            recorded = set(
+                Transaction.objects.filter(appointment_id__in=locked_ids, kind='payment')
+                .order_by().values_list('appointment_id', flat=True)
+            )
+            transactions = Transaction.objects.bulk_create(
+                [build_transaction(a) for a in to_pay if a.id not in recorded], batch_size=LOOKUP_CHUNK_SIZE
+            )
+            # bulk_create não passa pelo save(): consolida o lote nos rollups diários
+            record_transactions(transactions)
+
+    return {
+        'statement_entries': total_entries,
+        'references_found': len(index),
+        'matched': len(to_pay),
+        'already_paid': len(appointments) - len(to_pay) - len(held),
+        'transactions_created': len(transactions),
+        'unmatched': sorted(set(index) - found),
+        'amount_mismatch': sorted(mismatched),
+        'mismatch_accepted': accept_mismatch,
+        'dry_run': dry_run,
+    }
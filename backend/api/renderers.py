@@ -0,0 +1,59 @@
+"""
+Renderer e parser JSON com orjson (ativados em REST_FRAMEWORK por settings.JSON_BACKEND).
+
+A saída é a mesma do JSONRenderer do DRF para os tipos que os serializers
+produzem: Decimal vira número (COERCE_DECIMAL_TO_STRING=False), datetime em ISO
+com 'Z' para UTC, date/time/UUID em texto, lazy strings e querysets/iteráveis
+convertidos. O que o orjson não conhece passa pelo JSONEncoder do DRF.
+"""
+import decimal
+
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+_drf_encoder = JSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    return _drf_encoder.default(obj)
+
+
+def dumps(data, indent=False):
+    return orjson.dumps(data, default=_default, option=OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # ?format=json / Accept com indent=N: orjson só indenta com 2 espaços
+        indent = False
+        if accepted_media_type:
+            params = dict(
+                part.strip().split('=', 1) for part in accepted_media_type.split(';')[1:] if '=' in part
+            )
+            indent = 'indent' in params
+        return dumps(data, indent=indent)
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
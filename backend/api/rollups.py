@@ -0,0 +1,117 @@
+"""
+Consolidação diária das transações financeiras.
+
+`DailyFinancialRollup` guarda, por barbearia e dia (no fuso local), o total e a
+quantidade de transações de cada combinação tipo/status/forma de pagamento. A
+tabela é mantida de forma incremental: `Transaction.save()/delete()` aplicam a
+diferença e os caminhos em lote (bulk_create) chamam `record_transactions`.
+Os deltas são aplicados com um único `INSERT ... ON CONFLICT DO UPDATE`
+(Postgres e SQLite), sem ler a linha antes.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from .caching import bump_tenant_version
+
+
+def rollup_key(barbershop_id, date, type, status, payment_method):
+    """Chave do rollup; transações sem barbearia não entram na consolidação"""
+    if not barbershop_id or date is None:
+        return None
+    day = timezone.localdate(date) if timezone.is_aware(date) else date.date()
+    return (barbershop_id, day, type, status, payment_method or '')
+
+
+def transaction_key(tx):
+    return rollup_key(tx.barbershop_id, tx.date, tx.type, tx.status, tx.payment_method)
+
+
+def transaction_state(tx):
+    """(chave, valor) que a transação representa hoje nos rollups"""
+    return transaction_key(tx), Decimal(str(tx.amount))
+
+
+def state_deltas(previous, current):
+    """Diferença entre dois estados (chave, valor); qualquer um pode ser None"""
+    deltas = defaultdict(lambda: (Decimal('0'), 0))
+    for state, sign in ((previous, -1), (current, 1)):
+        if state and state[0] is not None:
+            total, count = deltas[state[0]]
+            deltas[state[0]] = (total + sign * state[1], count + sign)
+    return deltas
+
+
+def apply_deltas(deltas):
+    """
+    Aplica {chave: (delta_total, delta_count)} somando nas linhas existentes.
+    Deve rodar na mesma transação que alterou as transações de origem.
+    """
+    from .models import DailyFinancialRollup
+
+    rows = [
+        (*key, Decimal(total), count)
+        for key, (total, count) in deltas.items()
+        if total or count
+    ]
+    if not rows:
+        return
+
+    table = connection.ops.quote_name(DailyFinancialRollup._meta.db_table)
+    columns = ('barbershop_id', 'day', 'type', 'status', 'payment_method', 'total', 'count')
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} "
+        f"ON CONFLICT (barbershop_id, day, type, status, payment_method) DO UPDATE SET "
+        f"total = {table}.total + EXCLUDED.total, count = {table}.count + EXCLUDED.count"
+    )
+    params = [value for row in rows for value in row]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_transactions(transactions, sign=1):
+    """Soma (ou subtrai, com sign=-1) um lote de transações nos rollups"""
+    deltas = defaultdict(lambda: (Decimal('0'), 0))
+    for tx in transactions:
+        key, amount = transaction_state(tx)
+        if key is None:
+            continue
+        total, count = deltas[key]
+        deltas[key] = (total + sign * amount, count + sign)
+    apply_deltas(deltas)
+    for barbershop_id in {key[0] for key in deltas}:
+        bump_tenant_version(barbershop_id, 'analytics')
+
+
+def rebuild_rollups(barbershop_ids=None):
+    """Recalcula os rollups a partir das transações (backfill/correção)"""
+    from django.db.models import Count, Sum, Value
+    from django.db.models.functions import Coalesce, TruncDate
+    from .models import DailyFinancialRollup, Transaction
+
+    transactions = Transaction.objects.filter(barbershop__isnull=False)
+    rollups = DailyFinancialRollup.objects.all()
+    if barbershop_ids is not None:
+        transactions = transactions.filter(barbershop_id__in=barbershop_ids)
+        rollups = rollups.filter(barbershop_id__in=barbershop_ids)
+
+    grouped = (
+        transactions.order_by()
+        .annotate(day=TruncDate('date', tzinfo=timezone.get_current_timezone()), method=Coalesce('payment_method', Value('')))
+        .values('barbershop_id', 'day', 'type', 'status', 'method')
+        .annotate(total=Sum('amount'), count=Count('id'))
+    )
+    rollups.delete()
+    return len(DailyFinancialRollup.objects.bulk_create(
+        [
+            DailyFinancialRollup(
+                barbershop_id=row['barbershop_id'], day=row['day'], type=row['type'], status=row['status'],
+                payment_method=row['method'], total=row['total'], count=row['count'],
+            )
+            for row in grouped.iterator()
+        ],
+        batch_size=1000,
+    ))
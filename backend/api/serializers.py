@@ -1,9 +1,89 @@
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
     Barbershop, UserProfile, Service, Customer, CustomerBarbershop, LoyaltyReward, Appointment,
     Availability, ScheduleException, Transaction, Promotion, Product, Barber, TimeSlot, DailyAvailability
 )
+from .images import build_srcset
+
+
+class SparseFieldsetMixin:
+    """
+    Representações enxutas via contexto (`fields`/`expand`, preenchidos pelas
+    views de leitura a partir de ?fields= e ?expand=):
+    - fields: só os campos pedidos são serializados e carregados (`optimize_queryset`);
+    - expand: relações em `expandable_fields` só vêm aninhadas quando pedidas,
+      caso contrário vem apenas o id.
+    """
+    expandable_fields = ()
+    # Campos calculados -> caminhos do ORM que eles leem
+    field_dependencies = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        expand = self.context.get('expand') or frozenset()
+        unknown = (requested - set(fields) if requested else set()) | (expand - set(self.expandable_fields))
+        if unknown:
+            raise serializers.ValidationError({
+                "error": "INVALID_FIELDS", "message": f"Campos desconhecidos: {', '.join(sorted(unknown))}"
+            })
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        for name in self.expandable_fields:
+            if name in fields and name not in expand:
+                source = fields[name].source
+                kwargs = {'source': source} if source and source != name else {}
+                fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, **kwargs)
+        return fields
+
+    def optimize_queryset(self, queryset, narrow=False, extra=()):
+        """
+        select_related/prefetch_related para as relações que os campos ativos leem;
+        com `narrow`, também only() com apenas as colunas necessárias.
+        """
+        opts = queryset.model._meta
+        only, select, prefetch = {opts.pk.name, *extra}, set(), set()
+        for name, field in self.fields.items():
+            if name in self.field_dependencies:
+                paths = self.field_dependencies[name]
+            elif isinstance(field, serializers.ModelSerializer):
+                paths = [
+                    f"{field.source}__{child.source}" for child in field.fields.values()
+                    if child.source != '*' and '.' not in child.source
+                ]
+            elif field.source == '*':
+                paths = []
+            else:
+                paths = [field.source.replace('.', '__')]
+
+            for path in paths:
+                first, _, rest = path.partition('__')
+                try:
+                    model_field = opts.get_field(first)
+                except FieldDoesNotExist:
+                    # Propriedade/método do model: não dá para saber as colunas
+                    narrow = False
+                    continue
+                if model_field.many_to_many or model_field.one_to_many:
+                    prefetch.add(first)
+                elif model_field.is_relation and rest:
+                    select.add(first)
+                    only.add(path)
+                elif model_field.concrete:
+                    only.add(first)
+                else:
+                    select.add(first)
+                    narrow = False
+
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if narrow:
+            queryset = queryset.only(*only)
+        return queryset
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -25,20 +105,31 @@ def fix_relative_url(url):
 
 class BarbershopSerializer(serializers.ModelSerializer):
     trial_days_left = serializers.SerializerMethodField()
+    logo_srcset = serializers.SerializerMethodField()
+    banner_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Barbershop
         fields = [
             'id', 'name', 'slug', 'address', 'phone', 
             'logo', 'banner', 'primary_color', 'is_active', 'created_at', 
-            'trial_days_left', 'plan', 'onboarding_completed', 'pix_key'
+            'trial_days_left', 'plan', 'onboarding_completed', 'pix_key', 'image_status',
+            'logo_srcset', 'banner_srcset'
         ]
+        read_only_fields = ['image_status']
 
     def get_trial_days_left(self, obj):
         from django.utils import timezone
-        delta = timezone.now() - obj.created_at
-        days_left = 15 - delta.days
-        return max(0, days_left)
+        # Dias de calendário locais: o valor vira à meia-noite, junto com o dia
+        # que entra no ETag da configuração (api.conditional)
+        elapsed = (timezone.localdate() - timezone.localdate(obj.created_at)).days
+        return max(0, 15 - elapsed)
+
+    def get_logo_srcset(self, obj):
+        return build_srcset(obj, 'logo')
+
+    def get_banner_srcset(self, obj):
+        return build_srcset(obj, 'banner')
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
@@ -46,16 +137,24 @@ class BarbershopSerializer(serializers.ModelSerializer):
         ret['banner'] = fix_relative_url(ret.get('banner'))
         return ret
 
-class BarberSerializer(serializers.ModelSerializer):
+class BarberSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    profile_picture_srcset = serializers.SerializerMethodField()
+    expandable_fields = ('user',)
+    field_dependencies = {'profile_picture_srcset': ['profile_picture', 'image_status']}
+
     class Meta:
         model = Barber
         fields = '__all__'
-        read_only_fields = ['barbershop']
+        read_only_fields = ['barbershop', 'image_status']
+
+    def get_profile_picture_srcset(self, obj):
+        return build_srcset(obj, 'profile_picture')
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['profile_picture'] = fix_relative_url(ret.get('profile_picture'))
+        if 'profile_picture' in ret:
+            ret['profile_picture'] = fix_relative_url(ret['profile_picture'])
         return ret
 
 class TimeSlotSerializer(serializers.ModelSerializer):
@@ -63,7 +162,7 @@ class TimeSlotSerializer(serializers.ModelSerializer):
         model = TimeSlot
         fields = ['start_time', 'end_time']
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     price = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False)
 
@@ -72,24 +171,31 @@ class ServiceSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'price', 'duration', 'buffer_time', 'description', 'is_active', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at', 'barbershop']
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     lastVisit = serializers.SerializerMethodField()
     totalSpent = serializers.SerializerMethodField()
     points = serializers.SerializerMethodField()
     notes = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
     user = UserSerializer(read_only=True)
-    
+    expandable_fields = ('user',)
+    field_dependencies = {'profile_picture_srcset': ['profile_picture', 'image_status']}
+
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'phone', 'birth_date', 'profile_picture', 'lastVisit', 'totalSpent', 'notes', 'points', 'created_at', 'updated_at', 'user']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'phone', 'birth_date', 'profile_picture', 'profile_picture_srcset', 'image_status', 'lastVisit', 'totalSpent', 'notes', 'points', 'created_at', 'updated_at', 'user']
+        read_only_fields = ['id', 'image_status', 'created_at', 'updated_at']
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
-        ret['profile_picture'] = fix_relative_url(ret.get('profile_picture'))
+        if 'profile_picture' in ret:
+            ret['profile_picture'] = fix_relative_url(ret['profile_picture'])
         return ret
 
+    def get_profile_picture_srcset(self, obj):
+        return build_srcset(obj, 'profile_picture')
+
     def get_lastVisit(self, obj):
         barbershop = self.context.get('request').barbershop if self.context.get('request') else None
         if not barbershop: return None
@@ -114,7 +220,7 @@ class CustomerSerializer(serializers.ModelSerializer):
         cb = CustomerBarbershop.objects.filter(customer=obj, barbershop=barbershop).first()
         return cb.notes if cb else ""
 
-class LoyaltyRewardSerializer(serializers.ModelSerializer):
+class LoyaltyRewardSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     pointsRequired = serializers.IntegerField(source='points_required')
     
@@ -123,7 +229,7 @@ class LoyaltyRewardSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'pointsRequired', 'type', 'created_at']
         read_only_fields = ['id', 'created_at', 'barbershop']
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     clientName = serializers.CharField(source='client_name')
     clientPhone = serializers.CharField(source='client_phone', required=False, allow_null=True, allow_blank=True)
@@ -141,7 +247,12 @@ class AppointmentSerializer(serializers.ModelSerializer):
     barber_whatsapp = serializers.ReadOnlyField(source='barber.whatsapp')
     total_price = serializers.SerializerMethodField()
     slot = TimeSlotSerializer(read_only=True)
-    
+    field_dependencies = {
+        'service_names': ['services'],
+        'total_price': ['services'],
+        'clientPhone': ['client_phone', 'customer__phone'],
+    }
+
     class Meta:
         model = Appointment
         fields = [
@@ -163,8 +274,10 @@ class AppointmentSerializer(serializers.ModelSerializer):
         super().__init__(*args, **kwargs)
         request = self.context.get('request')
         if request and hasattr(request, 'barbershop'):
-            self.fields['serviceIds'].queryset = Service.objects.filter(barbershop=request.barbershop)
-            self.fields['barberId'].queryset = Barber.objects.filter(barbershop=request.barbershop)
+            if 'serviceIds' in self.fields:
+                self.fields['serviceIds'].queryset = Service.objects.filter(barbershop=request.barbershop)
+            if 'barberId' in self.fields:
+                self.fields['barberId'].queryset = Barber.objects.filter(barbershop=request.barbershop)
 
     def update(self, instance, validated_data):
         if instance.status == 'confirmed' and ('date' in validated_data or 'services' in validated_data or 'barber' in validated_data):
@@ -175,7 +288,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
         ret = super().to_representation(instance)
         
         # Fallback para o telefone do cliente
-        if not ret.get('clientPhone'):
+        if 'clientPhone' in ret and not ret['clientPhone']:
             if instance.customer and instance.customer.phone:
                 ret['clientPhone'] = instance.customer.phone
 
@@ -188,7 +301,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
         return ret
 
 
-class AvailabilitySerializer(serializers.ModelSerializer):
+class AvailabilitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     dayOfWeek = serializers.IntegerField(source='day_of_week')
     startTime = serializers.TimeField(source='start_time', format='%H:%M', input_formats=['%H:%M', '%H:%M:%S'])
@@ -201,7 +314,7 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'barbershop']
 
 
-class DailyAvailabilitySerializer(serializers.ModelSerializer):
+class DailyAvailabilitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     date = serializers.DateField()
     startTime = serializers.TimeField(source='start_time', format='%H:%M', input_formats=['%H:%M', '%H:%M:%S'])
@@ -214,7 +327,7 @@ class DailyAvailabilitySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'barbershop']
 
 
-class ScheduleExceptionSerializer(serializers.ModelSerializer):
+class ScheduleExceptionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     startTime = serializers.TimeField(source='start_time', format='%H:%M', input_formats=['%H:%M', '%H:%M:%S'], required=False, allow_null=True)
     endTime = serializers.TimeField(source='end_time', format='%H:%M', input_formats=['%H:%M', '%H:%M:%S'], required=False, allow_null=True)
@@ -225,18 +338,19 @@ class ScheduleExceptionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'barbershop']
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     amount = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False)
     paymentMethod = serializers.CharField(source='payment_method', required=False, allow_null=True, allow_blank=True)
+    appointmentId = serializers.PrimaryKeyRelatedField(source='appointment', read_only=True)
     
     class Meta:
         model = Transaction
-        fields = ['id', 'description', 'amount', 'type', 'category', 'date', 'status', 'paymentMethod', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'barbershop']
+        fields = ['id', 'description', 'amount', 'type', 'category', 'date', 'status', 'paymentMethod', 'appointmentId', 'kind', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'barbershop', 'kind']
 
 
-class PromotionSerializer(serializers.ModelSerializer):
+class PromotionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     discount = serializers.DecimalField(max_digits=5, decimal_places=2, coerce_to_string=False)
     serviceId = serializers.PrimaryKeyRelatedField(
@@ -254,7 +368,7 @@ class PromotionSerializer(serializers.ModelSerializer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         request = self.context.get('request')
-        if request and hasattr(request, 'barbershop'):
+        if request and hasattr(request, 'barbershop') and 'serviceId' in self.fields:
             self.fields['serviceId'].queryset = Service.objects.filter(barbershop=request.barbershop)
 
     def to_representation(self, instance):
@@ -264,7 +378,7 @@ class PromotionSerializer(serializers.ModelSerializer):
         return ret
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     id = serializers.CharField(read_only=True)
     minStock = serializers.IntegerField(source='min_stock')
     costPrice = serializers.DecimalField(source='cost_price', max_digits=10, decimal_places=2, coerce_to_string=False)
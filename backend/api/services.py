@@ -4,7 +4,7 @@ import requests
 import logging
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Q, Sum
 from rest_framework import exceptions
 from .models import Appointment, TimeSlot, Service, Barber, Availability, ScheduleException, DailyAvailability
 
@@ -67,183 +67,205 @@ class WebhookService:
 
 class BookingService:
     @staticmethod
-    def get_available_slots(barbershop, barber_id, service_ids, target_date):
+    def _normalize_service_ids(service_ids):
+        """service_ids pode ser um ID único, uma lista de IDs ou uma string separada por vírgulas"""
+        if isinstance(service_ids, str):
+            return [int(sid.strip()) for sid in service_ids.split(',') if sid.strip()]
+        if isinstance(service_ids, (int, float)):
+            return [int(service_ids)]
+        # Converte elementos para int, lidando com strings numéricas
+        new_ids = []
+        for sid in service_ids:
+            if isinstance(sid, str) and ',' in sid:
+                new_ids.extend([int(x.strip()) for x in sid.split(',') if x.strip()])
+            else:
+                new_ids.append(int(sid))
+        return new_ids
+
+    @staticmethod
+    def _slot_queries(barbershop, barber_id, service_ids, target_date):
         """
-        Calcula horários disponíveis dinamicamente para um barbeiro, serviços e data.
-        service_ids pode ser um ID único, uma lista de IDs ou uma string separada por vírgulas.
+        Consultas do cálculo de horários, montadas uma vez e executadas pelo loader
+        síncrono ou assíncrono (mesmo SQL nos dois caminhos).
         """
-        # Normaliza service_ids para uma lista de inteiros
-        if isinstance(service_ids, str):
-            service_ids = [int(sid.strip()) for sid in service_ids.split(',') if sid.strip()]
-        elif isinstance(service_ids, (int, float)):
-            service_ids = [int(service_ids)]
-        elif isinstance(service_ids, list):
-            # Converte elementos para int, lidando com strings numéricas
-            new_ids = []
-            for sid in service_ids:
-                if isinstance(sid, str) and ',' in sid:
-                    new_ids.extend([int(x.strip()) for x in sid.split(',') if x.strip()])
-                else:
-                    new_ids.append(int(sid))
-            service_ids = new_ids
-        
-        barber = Barber.objects.get(id=barber_id, barbershop=barbershop)
-        services = Service.objects.filter(id__in=service_ids, barbershop=barbershop, is_active=True)
-        
-        if not services.exists():
-            raise exceptions.ValidationError("NO_SERVICES_SELECTED")
+        blocked = ScheduleException.objects.filter(
+            Q(barber_id=barber_id) | Q(barber__isnull=True),
+            barbershop=barbershop, date=target_date, type='blocked',
+        )
+        # O Django e nosso frontend usam 0=Domingo, 6=Sábado; weekday() do Python usa 0=Segunda
+        django_day = (target_date.weekday() + 1) % 7
+        return {
+            'barber': Barber.objects.filter(id=barber_id, barbershop=barbershop).values_list('buffer_minutes', flat=True),
+            'services': Service.objects.filter(
+                id__in=service_ids, barbershop=barbershop, is_active=True
+            ).values_list('duration', 'buffer_time'),
+            # Prioridade 1: Exceção de Bloqueio (Dia Inteiro), global (barber=None) ou do barbeiro
+            'day_block': blocked.filter(start_time__isnull=True, end_time__isnull=True).values_list('reason', flat=True)[:1],
+            # Intervalos de trabalho: dia específico > expediente estendido > semana
+            'daily': DailyAvailability.objects.filter(
+                barber_id=barber_id, barbershop=barbershop, date=target_date, is_active=True
+            ).values_list('start_time', 'end_time'),
+            'extended': ScheduleException.objects.filter(
+                barber_id=barber_id, barbershop=barbershop, date=target_date, type='extended'
+            ).values_list('start_time', 'end_time'),
+            'weekly': Availability.objects.filter(
+                barber_id=barber_id, barbershop=barbershop, day_of_week=django_day, is_active=True
+            ).values_list('start_time', 'end_time'),
+            # Agendamentos existentes no dia e bloqueios parciais
+            'busy': TimeSlot.objects.filter(
+                appointment__barber_id=barber_id,
+                appointment__barbershop=barbershop,
+                appointment__status__in=['confirmed', 'blocked'],
+                start_time__date=target_date,
+            ).order_by('start_time').values_list('start_time', 'end_time'),
+            'partial_blocks': blocked.filter(
+                start_time__isnull=False, end_time__isnull=False
+            ).values_list('start_time', 'end_time', 'reason'),
+        }
 
-        # Soma total de duração e buffers
-        total_duration_mins = sum([s.duration for s in services])
+    @staticmethod
+    def _slot_inputs(buffer_minutes, services):
+        if buffer_minutes is None:
+            raise Barber.DoesNotExist("Barber matching query does not exist.")
+        if not services:
+            raise exceptions.ValidationError("NO_SERVICES_SELECTED")
         # Usamos o maior valor entre a soma dos buffers dos serviços ou o buffer padrão do barbeiro
-        total_buffer_mins = max(sum([s.buffer_time for s in services]), barber.buffer_minutes)
-        
-        total_needed_mins = total_duration_mins + total_buffer_mins
-        duration_delta = timedelta(minutes=total_duration_mins)
-
-        # Prioridade 1: Exceção de Bloqueio (Dia Inteiro)
-        # Verificamos se há bloqueio global (barber=None) ou específico para este barbeiro
-        exception_blocked_whole_day = ScheduleException.objects.filter(
-            Q(barber=barber) | Q(barber__isnull=True),
-            barbershop=barbershop, 
-            date=target_date, 
-            type='blocked',
-            start_time__isnull=True,
-            end_time__isnull=True
-        ).first()
-        
-        if exception_blocked_whole_day:
-            return [], exception_blocked_whole_day.reason
-
-        # Determinação dos intervalos de trabalho...
-        daily = DailyAvailability.objects.filter(barber=barber, barbershop=barbershop, date=target_date, is_active=True)
-        working_intervals = []
-        if daily.exists():
-            for d in daily:
-                working_intervals.append({'start_time': d.start_time, 'end_time': d.end_time})
-        else:
-            exceptions_extended = ScheduleException.objects.filter(barber=barber, barbershop=barbershop, date=target_date, type='extended')
-            if exceptions_extended.exists():
-                for ex in exceptions_extended:
-                    working_intervals.append({'start_time': ex.start_time, 'end_time': ex.end_time})
-            else:
-                # O Django e nosso frontend usam 0=Domingo, 6=Sábado.
-                # target_date.weekday() do Python retorna 0=Segunda, 6=Domingo.
-                # Ajuste para converter Python Weekday para nosso formato (0=Domingo):
-                django_day = (target_date.weekday() + 1) % 7
-                
-                availabilities = Availability.objects.filter(
-                    barber=barber, 
-                    barbershop=barbershop, 
-                    day_of_week=django_day, 
-                    is_active=True
-                )
-                for av in availabilities:
-                    working_intervals.append({'start_time': av.start_time, 'end_time': av.end_time})
+        return {
+            'duration': sum(duration for duration, _ in services),
+            'buffer': max(sum(buffer for _, buffer in services), buffer_minutes),
+            'day_block': None,
+            'intervals': [],
+            'busy': [],
+            'partial_blocks': [],
+        }
 
-        if not working_intervals:
-            return [], None
+    @staticmethod
+    def load_slot_inputs(barbershop, barber_id, service_ids, target_date):
+        """Carrega do banco tudo que `compute_available_slots` precisa (caminho síncrono)"""
+        queries = BookingService._slot_queries(
+            barbershop, barber_id, BookingService._normalize_service_ids(service_ids), target_date
+        )
+        inputs = BookingService._slot_inputs(queries['barber'].first(), list(queries['services']))
+        day_block = list(queries['day_block'])
+        if day_block:
+            inputs['day_block'] = day_block
+            return inputs
+        for name in ('daily', 'extended', 'weekly'):
+            inputs['intervals'] = list(queries[name])
+            if inputs['intervals']:
+                break
+        if inputs['intervals']:
+            inputs['busy'] = list(queries['busy'])
+            inputs['partial_blocks'] = list(queries['partial_blocks'])
+        return inputs
 
-        # Agendamentos existentes no dia e bloqueios parciais
-        existing_slots_qs = TimeSlot.objects.filter(
-            appointment__barber=barber,
-            appointment__barbershop=barbershop,
-            appointment__status__in=['confirmed', 'blocked'],
-            start_time__date=target_date
+    @staticmethod
+    async def aload_slot_inputs(barbershop, barber_id, service_ids, target_date):
+        """Mesmo que `load_slot_inputs`, com o ORM assíncrono (views ASGI)"""
+        queries = BookingService._slot_queries(
+            barbershop, barber_id, BookingService._normalize_service_ids(service_ids), target_date
+        )
+        inputs = BookingService._slot_inputs(
+            await queries['barber'].afirst(), [row async for row in queries['services']]
         )
+        day_block = [reason async for reason in queries['day_block']]
+        if day_block:
+            inputs['day_block'] = day_block
+            return inputs
+        for name in ('daily', 'extended', 'weekly'):
+            inputs['intervals'] = [row async for row in queries[name]]
+            if inputs['intervals']:
+                break
+        if inputs['intervals']:
+            inputs['busy'] = [row async for row in queries['busy']]
+            inputs['partial_blocks'] = [row async for row in queries['partial_blocks']]
+        return inputs
+
+    @staticmethod
+    def compute_available_slots(inputs, target_date, now=None):
+        """
+        Calcula os horários livres a partir dos dados carregados, sem acessar o banco.
+        Retorna (horários, motivo do bloqueio ou None).
+        """
+        if inputs['day_block']:
+            return [], inputs['day_block'][0]
+
+        working_intervals = inputs['intervals']
+        if not working_intervals:
+            return [], None
 
         # Garantimos que todos os slots existentes estejam no fuso horário local para comparação
-        slots_local = []
-        for s in existing_slots_qs.order_by('start_time'):
+        slots_local = [
+            {'start': timezone.localtime(start), 'end': timezone.localtime(end)}
+            for start, end in inputs['busy']
+        ]
+        for start, end, _ in inputs['partial_blocks']:
             slots_local.append({
-                'start': timezone.localtime(s.start_time),
-                'end': timezone.localtime(s.end_time)
+                'start': timezone.make_aware(datetime.combine(target_date, start)),
+                'end': timezone.make_aware(datetime.combine(target_date, end)),
             })
 
-        # Adiciona bloqueios parciais (ScheduleException de tempo específico)
-        partial_blocks = ScheduleException.objects.filter(
-            Q(barber=barber) | Q(barber__isnull=True),
-            barbershop=barbershop,
-            date=target_date,
-            type='blocked',
-            start_time__isnull=False,
-            end_time__isnull=False
-        )
-        
-        for pb in partial_blocks:
-            pb_start = timezone.make_aware(datetime.combine(target_date, pb.start_time))
-            pb_end = timezone.make_aware(datetime.combine(target_date, pb.end_time))
-            slots_local.append({
-                'start': pb_start,
-                'end': pb_end
-            })
-            
         # Re-ordena para garantir que a lógica de collision skip funcione bem (opcional, mas bom pra clareza)
         slots_local.sort(key=lambda x: x['start'])
 
         slots = []
-        now = timezone.localtime()
+        now = timezone.localtime(now)
+        # Precisamos que caiba a duração + o buffer total dentro do intervalo
+        total_delta = timedelta(minutes=inputs['duration'] + inputs['buffer'])
+
+        for interval_start, interval_end in working_intervals:
+            start_dt = timezone.make_aware(datetime.combine(target_date, interval_start))
+            end_dt = timezone.make_aware(datetime.combine(target_date, interval_end))
 
-        for interval in working_intervals:
-            start_dt = timezone.make_aware(datetime.combine(target_date, interval['start_time']))
-            end_dt = timezone.make_aware(datetime.combine(target_date, interval['end_time']))
-            
             if target_date == now.date() and start_dt < now:
                 start_dt = now
 
             current_time = start_dt
-            # Precisamos que caiba a duração + o buffer total dentro do intervalo
-            total_delta = timedelta(minutes=total_needed_mins)
-            
             while current_time + total_delta <= end_dt:
                 actual_end = current_time + total_delta
-                
+
                 collision = False
                 for slot in slots_local:
                     if current_time < slot['end'] and actual_end > slot['start']:
                         collision = True
                         current_time = slot['end']
                         break
-                
+
                 if not collision:
                     slots.append(current_time)
                     current_time += timedelta(minutes=15) # Passo do grid
 
-        # If no slots were found and it's not a whole day block, we check for other reasons
-        final_slots = sorted(list(set(slots)))
+        final_slots = sorted(set(slots))
         if not final_slots:
-            # Check if there are ANY working intervals at all
-            if not working_intervals:
-                return [], "Nenhum horário de atendimento configurado para este dia."
-            
             # Check if all working intervals are in the past (for today)
             if target_date == now.date():
-                all_past = True
-                for interval in working_intervals:
-                    end_dt = timezone.make_aware(datetime.combine(target_date, interval['end_time']))
-                    if end_dt > now:
-                        all_past = False
-                        break
+                all_past = all(
+                    timezone.make_aware(datetime.combine(target_date, interval_end)) <= now
+                    for _, interval_end in working_intervals
+                )
                 if all_past:
                     return [], "O horário de atendimento para hoje já encerrou."
-            
-            # Check if there are many collisions causing zero slots
+
+            # Se for por conta de bloqueios, retorna o primeiro motivo encontrado
             if slots_local:
-                # Se for por conta de bloqueios, tenta retornar um motivo específico se houver apenas um motivo comum
-                reasons = [pb.reason for pb in partial_blocks if pb.reason]
-                if not reasons:
-                    # Também checa agendamentos tipo 'blocked' se tiverem algum motivo
-                    # (Como Appointment não possui campo reason nativo, checamos ScheduleException primeiro)
-                    pass
-                
+                reasons = [reason for _, _, reason in inputs['partial_blocks'] if reason]
                 if reasons:
-                    # Retorna o primeiro motivo encontrado se for tudo bloqueado
                     return [], reasons[0]
-                    
                 return [], "Todos os horários deste profissional já estão ocupados."
 
         return final_slots, None
 
+    @staticmethod
+    def get_available_slots(barbershop, barber_id, service_ids, target_date):
+        """Calcula horários disponíveis dinamicamente para um barbeiro, serviços e data"""
+        inputs = BookingService.load_slot_inputs(barbershop, barber_id, service_ids, target_date)
+        return BookingService.compute_available_slots(inputs, target_date)
+
+    @staticmethod
+    async def aget_available_slots(barbershop, barber_id, service_ids, target_date):
+        inputs = await BookingService.aload_slot_inputs(barbershop, barber_id, service_ids, target_date)
+        return BookingService.compute_available_slots(inputs, target_date)
+
     @staticmethod
     @transaction.atomic
     def create_appointment(barbershop, barber_id, service_ids, customer_id, client_name, start_time, platform='manual', is_override=False, status='confirmed'):
@@ -319,10 +341,41 @@ class BookingService:
         # Our overlap check filters by status='confirmed'
         return appointment
 
+    @staticmethod
+    def record_appointment_income(appointment, kind, **fields):
+        """
+        Cria a receita do agendamento para o `kind` ('completion' ou 'payment') se
+        ainda não existir. A unicidade (appointment, kind) no banco garante que
+        chamadas repetidas ou simultâneas não dupliquem o faturamento.
+        Retorna (transação, criada).
+        """
+        from .models import Transaction
+        return Transaction.objects.get_or_create(
+            appointment=appointment, kind=kind,
+            defaults={'barbershop_id': appointment.barbershop_id, 'type': 'income', **fields},
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def confirm_payment(appointment_id):
+        """Marca o agendamento como pago e registra a receita uma única vez"""
+        appointment = Appointment.objects.select_for_update().get(id=appointment_id)
+        if appointment.payment_status != 'PAID':
+            appointment.payment_status = 'PAID'
+            appointment.save()
+
+        BookingService.record_appointment_income(
+            appointment, 'payment',
+            category='service',
+            amount=sum([s.price for s in appointment.services.all()]),
+            description=f"Pagamento Confirmado - {appointment.client_name}",
+            date=timezone.now()
+        )
+        return appointment
+
     @staticmethod
     @transaction.atomic
     def complete_appointment(appointment_id):
-        from .models import Transaction, CustomerBarbershop
         appointment = Appointment.objects.select_for_update().get(id=appointment_id)
         
         if appointment.status == 'completed':
@@ -336,27 +389,281 @@ class BookingService:
         service_names = ", ".join([s.name for s in services_list])
         total_price = sum([s.price for s in services_list])
 
-        # Create income transaction within barbershop context
-        Transaction.objects.create(
-            barbershop=appointment.barbershop,
+        # Create income transaction within barbershop context (uma por agendamento)
+        _, created = BookingService.record_appointment_income(
+            appointment, 'completion',
             description=f"Atendimento: {appointment.client_name} ({service_names})",
             amount=total_price,
-            type='income',
             category='Atendimento',
             date=timezone.now(),
             status='paid',
             payment_method='pix'
         )
 
-        # Update customer stats in the pivot table for THIS barbershop
-        if appointment.customer:
-            cb, created = CustomerBarbershop.objects.get_or_create(
-                customer=appointment.customer,
-                barbershop=appointment.barbershop
-            )
-            cb.total_spent += total_price
-            cb.points += int(total_price)
-            cb.last_visit = timezone.now().date()
-            cb.save()
+        # Update customer stats in the pivot table for THIS barbershop (upsert atômico, sem ler a linha)
+        if created and appointment.customer_id:
+            LoyaltyService.record_visits([
+                (appointment.customer_id, appointment.barbershop_id, total_price, timezone.localdate(), appointment.id)
+            ])
 
         return appointment
+
+    @staticmethod
+    def complete_appointments(barbershop, appointment_ids=None, day=None, barber_id=None):
+        """
+        Conclusão em lote (fechamento do dia): trava as linhas uma vez, soma os
+        serviços com um único aggregate, grava as transações com bulk_create e
+        aplica a fidelidade agrupada por cliente num único upsert.
+        Só agendamentos confirmados ou pendentes são concluídos: concluídos, cancelados e
+        bloqueios de agenda ('blocked') ficam como estão. Retorna os ids concluídos.
+        """
+        from collections import defaultdict
+        from decimal import Decimal
+        from django.db.models import DecimalField, Value
+        from django.db.models.functions import Coalesce
+        from .caching import bump_tenant_version
+        from .events import appointment_event, publish_after_commit, slots_changed
+        from .models import Transaction
+        from .rollups import record_transactions
+
+        queryset = Appointment.objects.filter(barbershop=barbershop, status__in=['confirmed', 'pending'])
+        if appointment_ids is not None:
+            queryset = queryset.filter(id__in=appointment_ids)
+        if barber_id:
+            queryset = queryset.filter(barber_id=barber_id)
+        if day:
+            tz = timezone.get_current_timezone()
+            start = timezone.make_aware(datetime.combine(day, time.min), tz)
+            queryset = queryset.filter(date__gte=start, date__lt=start + timedelta(days=1))
+
+        now = timezone.now()
+        with transaction.atomic():
+            locked_ids = list(queryset.select_for_update().order_by('id').values_list('id', flat=True))
+            if not locked_ids:
+                return []
+
+            totals = (
+                Appointment.objects.filter(id__in=locked_ids).order_by('id')
+                .values('id', 'customer_id', 'client_name', 'barber_id', 'date')
+                .annotate(total=Coalesce(Sum('services__price'), Value(Decimal('0')), output_field=DecimalField()))
+            )
+            names = defaultdict(list)
+            for appointment_id, name in Appointment.services.through.objects.filter(
+                appointment_id__in=locked_ids
+            ).order_by('id').values_list('appointment_id', 'service__name'):
+                names[appointment_id].append(name)
+
+            Appointment.objects.filter(id__in=locked_ids).update(status='completed', updated_at=now)
+            # Receita já registrada (unicidade appointment/kind): não gera transação nem pontos de novo
+            recorded = set(
+                Transaction.objects.filter(appointment_id__in=locked_ids, kind='completion')
+                .order_by().values_list('appointment_id', flat=True)
+            )
+
+            transactions = []
+            visits = []
+            visit_date = timezone.localdate(now)
+            for row in totals:
+                if row['id'] in recorded:
+                    continue
+                transactions.append(Transaction(
+                    barbershop=barbershop,
+                    appointment_id=row['id'],
+                    kind='completion',
+                    description=f"Atendimento: {row['client_name']} ({', '.join(names[row['id']])})",
+                    amount=row['total'],
+                    type='income',
+                    category='Atendimento',
+                    date=now,
+                    status='paid',
+                    payment_method='pix',
+                ))
+                if row['customer_id']:
+                    visits.append((row['customer_id'], barbershop.id, row['total'], visit_date, row['id']))
+
+            # bulk_create e update() não passam pelo save(): rollups e cache são atualizados aqui
+            record_transactions(Transaction.objects.bulk_create(transactions, batch_size=1000))
+            LoyaltyService.record_visits(visits)
+            bump_tenant_version(barbershop.id, 'analytics')
+            for row in totals:
+                publish_after_commit(barbershop.id, appointment_event(
+                    'appointment.completed', row['id'], row['barber_id'], row['date'], 'completed'
+                ))
+            # Concluídos deixam de ocupar o horário: invalida o bootstrap e avisa os clientes do SSE
+            for barber_id, day in {(row['barber_id'], timezone.localdate(row['date'])) for row in totals}:
+                slots_changed(barbershop.id, barber_id, day)
+
+        return locked_ids
+
+
+class LoyaltyService:
+    """
+    Pontos de fidelidade por barbearia. Todo movimento vira lançamento em
+    LoyaltyLedger (gravados em lote, com um `batch` comum) e o saldo em cache
+    CustomerBarbershop.points é alterado na mesma transação com UPDATE/UPSERT
+    atômicos no banco: nada de ler, somar em Python e salvar.
+    """
+
+    @staticmethod
+    def _write_ledger(entries, batch):
+        """Grava lançamentos (customer_id, barbershop_id, tipo, pontos, appointment_id, descrição)"""
+        from .models import LoyaltyLedger
+
+        now = timezone.now()
+        LoyaltyLedger.objects.bulk_create(
+            [
+                LoyaltyLedger(
+                    customer_id=customer_id, barbershop_id=barbershop_id, kind=kind, points=points,
+                    appointment_id=appointment_id, description=description, batch=batch, created_at=now,
+                )
+                for customer_id, barbershop_id, kind, points, appointment_id, description in entries
+                if points
+            ],
+            batch_size=1000,
+        )
+
+    @staticmethod
+    def _debit(customer_id, barbershop_id, points):
+        """UPDATE condicional (saldo >= pedido). Retorna o saldo restante ou None."""
+        from django.db import connection
+        from .models import CustomerBarbershop
+
+        table = connection.ops.quote_name(CustomerBarbershop._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET points = points - %s, updated_at = %s "
+                f"WHERE customer_id = %s AND barbershop_id = %s AND points >= %s "
+                f"RETURNING points",
+                [points, connection.ops.adapt_datetimefield_value(timezone.now()), customer_id, barbershop_id, points]
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def record_visits(visits):
+        """
+        Soma visitas em CustomerBarbershop com um único INSERT ... ON CONFLICT DO UPDATE
+        e grava um lançamento 'earn' por visita. `visits` é uma lista de
+        (customer_id, barbershop_id, valor, data_da_visita, appointment_id);
+        cada real gasto vale um ponto.
+        """
+        import uuid
+        from collections import defaultdict
+        from decimal import Decimal
+        from django.db import connection
+        from .models import CustomerBarbershop
+
+        totals = defaultdict(lambda: [Decimal('0'), 0, None])
+        entries = []
+        for customer_id, barbershop_id, amount, visit_date, appointment_id in visits:
+            amount = Decimal(str(amount))
+            entry = totals[(customer_id, barbershop_id)]
+            entry[0] += amount
+            entry[1] += int(amount)
+            entry[2] = max(entry[2], visit_date) if entry[2] else visit_date
+            entries.append((customer_id, barbershop_id, 'earn', int(amount), appointment_id, 'Atendimento concluído'))
+        if not totals:
+            return
+
+        table = connection.ops.quote_name(CustomerBarbershop._meta.db_table)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        rows = [
+            (customer_id, barbershop_id, visit_date.isoformat(), amount, '', points, now)
+            for (customer_id, barbershop_id), (amount, points, visit_date) in totals.items()
+        ]
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+        sql = (
+            f"INSERT INTO {table} (customer_id, barbershop_id, last_visit, total_spent, notes, points, updated_at) "
+            f"VALUES {placeholders} "
+            f"ON CONFLICT (customer_id, barbershop_id) DO UPDATE SET "
+            f"total_spent = {table}.total_spent + EXCLUDED.total_spent, "
+            f"points = {table}.points + EXCLUDED.points, "
+            f"last_visit = EXCLUDED.last_visit, "
+            f"updated_at = EXCLUDED.updated_at"
+        )
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [value for row in rows for value in row])
+            LoyaltyService._write_ledger(entries, uuid.uuid4())
+
+    @staticmethod
+    def redeem_points(customer_id, barbershop_id, points, description='Resgate de pontos'):
+        """
+        Debita pontos com um UPDATE condicional (points >= pedido) e grava o resgate.
+        Retorna o saldo restante, ou None se o saldo for insuficiente/vínculo inexistente.
+        """
+        import uuid
+
+        with transaction.atomic():
+            remaining = LoyaltyService._debit(customer_id, barbershop_id, points)
+            if remaining is not None:
+                LoyaltyService._write_ledger(
+                    [(customer_id, barbershop_id, 'redeem', -points, None, description)], uuid.uuid4()
+                )
+        return remaining
+
+    @staticmethod
+    def expire_points(cutoff, dry_run=False):
+        """
+        Expira, em todas as barbearias, os pontos ganhos antes de `cutoff` que ainda
+        não foram consumidos. Os débitos consomem primeiro os créditos mais antigos,
+        então o valor a expirar por cliente é:
+            créditos anteriores ao corte + todos os débitos (negativos), se > 0.
+        Tudo em SQL por conjunto: um INSERT ... SELECT no ledger e um UPDATE dos
+        saldos a partir do lote. Retorna (clientes afetados, pontos expirados).
+        """
+        import uuid
+        from django.db import connection
+        from .models import CustomerBarbershop, LoyaltyLedger
+
+        ledger = connection.ops.quote_name(LoyaltyLedger._meta.db_table)
+        balances = connection.ops.quote_name(CustomerBarbershop._meta.db_table)
+        batch = uuid.uuid4()
+        now = timezone.now()
+        batch_param = LoyaltyLedger._meta.get_field('batch').get_db_prep_value(batch, connection)
+        cutoff_param = connection.ops.adapt_datetimefield_value(cutoff)
+        now_param = connection.ops.adapt_datetimefield_value(now)
+
+        stale = (
+            f"SELECT barbershop_id, customer_id, "
+            f"SUM(CASE WHEN points > 0 AND created_at < %s THEN points ELSE 0 END) "
+            f"+ SUM(CASE WHEN points < 0 THEN points ELSE 0 END) AS stale "
+            f"FROM {ledger} GROUP BY barbershop_id, customer_id"
+        )
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if dry_run:
+                cursor.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(stale), 0) FROM ({stale}) AS s WHERE stale > 0", [cutoff_param]
+                )
+                customers, points = cursor.fetchone()
+                return customers, int(points)
+
+            if connection.features.has_select_for_update:
+                # Trava os saldos envolvidos: resgates simultâneos esperam a expiração terminar
+                cursor.execute(
+                    f"SELECT id FROM {balances} WHERE points > 0 AND EXISTS ("
+                    f"SELECT 1 FROM {ledger} WHERE {ledger}.customer_id = {balances}.customer_id "
+                    f"AND {ledger}.barbershop_id = {balances}.barbershop_id "
+                    f"AND {ledger}.points > 0 AND {ledger}.created_at < %s) FOR UPDATE",
+                    [cutoff_param]
+                )
+
+            cursor.execute(
+                f"INSERT INTO {ledger} (barbershop_id, customer_id, kind, points, description, batch, created_at) "
+                f"SELECT barbershop_id, customer_id, 'expire', -stale, %s, %s, %s FROM ({stale}) AS s WHERE stale > 0",
+                ['Pontos expirados', batch_param, now_param, cutoff_param]
+            )
+            batch_rows = (
+                f"FROM {ledger} WHERE {ledger}.batch = %s AND {ledger}.customer_id = {balances}.customer_id "
+                f"AND {ledger}.barbershop_id = {balances}.barbershop_id"
+            )
+            cursor.execute(
+                f"UPDATE {balances} SET points = points + (SELECT SUM({ledger}.points) {batch_rows}), "
+                f"updated_at = %s WHERE EXISTS (SELECT 1 {batch_rows})",
+                [batch_param, now_param, batch_param]
+            )
+            customers = cursor.rowcount
+
+        expired = LoyaltyLedger.objects.filter(batch=batch).aggregate(total=Sum('points'))['total'] or 0
+        return customers, -expired
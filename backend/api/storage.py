@@ -0,0 +1,69 @@
+"""
+Storage de mídia endereçado por conteúdo.
+
+O nome final de cada arquivo é o hash SHA-256 do conteúdo, mantendo o diretório do
+`upload_to` e a extensão: `profiles/IMG_1491.jpeg` vira `profiles/<hash>.jpeg`.
+Uploads idênticos caem no mesmo arquivo (sem cópias `IMG_1491_FEWpplE.jpeg`) e
+a URL nunca muda de conteúdo, então pode ser cacheada como `immutable`.
+
+Como um arquivo pode ser compartilhado por várias linhas, nada é apagado no
+momento em que a referência é trocada: a remoção fica com o comando `gc_media`.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_LENGTH = 32
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{%d}\.[A-Za-z0-9]+$' % HASH_LENGTH)
+
+
+def content_hash(content):
+    """SHA-256 do conteúdo, lido em blocos (não carrega o arquivo inteiro em memória)"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.search(name or ''))
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    # Sinaliza para o pipeline de imagens que arquivos podem ser compartilhados
+    deduplicates = True
+
+    def hashed_name(self, name, content):
+        directory, filename = os.path.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, f"{content_hash(content)}{ext}").replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo depende do conteúdo e é calculado em _save
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Arquivo reaproveitado conta como recém-enviado: o gc_media respeita
+            # o período de carência pelo mtime até a nova referência ser commitada
+            os.utime(full_path)
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Grava em arquivo temporário e troca atomicamente: dois uploads idênticos
+        # simultâneos escrevem o mesmo conteúdo no mesmo destino
+        tmp_path = f"{full_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for chunk in content.chunks():
+                f.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(tmp_path, self.file_permissions_mode)
+        os.replace(tmp_path, full_path)
+        return name
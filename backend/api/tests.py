@@ -4,7 +4,7 @@ from django.contrib.auth.models import User
 from rest_framework.exceptions import ValidationError
 from datetime import datetime, time, timedelta
 from .models import Barber, Service, Customer, Availability, Appointment, TimeSlot
-from .services import BookingService
+from .services import BookingService, LoyaltyService
 
 class BookingTestCase(TestCase):
     def setUp(self):
@@ -198,7 +198,7 @@ class CustomerTests(TestCase):
         customer_id = response.data['id']
 
         # Listar
-        response = self.client.get('/api/customers/')
+        response = self.client.get('/api/customers/', HTTP_X_PAGINATION='legacy')
         self.assertEqual(response.status_code, 200)
         # Se for barbeiro, vê todos
         self.assertTrue(any(c['name'] == 'Novo Cliente' for c in response.data))
@@ -244,7 +244,7 @@ class FinancialTests(TestCase):
         })
 
         # Listar e Filtrar
-        response = self.client.get('/api/transactions/')
+        response = self.client.get('/api/transactions/', HTTP_X_PAGINATION='legacy')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 2)
 
@@ -376,3 +376,1732 @@ class ExtraFeatureTests(TestCase):
         response = self.client.get(f'/api/appointments/available_slots/?barberId={self.barber.id}&serviceId={self.service.id}&date={test_date}')
         self.assertEqual(response.status_code, 200)
         self.assertTrue(len(response.data) > 0)
+
+class PixBatchTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_pix', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Pix', slug='pix', owner=self.user, pix_key='11999998888')
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Pix', email='pix@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=50.00, duration=30)
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.appointments = []
+        for hour in (9, 10, 11):
+            apt = Appointment.objects.create(
+                barbershop=self.shop, barber=self.barber, client_name=f'Cliente {hour}', status='confirmed',
+                date=timezone.make_aware(datetime.combine(self.day, time(hour, 0)))
+            )
+            apt.services.set([self.service])
+            self.appointments.append(apt)
+        self.appointments[2].payment_status = 'PAID'
+        self.appointments[2].save()
+        self.client.force_authenticate(user=self.user)
+
+    def test_batch_generates_charges(self):
+        """Gera payment_id e BR Code para todos os agendamentos não pagos do dia"""
+        response = self.client.post(f'/api/appointments/pix-batch/?start={self.day.isoformat()}&qr=false')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        for item in response.data['charges']:
+            self.assertTrue(item['payment_id'].startswith('AGEND-'))
+            self.assertTrue(item['brcode'].startswith('000201'))
+            self.assertEqual(item['amount'], 50.0)
+            self.assertNotIn('qr_code_base64', item)
+        self.assertEqual(Appointment.objects.filter(payment_status='WAITING_PAYMENT').count(), 2)
+
+    def test_batch_printable_sheet(self):
+        """A folha imprimível é entregue em streaming com um QR Code por agendamento"""
+        response = self.client.post(f'/api/appointments/pix-batch/?start={self.day.isoformat()}&output=sheet')
+        self.assertEqual(response.status_code, 200)
+        html = b''.join(response.streaming_content).decode()
+        self.assertEqual(html.count('data:image/png;base64,'), 2)
+
+    def test_large_batch_renders_qr_in_process_pool(self):
+        """Acima de PIX_BATCH_INLINE_THRESHOLD os QR Codes saem do pool de processos, na ordem"""
+        from . import pix
+        day = self.day + timedelta(days=1)
+        for minute in range(pix.PIX_BATCH_INLINE_THRESHOLD + 1):
+            apt = Appointment.objects.create(
+                barbershop=self.shop, barber=self.barber, client_name=f'Lote {minute}', status='confirmed',
+                date=timezone.make_aware(datetime.combine(day, time(9, minute)))
+            )
+            apt.services.set([self.service])
+
+        with self.settings(PIX_BATCH_WORKERS=2):
+            response = self.client.post(f'/api/appointments/pix-batch/?start={day.isoformat()}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], pix.PIX_BATCH_INLINE_THRESHOLD + 1)
+        self.assertIsNotNone(pix._batch_executor)
+        for item in response.data['charges']:
+            self.assertIn(item['payment_id'].replace('-', ''), item['brcode'])
+            self.assertEqual(item['qr_code_base64'], pix.render_qr_code(item['brcode']))
+
+class PixReconciliationTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_rec', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Rec', slug='rec', owner=self.user, pix_key='11999998888')
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Rec', email='rec@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=50.00, duration=30)
+        self.paid = self._appointment('AGEND-0000AAAA', 'PAID')
+        self.waiting = self._appointment('AGEND-0000BBBB', 'WAITING_PAYMENT')
+        self.other = self._appointment('AGEND-0000CCCC', 'WAITING_PAYMENT')
+        self.client.force_authenticate(user=self.user)
+
+    def _appointment(self, payment_id, payment_status):
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, client_name=payment_id, date=timezone.now(),
+            payment_id=payment_id, payment_status=payment_status
+        )
+        apt.services.set([self.service])
+        return apt
+
+    def test_reconcile_csv_statement(self):
+        """Entradas do extrato quitam os agendamentos correspondentes em lote"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from .models import Transaction
+        csv_content = (
+            "Data;Descrição;Valor\n"
+            "15/01/2026;PIX RECEBIDO AGEND0000BBBB;50,00\n"
+            "15/01/2026;PIX RECEBIDO AGEND-0000AAAA;50,00\n"
+            "15/01/2026;PIX RECEBIDO AGEND-FFFFFFFF;10,00\n"
+            "15/01/2026;TARIFA AGEND-0000CCCC;-1,00\n"
+        ).encode('utf-8')
+        response = self.client.post('/api/transactions/reconcile/', {
+            'file': SimpleUploadedFile('extrato.csv', csv_content, content_type='text/csv')
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['matched'], 1)
+        self.assertEqual(response.data['already_paid'], 1)
+        self.assertEqual(response.data['unmatched'], ['AGEND-FFFFFFFF'])
+        self.waiting.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.waiting.payment_status, 'PAID')
+        self.assertEqual(self.other.payment_status, 'WAITING_PAYMENT')
+        self.assertEqual(Transaction.objects.filter(barbershop=self.shop, type='income').count(), 1)
+
+    def test_amount_mismatch_waits_for_review(self):
+        """Valor abaixo do esperado fica sem baixa, a menos que accept_mismatch seja enviado"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        csv_content = "Data;Descrição;Valor\n15/01/2026;PIX RECEBIDO AGEND-0000BBBB;40,00\n".encode('utf-8')
+
+        def post(**extra):
+            return self.client.post('/api/transactions/reconcile/', {
+                'file': SimpleUploadedFile('extrato.csv', csv_content, content_type='text/csv'), **extra
+            }, format='multipart')
+
+        response = post()
+        self.assertEqual((response.data['matched'], response.data['already_paid']), (0, 0))
+        self.assertEqual(response.data['amount_mismatch'], ['AGEND-0000BBBB'])
+        self.waiting.refresh_from_db()
+        self.assertEqual(self.waiting.payment_status, 'WAITING_PAYMENT')
+
+        response = post(accept_mismatch='true')
+        self.assertEqual(response.data['matched'], 1)
+        self.waiting.refresh_from_db()
+        self.assertEqual(self.waiting.payment_status, 'PAID')
+
+    def test_parse_amount_uses_last_separator_as_decimal(self):
+        from decimal import Decimal
+        from .reconciliation import parse_amount
+        cases = {
+            '1.234,56': '1234.56', '1,234.56': '1234.56', 'R$ 50,00': '50.00', '-20,00': '-20.00',
+            '1234.56': '1234.56', '1.234.567': '1234567', '1.234.567,89': '1234567.89',
+        }
+        for raw, expected in cases.items():
+            self.assertEqual(parse_amount(raw), Decimal(expected), raw)
+
+    def test_reconcile_ofx_parser(self):
+        """O parser OFX extrai referência, valor e data de cada STMTTRN"""
+        from io import BytesIO
+        from .reconciliation import iter_ofx_entries
+        ofx = (
+            b"OFXHEADER:100\n<OFX><BANKTRANLIST>\n"
+            b"<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20260115120000[-3:BRT]<TRNAMT>50.00"
+            b"<MEMO>PIX AGEND-0000CCCC</STMTTRN>\n"
+            b"</BANKTRANLIST></OFX>\n"
+        )
+        entries = list(iter_ofx_entries(BytesIO(ofx)))
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0].reference, 'AGEND-0000CCCC')
+        self.assertEqual(str(entries[0].amount), '50.00')
+        self.assertEqual(entries[0].date.day, 15)
+
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.media_root = tempfile.mkdtemp()
+
+    def _upload(self, name='foto.png', size=(2000, 1000)):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 10, 10, 255)).save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_is_optimized_after_commit(self):
+        """O original é salvo na hora e trocado pelo JPEG otimizado depois do commit"""
+        from django.test import override_settings
+        from PIL import Image
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                customer = Customer.objects.create(name='Foto', phone='11900000000', profile_picture=self._upload())
+            self.assertEqual(customer.image_status, 'processing')
+            self.assertTrue(customer.profile_picture.name.endswith('.png'))
+
+            for callback in callbacks:
+                callback()
+            customer.refresh_from_db()
+            self.assertEqual(customer.image_status, 'ready')
+            self.assertTrue(customer.profile_picture.name.endswith('.jpg'))
+            with Image.open(customer.profile_picture.path) as img:
+                self.assertEqual(img.size, (800, 400))
+                self.assertEqual(img.format, 'JPEG')
+
+    def test_unrelated_save_does_not_reprocess(self):
+        """Salvar o modelo sem trocar a imagem não agenda novo processamento"""
+        from django.test import override_settings
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                customer = Customer.objects.create(name='Foto', phone='11900000001', profile_picture=self._upload())
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                customer = Customer.objects.get(id=customer.id)
+                customer.name = 'Outro Nome'
+                customer.save()
+            self.assertEqual(callbacks, [])
+
+    def test_save_without_image_change_runs_single_query(self):
+        """A detecção de troca de imagem é feita em memória, sem SELECT extra"""
+        from django.test import override_settings
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                customer = Customer.objects.create(name='Foto', phone='11900000003', profile_picture=self._upload())
+            customer = Customer.objects.get(id=customer.id)
+            customer.name = 'Sem SELECT'
+            with self.assertNumQueries(1):
+                customer.save()
+
+    def test_new_upload_on_loaded_instance_is_detected(self):
+        """Trocar a imagem de uma instância vinda do banco agenda o processamento"""
+        from django.test import override_settings
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                customer = Customer.objects.create(name='Foto', phone='11900000004', profile_picture=self._upload())
+            customer = Customer.objects.get(id=customer.id)
+            customer.profile_picture = self._upload('nova.png')
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                customer.save(update_fields=['profile_picture'])
+            self.assertEqual(len(callbacks), 1)
+            customer.refresh_from_db()
+            self.assertEqual(customer.image_status, 'processing')
+
+    def test_requeue_stale_images(self):
+        """Job perdido (restart do processo web) é reprocessado pelo requeue_stale_images"""
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test import override_settings
+        with override_settings(MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_ASYNC=False):
+            with self.captureOnCommitCallbacks(execute=False):
+                customer = Customer.objects.create(name='Foto', phone='11900000005', profile_picture=self._upload())
+
+            # Upload recente: o job pode ainda estar rodando
+            call_command('requeue_stale_images', stdout=StringIO())
+            customer.refresh_from_db()
+            self.assertEqual(customer.image_status, 'processing')
+
+            os.utime(customer.profile_picture.path, (0, 0))
+            call_command('requeue_stale_images', stdout=StringIO())
+            customer.refresh_from_db()
+            self.assertEqual(customer.image_status, 'ready')
+            self.assertTrue(customer.profile_picture.name.endswith('.jpg'))
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        self.settings_override = override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMAGE_PROCESSING_ASYNC=False)
+        self.settings_override.enable()
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), (10, 200, 10)).save(buffer, format='JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = Customer.objects.create(
+                name='Variante', phone='11900000002',
+                profile_picture=SimpleUploadedFile('avatar.jpg', buffer.getvalue(), content_type='image/jpeg')
+            )
+        self.customer.refresh_from_db()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def test_srcset_map(self):
+        """O serializer expõe um srcset por formato com as larguras até o limite do campo"""
+        from .serializers import CustomerSerializer
+        srcset = CustomerSerializer(self.customer).data['profile_picture_srcset']
+        self.assertIn('jpg', srcset)
+        self.assertIn('96w', srcset['jpg'])
+        self.assertIn('800w', srcset['jpg'])
+        self.assertNotIn('1200w', srcset['jpg'])
+
+    def test_variant_generated_on_first_request(self):
+        """A variante é gerada e gravada em disco na primeira requisição"""
+        import os
+        from PIL import Image
+        from .images import variant_name
+        name = variant_name(self.customer.profile_picture.name, 96, 'webp')
+        response = self.client.get(f'/media/{name}')
+        self.assertEqual(response.status_code, 200)
+        from django.conf import settings
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        with Image.open(path) as img:
+            self.assertEqual(img.format, 'WEBP')
+            self.assertEqual(img.width, 96)
+
+        # Larguras fora da lista não são geradas
+        bad = variant_name(self.customer.profile_picture.name, 97, 'webp')
+        self.assertEqual(self.client.get(f'/media/{bad}').status_code, 404)
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        self.settings_override = override_settings(MEDIA_ROOT=tempfile.mkdtemp(), IMAGE_PROCESSING_ASYNC=False)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def _upload(self, name):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = BytesIO()
+        Image.new('RGB', (300, 300), (30, 30, 200)).save(buffer, format='JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_identical_uploads_share_one_file(self):
+        """Reenvios do mesmo conteúdo apontam para um único arquivo com nome por hash"""
+        import os
+        from django.conf import settings
+        from .storage import is_hashed_name
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Customer.objects.create(name='A', phone='11900000010', profile_picture=self._upload('IMG_1491.jpeg'))
+            second = Customer.objects.create(name='B', phone='11900000011', profile_picture=self._upload('IMG_1491.jpeg'))
+        first.refresh_from_db()
+        second.refresh_from_db()
+
+        self.assertEqual(first.profile_picture.name, second.profile_picture.name)
+        self.assertTrue(is_hashed_name(first.profile_picture.name))
+        # Um original + um JPEG otimizado (sem cópia por upload); o original sai no gc_media
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'profiles'))), 2)
+
+    def test_gc_removes_only_unreferenced_files(self):
+        """O gc_media apaga órfãos antigos e preserva arquivos referenciados e recentes"""
+        import os
+        from io import StringIO
+        from django.conf import settings
+        from django.core.management import call_command
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(name='A', phone='11900000012', profile_picture=self._upload('a.jpeg'))
+        customer.refresh_from_db()
+
+        profiles = os.path.join(settings.MEDIA_ROOT, 'profiles')
+        orphan = os.path.join(profiles, 'IMG_1491_FEWpplE.jpeg')
+        recent = os.path.join(profiles, 'recem_enviado.jpeg')
+        for path in (orphan, recent):
+            with open(path, 'wb') as f:
+                f.write(b'x')
+        os.utime(orphan, (0, 0))
+        os.utime(customer.profile_picture.path, (0, 0))
+
+        call_command('gc_media', stdout=StringIO())
+
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(recent))
+        self.assertTrue(os.path.exists(customer.profile_picture.path))
+
+    def test_reused_file_is_protected_from_gc(self):
+        """Reenvio de um arquivo existente renova o mtime e o gc_media confere o banco antes de apagar"""
+        import os
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from .storage import ContentAddressedStorage
+        storage = ContentAddressedStorage()
+        name = storage.save('profiles/a.jpeg', self._upload('a.jpeg'))
+        os.utime(storage.path(name), (0, 0))
+        self.assertEqual(storage.save('profiles/b.jpeg', self._upload('b.jpeg')), name)
+        self.assertGreater(os.path.getmtime(storage.path(name)), 0)
+
+        # Referência criada depois da varredura inicial do banco
+        os.utime(storage.path(name), (0, 0))
+        Customer.objects.create(name='A', phone='11900000013')
+        Customer.objects.filter(phone='11900000013').update(profile_picture=name)
+        with mock.patch('api.management.commands.gc_media.referenced_media_names', return_value=set()):
+            call_command('gc_media', stdout=StringIO())
+        self.assertTrue(os.path.exists(storage.path(name)))
+
+class BoundedImageDecodeTests(TestCase):
+    def _jpeg(self, size):
+        from io import BytesIO
+        from PIL import Image
+        buffer = BytesIO()
+        Image.new('RGB', size, (120, 60, 30)).save(buffer, format='JPEG')
+        buffer.seek(0)
+        return buffer
+
+    def test_jpeg_is_decoded_near_target_width(self):
+        """JPEGs grandes são decodificados em escala reduzida (draft) e depois ajustados"""
+        from PIL import Image
+        from .utils import open_for_resize, optimize_image
+        img = open_for_resize(self._jpeg((4000, 2000)), 800)
+        self.assertLess(img.width, 4000)
+        self.assertGreaterEqual(img.width, 800)
+
+        with Image.open(optimize_image(self._jpeg((4000, 2000)), max_width=800)) as result:
+            self.assertEqual(result.size, (800, 400))
+
+    def test_pixel_budget_is_enforced(self):
+        """Imagens acima do orçamento são recusadas antes de decodificar"""
+        from django.core.exceptions import ValidationError as DjangoValidationError
+        from django.test import override_settings
+        from .utils import ImageTooLarge, open_for_resize, validate_image_pixels
+        with self.assertRaises(ImageTooLarge):
+            open_for_resize(self._jpeg((2000, 1000)), 800, max_pixels=1_000_000)
+
+        upload = self._jpeg((2000, 1000))
+        with override_settings(IMAGE_MAX_PIXELS=1_000_000):
+            with self.assertRaises(DjangoValidationError):
+                validate_image_pixels(upload)
+        self.assertEqual(upload.tell(), 0)
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        import os
+        import tempfile
+        from django.test import override_settings
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'profiles'))
+        with open(os.path.join(self.media_root, 'profiles', 'foto.jpg'), 'wb') as f:
+            f.write(b'0123456789')
+        with open(os.path.join(self.media_root, 'segredo.txt'), 'wb') as f:
+            f.write(b'x')
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT=True)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+
+    def test_accel_redirect_hands_transfer_to_nginx(self):
+        """Com X-Accel-Redirect o Django não envia o corpo do arquivo"""
+        response = self.client.get('/media/profiles/foto.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/profiles/foto.jpg')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+        response = self.client.get('/media/profiles/foto.jpg', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_paths_outside_upload_dirs_are_refused(self):
+        """Só diretórios de upload são servidos; traversal e arquivos soltos dão 404"""
+        self.assertEqual(self.client.get('/media/segredo.txt').status_code, 404)
+        self.assertEqual(self.client.get('/media/profiles/../segredo.txt').status_code, 404)
+
+    def test_range_fallback_without_nginx(self):
+        """Sem nginx o Django atende Range de um intervalo com 206"""
+        from django.test import override_settings
+        with override_settings(MEDIA_ACCEL_REDIRECT=False):
+            response = self.client.get('/media/profiles/foto.jpg', HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+class FinancialRollupTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_fin', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Fin', slug='fin', owner=self.user)
+        Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Fin', email='fin@t.com')
+        self.client.force_authenticate(user=self.user)
+
+    def _transaction(self, amount, type='income', status='paid', days_ago=0, **extra):
+        from .models import Transaction
+        return Transaction.objects.create(
+            barbershop=self.shop, description='Teste', category='Atendimento', amount=amount,
+            type=type, status=status, date=timezone.now() - timedelta(days=days_ago), **extra
+        )
+
+    def _rollups(self):
+        from .models import DailyFinancialRollup
+        return sorted(
+            DailyFinancialRollup.objects.filter(barbershop=self.shop, count__gt=0)
+            .values_list('day', 'type', 'status', 'payment_method', 'total', 'count')
+        )
+
+    def test_rollups_follow_create_update_and_delete(self):
+        """Criar, alterar e apagar transações mantém os rollups iguais a um recálculo completo"""
+        from decimal import Decimal
+        from .models import Transaction
+        from .rollups import rebuild_rollups
+        income = self._transaction(50, payment_method='pix')
+        self._transaction(30, payment_method='pix')
+        expense = self._transaction(20, type='expense', status='pending')
+
+        income = Transaction.objects.get(id=income.id)
+        income.amount = Decimal('80.00')
+        income.payment_method = 'card'
+        income.save()
+        expense.status = 'paid'
+        expense.save()
+        self._transaction(10).delete()
+
+        incremental = self._rollups()
+        rebuild_rollups([self.shop.id])
+        self.assertEqual(incremental, self._rollups())
+
+    def test_summary_reads_rollups_in_one_query(self):
+        """O resumo financeiro soma os rollups com um único aggregate condicional"""
+        self._transaction(100)
+        self._transaction(40, type='expense')
+        self._transaction(15, type='expense', status='pending')
+        self._transaction(999, days_ago=60)
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/transactions/summary/')
+        sql = [q['sql'] for q in queries.captured_queries]
+        self.assertEqual(len([q for q in sql if 'api_dailyfinancialrollup' in q]), 1)
+        self.assertFalse([q for q in sql if 'api_transaction' in q])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'total_income': 100.0, 'total_expense': 40.0, 'pending_expense': 15.0, 'balance': 60.0
+        })
+
+        response = self.client.get('/api/transactions/summary/?days=90')
+        self.assertEqual(response.data['total_income'], 1099.0)
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop, Transaction
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_exp', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Exp', slug='exp', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Exp', email='exp@t.com')
+        self.client.force_authenticate(user=self.user)
+        tz = timezone.get_current_timezone()
+        for day, description, amount, type in [(10, '=HYPERLINK("x")', '50.00', 'income'), (12, 'Aluguel', '20.00', 'expense')]:
+            Transaction.objects.create(
+                barbershop=self.shop, description=description, category='Geral', amount=amount, type=type,
+                date=timezone.make_aware(datetime(2026, 1, day, 10, 0), tz)
+            )
+
+    def test_transactions_csv_with_date_range_and_filters(self):
+        """O CSV respeita o intervalo de datas, os filtros da listagem e neutraliza fórmulas"""
+        response = self.client.get('/api/transactions/export/?start=2026-01-01&end=2026-01-11&type=income')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8').lstrip('\ufeff').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('Data;Descrição'))
+        self.assertIn("'=HYPERLINK", lines[1])
+        self.assertIn('50.00', lines[1])
+
+    def test_transactions_xlsx_is_valid_workbook(self):
+        """O XLSX gerado em streaming é um zip válido com uma linha por transação"""
+        import zipfile
+        from io import BytesIO
+        response = self.client.get('/api/transactions/export/?fmt=xlsx')
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row '), 3)
+        self.assertIn('Aluguel', sheet)
+
+    def test_appointments_csv_lists_services(self):
+        """A exportação de agendamentos traz barbeiro, serviços e valor total"""
+        service = Service.objects.create(barbershop=self.shop, name='Corte', price=50.00, duration=30)
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, client_name='Cliente Exp', date=timezone.now()
+        )
+        apt.services.set([service])
+        response = self.client.get('/api/appointments/export/')
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('Cliente Exp;;Barbeiro Exp;Corte;50.00', content)
+
+    def test_invalid_format_is_rejected(self):
+        response = self.client.get('/api/transactions/export/?fmt=pdf')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'INVALID_FORMAT')
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_an', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia An', slug='an', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro An', email='an@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=50.00, duration=30)
+        # Segunda-feira (day_of_week=1) das 09:00 às 17:00 = 480 minutos
+        Availability.objects.create(barbershop=self.shop, barber=self.barber, day_of_week=1, start_time=time(9, 0), end_time=time(17, 0))
+        self.client.force_authenticate(user=self.user)
+
+    def _appointment(self, day, hour, status='confirmed', minutes=60):
+        start = timezone.make_aware(datetime(2026, 1, day, hour, 0))
+        apt = Appointment.objects.create(barbershop=self.shop, barber=self.barber, client_name='C', date=start, status=status)
+        apt.services.set([self.service])
+        TimeSlot.objects.create(appointment=apt, start_time=start, end_time=start + timedelta(minutes=minutes))
+        return apt
+
+    def _get(self, **params):
+        query = {'start': '2026-01-12', 'end': '2026-01-18', **params}
+        response = self.client.get('/api/analytics/', query)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_utilization_revenue_and_weekday_series(self):
+        """Ocupação = minutos reservados ÷ disponíveis; faturamento vem dos concluídos"""
+        self._appointment(12, 10, status='completed')
+        self._appointment(12, 14)
+        self._appointment(13, 10, status='cancelled')
+
+        data = self._get()
+        monday = next(u for u in data['utilization'] if u['bucket'] == '2026-01-12')
+        self.assertEqual((monday['booked_minutes'], monday['available_minutes']), (120, 480))
+        self.assertEqual(monday['utilization'], 0.25)
+        self.assertEqual(data['revenue_by_barber'], [
+            {'bucket': '2026-01-12', 'barber_id': self.barber.id, 'barber_name': 'Barbeiro An', 'revenue': 50.0, 'bookings': 1}
+        ])
+        self.assertEqual(data['bookings_by_weekday'][1]['bookings'], 2)
+        self.assertEqual(data['bookings_by_weekday'][2]['bookings'], 0)
+
+        week = self._get(bucket='week')['utilization']
+        self.assertEqual(len(week), 1)
+        self.assertEqual((week[0]['bucket'], week[0]['booked_minutes']), ('2026-01-12', 120))
+
+    def test_cache_is_invalidated_by_changes(self):
+        """Respostas ficam em cache e são descartadas quando um agendamento muda de dia"""
+        apt = self._appointment(12, 10)
+        self.assertEqual(self._get()['bookings_by_weekday'][1]['bookings'], 1)
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/analytics/', {'start': '2026-01-12', 'end': '2026-01-18'})
+
+        apt = Appointment.objects.get(id=apt.id)
+        apt.date = timezone.make_aware(datetime(2026, 1, 14, 10, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            apt.save()
+        data = self._get()
+        self.assertEqual(data['bookings_by_weekday'][1]['bookings'], 0)
+        self.assertEqual(data['bookings_by_weekday'][3]['bookings'], 1)
+
+    def test_refresh_rebuilds_only_touched_days(self):
+        """Só os pares (barbeiro, dia) alterados são recalculados; a marca d'água tem folga"""
+        from .analytics import refresh_appointment_rollups
+        from .models import AppointmentDailyRollup, Barbershop
+        hour_ago = timezone.now() - timedelta(hours=1)
+        apt = self._appointment(12, 10)
+        self._appointment(16, 10)
+        Appointment.objects.update(updated_at=hour_ago - timedelta(hours=1))
+        self.assertEqual(refresh_appointment_rollups(self.shop), 2)
+        AppointmentDailyRollup.objects.update(refreshed_at=hour_ago)
+        Barbershop.objects.filter(id=self.shop.id).update(rollups_refreshed_at=hour_ago)
+        self.assertEqual(refresh_appointment_rollups(self.shop), 0)
+
+        apt.save()
+        # Gravado logo antes da marca d'água (commit atrasado): ainda entra
+        late = self._appointment(14, 10)
+        Appointment.objects.filter(id=late.id).update(updated_at=hour_ago - timedelta(seconds=2))
+        self.assertEqual(refresh_appointment_rollups(self.shop), 2)
+        untouched = AppointmentDailyRollup.objects.get(day='2026-01-16')
+        self.assertEqual(untouched.refreshed_at, hour_ago)
+        self.assertEqual(AppointmentDailyRollup.objects.get(day='2026-01-14').bookings, 1)
+
+    def test_watermark_advances_when_day_is_emptied(self):
+        """Dia que ficou sem agendamentos não prende a marca d'água (ela fica na barbearia, não nos rollups)"""
+        from .analytics import refresh_appointment_rollups
+        from .models import AppointmentDailyRollup, Barbershop
+        apt = self._appointment(12, 10)
+        self.assertEqual(refresh_appointment_rollups(self.shop), 1)
+        first = Barbershop.objects.get(id=self.shop.id).rollups_refreshed_at
+        apt.delete()
+        self.assertEqual(refresh_appointment_rollups(self.shop), 1)
+        self.assertFalse(AppointmentDailyRollup.objects.exists())
+        self.assertGreater(Barbershop.objects.get(id=self.shop.id).rollups_refreshed_at, first)
+
+    def test_invalid_bucket(self):
+        response = self.client.get('/api/analytics/', {'bucket': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+class LoyaltyUpdateTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_loy', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Loy', slug='loy', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Loy', email='loy@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=45.50, duration=30)
+        self.customer = Customer.objects.create(name='Cliente Loy', phone='11900000020')
+        self.client.force_authenticate(user=self.user)
+
+    def _complete(self):
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, customer=self.customer, client_name='Cliente Loy', date=timezone.now()
+        )
+        apt.services.set([self.service])
+        BookingService.complete_appointment(apt.id)
+
+    def test_completion_upserts_customer_stats(self):
+        """Cada atendimento concluído soma valor e pontos com um upsert atômico"""
+        from decimal import Decimal
+        from .models import CustomerBarbershop
+        self._complete()
+        self._complete()
+        cb = CustomerBarbershop.objects.get(customer=self.customer, barbershop=self.shop)
+        self.assertEqual(cb.total_spent, Decimal('91.00'))
+        self.assertEqual(cb.points, 90)
+        self.assertEqual(cb.last_visit, timezone.localdate().isoformat())
+
+    def test_redeem_is_conditional(self):
+        """O resgate só debita quando há saldo suficiente"""
+        from .models import CustomerBarbershop
+        CustomerBarbershop.objects.create(customer=self.customer, barbershop=self.shop, points=50)
+
+        response = self.client.post(f'/api/customers/{self.customer.id}/redeem_points/', {'points': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['remaining_points'], 20)
+
+        response = self.client.post(f'/api/customers/{self.customer.id}/redeem_points/', {'points': 30})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Pontos insuficientes')
+        self.assertEqual(CustomerBarbershop.objects.get(customer=self.customer).points, 20)
+
+
+class LoyaltyLedgerTests(TestCase):
+    def setUp(self):
+        from .models import Barbershop, CustomerBarbershop
+        owner = User.objects.create_user(username='owner_ledger', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Ledger', slug='ledger', owner=owner)
+        self.other_shop = Barbershop.objects.create(name='Outra Ledger', slug='ledger-2', owner=owner)
+        self.customer = Customer.objects.create(name='Cliente Ledger', phone='11900000030')
+        self.today = timezone.localdate()
+
+    def _balance(self, shop):
+        from .models import CustomerBarbershop
+        return CustomerBarbershop.objects.get(customer=self.customer, barbershop=shop).points
+
+    def _ledger_sum(self, shop):
+        from django.db.models import Sum
+        from .models import LoyaltyLedger
+        return LoyaltyLedger.objects.filter(customer=self.customer, barbershop=shop).aggregate(t=Sum('points'))['t'] or 0
+
+    def test_every_movement_is_recorded(self):
+        """Acúmulos e resgates geram lançamentos e o saldo em cache acompanha a soma"""
+        from .models import LoyaltyLedger
+        LoyaltyService.record_visits([
+            (self.customer.id, self.shop.id, 40, self.today, None),
+            (self.customer.id, self.shop.id, 25.9, self.today, None),
+            (self.customer.id, self.other_shop.id, 10, self.today, None),
+        ])
+        self.assertEqual(LoyaltyService.redeem_points(self.customer.id, self.shop.id, 30), 35)
+        self.assertIsNone(LoyaltyService.redeem_points(self.customer.id, self.shop.id, 100))
+
+        kinds = list(LoyaltyLedger.objects.filter(barbershop=self.shop).order_by('id').values_list('kind', 'points'))
+        self.assertEqual(kinds, [('earn', 40), ('earn', 25), ('redeem', -30)])
+        self.assertEqual(self._balance(self.shop), self._ledger_sum(self.shop))
+        self.assertEqual(self._balance(self.other_shop), 10)
+
+    def test_expiry_consumes_oldest_points_first(self):
+        """Só expiram créditos antigos ainda não consumidos por resgates"""
+        from datetime import timedelta
+        from .models import LoyaltyLedger
+        LoyaltyService.record_visits([(self.customer.id, self.shop.id, 100, self.today, None)])
+        LoyaltyService.record_visits([(self.customer.id, self.other_shop.id, 20, self.today, None)])
+        LoyaltyLedger.objects.filter(kind='earn').update(created_at=timezone.now() - timedelta(days=400))
+        LoyaltyService.record_visits([(self.customer.id, self.shop.id, 50, self.today, None)])
+        LoyaltyService.redeem_points(self.customer.id, self.shop.id, 30)
+
+        cutoff = timezone.now() - timedelta(days=365)
+        self.assertEqual(LoyaltyService.expire_points(cutoff, dry_run=True), (2, 90))
+        self.assertEqual(self._balance(self.shop), 120)
+
+        self.assertEqual(LoyaltyService.expire_points(cutoff), (2, 90))
+        self.assertEqual(self._balance(self.shop), 50)
+        self.assertEqual(self._balance(self.other_shop), 0)
+        self.assertEqual(self._balance(self.shop), self._ledger_sum(self.shop))
+        self.assertEqual(self._balance(self.other_shop), self._ledger_sum(self.other_shop))
+
+        # Rodar de novo não expira nada
+        self.assertEqual(LoyaltyService.expire_points(cutoff), (0, 0))
+
+
+class BulkCompleteTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_bulk', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Bulk', slug='bulk', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Bulk', email='bulk@t.com')
+        self.cut = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+        self.beard = Service.objects.create(barbershop=self.shop, name='Barba', price=25, duration=20)
+        self.customer = Customer.objects.create(name='Cliente Bulk', phone='11900000040')
+        self.client.force_authenticate(user=self.user)
+        self.now = timezone.now()
+
+    def _appointment(self, services, date=None, status='confirmed', customer=True):
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, customer=self.customer if customer else None,
+            client_name='Cliente Bulk', date=date or self.now, status=status,
+        )
+        apt.services.set(services)
+        return apt
+
+    def test_bulk_complete_by_ids(self):
+        """Conclui em lote com poucas queries: transações, rollups e fidelidade agrupada por cliente"""
+        from decimal import Decimal
+        from .models import CustomerBarbershop, DailyFinancialRollup, LoyaltyLedger, Transaction
+        first = self._appointment([self.cut, self.beard])
+        second = self._appointment([self.cut])
+        walk_in = self._appointment([self.beard], customer=False)
+        cancelled = self._appointment([self.cut], status='cancelled')
+        ids = [first.id, second.id, walk_in.id, cancelled.id]
+
+        with self.assertNumQueries(14):
+            response = self.client.post('/api/appointments/bulk_complete/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['completed'], 3)
+        self.assertEqual(Appointment.objects.get(id=cancelled.id).status, 'cancelled')
+        self.assertEqual(Appointment.objects.filter(status='completed').count(), 3)
+
+        self.assertEqual(Transaction.objects.count(), 3)
+        self.assertTrue(Transaction.objects.filter(amount=65, description__contains='Corte, Barba').exists())
+        rollup = DailyFinancialRollup.objects.get(barbershop=self.shop, type='income', status='paid')
+        self.assertEqual((rollup.total, rollup.count), (Decimal('130.00'), 3))
+
+        cb = CustomerBarbershop.objects.get(customer=self.customer, barbershop=self.shop)
+        self.assertEqual((cb.total_spent, cb.points), (Decimal('105.00'), 105))
+        self.assertEqual(LoyaltyLedger.objects.filter(kind='earn').count(), 2)
+
+        # Repetir não gera nada novo
+        response = self.client.post('/api/appointments/bulk_complete/', {'ids': ids}, format='json')
+        self.assertEqual(response.data['completed'], 0)
+        self.assertEqual(Transaction.objects.count(), 3)
+
+    def test_bulk_complete_by_date(self):
+        """Com 'date', só os agendamentos daquele dia são concluídos"""
+        from datetime import timedelta
+        today = self._appointment([self.cut])
+        tomorrow = self._appointment([self.cut], date=self.now + timedelta(days=1))
+
+        response = self.client.post(
+            '/api/appointments/bulk_complete/', {'date': timezone.localdate(self.now).isoformat()}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ids'], [today.id])
+        self.assertEqual(Appointment.objects.get(id=tomorrow.id).status, 'confirmed')
+
+        response = self.client.post('/api/appointments/bulk_complete/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_complete_skips_schedule_blocks(self):
+        """Bloqueios de agenda não viram atendimento nem receita e continuam ocupando o horário"""
+        from .models import Transaction
+        block = self._appointment([], status='blocked', customer=False)
+        pending = self._appointment([self.cut], status='pending')
+
+        response = self.client.post(
+            '/api/appointments/bulk_complete/', {'date': timezone.localdate(self.now).isoformat()}, format='json'
+        )
+        self.assertEqual(response.data['ids'], [pending.id])
+        self.assertEqual(Appointment.objects.get(id=block.id).status, 'blocked')
+        self.assertFalse(Transaction.objects.filter(appointment=block).exists())
+
+    def test_bulk_complete_frees_slots(self):
+        """Concluir em lote incrementa a versão 'slots' e publica slots.changed por barbeiro/dia"""
+        from unittest import mock
+        from .caching import tenant_version
+        self._appointment([self.cut])
+        self._appointment([self.beard])
+        before = tenant_version(self.shop.id, 'slots')
+        with mock.patch('api.events.get_broker') as broker, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/appointments/bulk_complete/', {'date': timezone.localdate(self.now).isoformat()}, format='json'
+            )
+        self.assertNotEqual(tenant_version(self.shop.id, 'slots'), before)
+        slots_events = [c.args[1] for c in broker.return_value.publish.call_args_list if c.args[1]['type'] == 'slots.changed']
+        self.assertEqual(slots_events, [
+            {'type': 'slots.changed', 'barber_id': self.barber.id, 'date': timezone.localdate(self.now).isoformat()}
+        ])
+
+    def test_bulk_complete_invalid_barber(self):
+        response = self.client.post(
+            '/api/appointments/bulk_complete/', {'date': timezone.localdate(self.now).isoformat(), 'barberId': 'abc'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'INVALID_PARAMS')
+
+
+class AppointmentIncomeLinkTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_link', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Link', slug='link', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Link', email='link@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=50, duration=30)
+        self.customer = Customer.objects.create(name='Cliente Link', phone='11900000050')
+        self.client.force_authenticate(user=self.user)
+
+    def _appointment(self, client_name='Cliente Link', **extra):
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, customer=self.customer,
+            client_name=client_name, date=timezone.now(), **extra
+        )
+        apt.services.set([self.service])
+        return apt
+
+    def test_completion_and_payment_are_idempotent(self):
+        """Repetir a conclusão ou a confirmação de pagamento não duplica a receita"""
+        from .models import CustomerBarbershop, Transaction
+        apt = self._appointment()
+        BookingService.complete_appointment(apt.id)
+        Appointment.objects.filter(id=apt.id).update(status='confirmed')
+        BookingService.complete_appointment(apt.id)
+
+        for _ in range(2):
+            response = self.client.post(f'/api/appointments/{apt.id}/confirm-payment/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['payment_status'], 'PAID')
+
+        self.assertEqual(
+            sorted(Transaction.objects.filter(appointment=apt).values_list('kind', flat=True)), ['completion', 'payment']
+        )
+        self.assertEqual(CustomerBarbershop.objects.get(customer=self.customer, barbershop=self.shop).points, 50)
+
+    def test_migration_links_historic_transactions(self):
+        """O backfill vincula pela referência Pix e, por cliente, só quando não há ambiguidade"""
+        import importlib
+        from django.apps import apps
+        from .models import Transaction
+        migration = importlib.import_module('api.migrations.0037_link_appointment_transactions')
+
+        pix = self._appointment(payment_id='AGEND-ABCD1234', payment_status='PAID')
+        done = self._appointment(client_name='Ana', status='completed')
+        twice = [self._appointment(client_name='Bruno', status='completed') for _ in range(2)]
+
+        def income(description):
+            return Transaction.objects.create(
+                barbershop=self.shop, description=description, amount=50, type='income',
+                category='Atendimento', date=timezone.now()
+            )
+
+        pix_tx = income('Pagamento Pix Conciliado - Cliente Link (AGEND-ABCD1234)')
+        done_tx = income('Atendimento: Ana (Corte)')
+        ambiguous = income('Atendimento: Bruno (Corte)')
+
+        migration.link_transactions(apps, None)
+
+        pix_tx.refresh_from_db()
+        done_tx.refresh_from_db()
+        ambiguous.refresh_from_db()
+        self.assertEqual((pix_tx.appointment_id, pix_tx.kind), (pix.id, 'payment'))
+        self.assertEqual((done_tx.appointment_id, done_tx.kind), (done.id, 'completion'))
+        self.assertIsNone(ambiguous.appointment_id)
+        self.assertFalse(Transaction.objects.filter(appointment__in=twice).exists())
+
+
+class N8nNextAppointmentsTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_feed', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Feed', slug='feed', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Feed', email='feed@t.com')
+        self.cut = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+        self.beard = Service.objects.create(barbershop=self.shop, name='Barba', price=25, duration=20)
+        self.customer = Customer.objects.create(name='Cliente Feed', phone='11900000060')
+        self.client.force_authenticate(user=self.user)
+        self.url = '/api/n8n/next-appointments/'
+        self.headers = {'HTTP_X_BARBERSHOP_SLUG': 'feed'}
+
+        now = timezone.now()
+        self.appointments = []
+        for hours in (1, 2, 3, 30):
+            apt = Appointment.objects.create(
+                barbershop=self.shop, barber=self.barber, customer=self.customer, client_name=f'Cliente {hours}h',
+                date=now + timedelta(hours=hours), status='confirmed',
+            )
+            apt.services.set([self.cut, self.beard])
+            self.appointments.append(apt)
+        Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, client_name='Cancelado',
+            date=now + timedelta(hours=1), status='cancelled',
+        )
+
+    def test_feed_pages_with_cursor(self):
+        """Lista os confirmados no horizonte, com serviços do M2M e paginação por cursor"""
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'hours': 24, 'limit': 2}, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        first = response.data['appointments']
+        self.assertEqual([a['client'] for a in first], ['Cliente 1h', 'Cliente 2h'])
+        self.assertEqual(first[0]['service'], 'Corte, Barba')
+        self.assertEqual(first[0]['whatsapp'], '11900000060')
+        self.assertEqual(first[0]['time'], timezone.localtime(self.appointments[0].date).strftime('%H:%M'))
+
+        response = self.client.get(
+            self.url, {'hours': 24, 'limit': 2, 'cursor': response.data['next_cursor']}, **self.headers
+        )
+        self.assertEqual([a['client'] for a in response.data['appointments']], ['Cliente 3h'])
+        self.assertIsNone(response.data['next_cursor'])
+
+        response = self.client.get(self.url, {'cursor': 'lixo'}, **self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_short_circuits_unchanged_feed(self):
+        """Sem mudanças, o If-None-Match responde 304 com uma única consulta à janela"""
+        response = self.client.get(self.url, **self.headers)
+        etag = response['ETag']
+
+        # A barbearia vem do cache de slugs do middleware
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 304)
+
+        self.appointments[0].client_name = 'Renomeado'
+        self.appointments[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_changes_with_joined_rows(self):
+        """Renomear barbeiro ou serviço e trocar o telefone do cliente invalidam o 304"""
+        from datetime import timedelta
+        etag = self.client.get(self.url, **self.headers)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.barber.name = 'Barbeiro Renomeado'
+            self.barber.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['appointments'][0]['barber'], 'Barbeiro Renomeado')
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cut.name = 'Corte Novo'
+            self.cut.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        Customer.objects.filter(id=self.customer.id).update(
+            phone='11900000061', updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['appointments'][0]['whatsapp'], '11900000061')
+
+
+class N8nTodaySummaryTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_sum', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Resumo', slug='resumo', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Resumo', email='sum@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+        self.client.force_authenticate(user=self.user)
+        self.url = '/api/n8n/today-summary/'
+        self.headers = {'HTTP_X_BARBERSHOP_SLUG': 'resumo'}
+        for status in ('confirmed', 'confirmed', 'cancelled'):
+            Appointment.objects.create(
+                barbershop=self.shop, barber=self.barber, client_name='Cliente', date=timezone.now(), status=status
+            )
+
+    def test_summary_is_cached_and_invalidated_by_writes(self):
+        """Um aggregate condicional na primeira chamada; depois só o cache, até a próxima escrita"""
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, **self.headers)
+        self.assertEqual(response.data['total_appointments'], 3)
+        self.assertEqual(response.data['confirmed'], 2)
+        self.assertEqual(response.data['cancelled'], 1)
+        self.assertEqual(response.data['date'], timezone.localdate().isoformat())
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, **self.headers)
+
+        apt = Appointment.objects.filter(status='confirmed').first()
+        apt.services.set([self.service])
+        with self.captureOnCommitCallbacks(execute=True):
+            BookingService.complete_appointment(apt.id)
+
+        response = self.client.get(self.url, **self.headers)
+        self.assertEqual(response.data['confirmed'], 1)
+        self.assertEqual(response.data['completed'], 1)
+        self.assertEqual(response.data['revenue_today'], 40)
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from rest_framework.test import APIClient
+        from .models import Barbershop, CustomerBarbershop, Product
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_sync', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Sync', slug='sync', owner=self.user)
+        self.other = Barbershop.objects.create(name='Outra Sync', slug='sync-2', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Sync', email='sync@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+        self.product = Product.objects.create(barbershop=self.shop, name='Pomada', category='venda', cost_price=10)
+        self.customer = Customer.objects.create(name='Cliente Sync', phone='11900000070')
+        CustomerBarbershop.objects.create(customer=self.customer, barbershop=self.shop)
+        self.client.force_authenticate(user=self.user)
+        self.url = '/api/changes/'
+        self.headers = {'HTTP_X_BARBERSHOP_SLUG': 'sync'}
+
+        # Tudo acima já foi carregado pelo cliente antes do token
+        past = timezone.now() - timedelta(minutes=10)
+        for model in (Service, Product, Customer, CustomerBarbershop, Appointment):
+            model.objects.update(updated_at=past)
+
+    def _token(self):
+        from datetime import timedelta
+        from .changes import encode_token
+        return encode_token(timezone.now() - timedelta(minutes=1))
+
+    def test_returns_only_changes_since_token(self):
+        """Só linhas alteradas depois do token, lápides para exclusões e nada de outras barbearias"""
+        from .models import Product
+        token = self._token()
+        self.assertIn('token', self.client.get(self.url, **self.headers).data)
+
+        self.service.price = 45
+        self.service.save()
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, client_name='Novo', date=timezone.now()
+        )
+        Service.objects.create(barbershop=self.other, name='Corte Outra', price=30, duration=30)
+        product_id = self.product.id
+        self.product.delete()
+
+        response = self.client.get(self.url, {'since': token}, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        changes = response.data['changes']
+        self.assertEqual([s['id'] for s in changes['services']['updated']], [str(self.service.id)])
+        self.assertEqual([a['id'] for a in changes['appointments']['updated']], [str(apt.id)])
+        self.assertEqual(changes['products'], {'updated': [], 'deleted': [str(product_id)]})
+        self.assertEqual(changes['customers']['updated'], [])
+        self.assertFalse(Product.objects.exists())
+
+    def test_customer_link_and_unlink(self):
+        """Mudanças no vínculo (pontos) e desvinculação aparecem no delta de clientes"""
+        from .models import CustomerBarbershop
+        token = self._token()
+        LoyaltyService.record_visits([(self.customer.id, self.shop.id, 30, timezone.localdate(), None)])
+
+        response = self.client.get(self.url, {'since': token, 'types': 'customers'}, **self.headers)
+        self.assertEqual(list(response.data['changes']), ['customers'])
+        updated = response.data['changes']['customers']['updated']
+        self.assertEqual([(c['id'], c['points']) for c in updated], [(str(self.customer.id), 30)])
+
+        CustomerBarbershop.objects.filter(customer=self.customer).delete()
+        response = self.client.get(self.url, {'since': token, 'types': 'customers'}, **self.headers)
+        self.assertEqual(response.data['changes']['customers'], {'updated': [], 'deleted': [str(self.customer.id)]})
+
+    def test_invalid_and_expired_tokens(self):
+        """Token inválido ou tipo desconhecido: 400; token além da retenção: 410"""
+        from datetime import timedelta
+        from .changes import encode_token
+        self.assertEqual(self.client.get(self.url, {'since': 'abc'}, **self.headers).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'types': 'users'}, **self.headers).status_code, 400)
+        old = encode_token(timezone.now() - timedelta(days=365))
+        response = self.client.get(self.url, {'since': old}, **self.headers)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['error'], 'SYNC_TOKEN_EXPIRED')
+
+
+class LiveEventsTests(TestCase):
+    def setUp(self):
+        from .models import Barbershop
+        self.user = User.objects.create_user(username='barber_live', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Live', slug='live', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Live', email='live@t.com')
+        self.other_barber = Barber.objects.create(barbershop=self.shop, name='Outro Live', email='live2@t.com')
+
+    def _published(self):
+        """Executa as escritas e devolve os eventos publicados após o commit"""
+        from unittest import mock
+        published = []
+        broker = mock.Mock()
+        broker.publish.side_effect = lambda channel, event: published.append((channel, event))
+        return published, mock.patch('api.events.get_broker', return_value=broker)
+
+    def test_appointment_writes_publish_after_commit(self):
+        """Criar e cancelar publicam o evento e a mudança de horários no canal da barbearia"""
+        published, patcher = self._published()
+        with patcher:
+            with self.captureOnCommitCallbacks(execute=True):
+                apt = Appointment.objects.create(
+                    barbershop=self.shop, barber=self.barber, client_name='Live', date=timezone.now()
+                )
+            apt = Appointment.objects.get(id=apt.id)
+            apt.status = 'cancelled'
+            with self.captureOnCommitCallbacks(execute=True):
+                apt.save()
+
+        types = [event['type'] for _, event in published]
+        self.assertEqual(types, ['appointment.created', 'slots.changed', 'appointment.cancelled', 'slots.changed'])
+        self.assertTrue(all(channel == f'barbershop:{self.shop.id}' for channel, _ in published))
+        self.assertEqual(published[2][1]['appointment_id'], apt.id)
+        self.assertEqual(published[1][1]['date'], timezone.localdate(apt.date).isoformat())
+
+    def test_rolled_back_write_publishes_nothing(self):
+        from django.db import transaction
+        published, patcher = self._published()
+        with patcher, self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Appointment.objects.create(barbershop=self.shop, barber=self.barber, client_name='X', date=timezone.now())
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(published, [])
+
+    def test_local_broker_delivers_across_threads(self):
+        """publish de outra thread chega à fila certa; fila cheia marca overflow (resync)"""
+        import asyncio
+        from . import events
+
+        async def scenario():
+            broker = events.LocalBroker()
+            async with broker.subscribe('barbershop:1') as sub, broker.subscribe('barbershop:2') as other:
+                await asyncio.to_thread(broker.publish, 'barbershop:1', {'type': 'slots.changed'})
+                self.assertEqual(await sub.get(timeout=1), {'type': 'slots.changed'})
+                self.assertIsNone(await other.get(timeout=0.05))
+                for i in range(events.SUBSCRIBER_QUEUE_SIZE + 1):
+                    broker.publish('barbershop:1', {'type': 'x', 'n': i})
+                await asyncio.sleep(0)
+                self.assertTrue(sub.overflowed)
+            self.assertEqual(broker.subscriber_count(), 0)
+
+        asyncio.run(scenario())
+
+    async def test_stream_requires_barber_token(self):
+        response = await self.async_client.get('/api/events/', headers={'X-Barbershop-Slug': 'live'})
+        self.assertEqual(response.status_code, 403)
+
+    async def _ticket(self):
+        from asgiref.sync import sync_to_async
+        from rest_framework_simplejwt.tokens import RefreshToken
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.user).access_token))()
+        response = await self.async_client.post(
+            '/api/events/ticket/', headers={'Authorization': f'Bearer {token}', 'X-Barbershop-Slug': 'live'}
+        )
+        self.assertEqual(response.status_code, 200)
+        return token, response.json()['ticket']
+
+    async def test_stream_ticket_is_single_use(self):
+        """O JWT não abre o stream pela URL; o ticket abre uma vez só"""
+        token, ticket = await self._ticket()
+        headers = {'X-Barbershop-Slug': 'live'}
+        self.assertEqual((await self.async_client.get('/api/events/', {'token': token}, headers=headers)).status_code, 403)
+        self.assertEqual((await self.async_client.get('/api/events/', {'ticket': 'inventado'}, headers=headers)).status_code, 403)
+        response = await self.async_client.get('/api/events/', {'ticket': ticket}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        await response.streaming_content.aclose()
+        self.assertEqual((await self.async_client.get('/api/events/', {'ticket': ticket}, headers=headers)).status_code, 403)
+
+    async def test_stream_delivers_filtered_events(self):
+        """Ticket na query (EventSource), filtro por barbeiro e eventos no formato SSE"""
+        import asyncio
+        from .events import get_broker, tenant_channel
+
+        _, ticket = await self._ticket()
+        response = await self.async_client.get(
+            '/api/events/', {'ticket': ticket, 'barber': self.barber.id}, headers={'X-Barbershop-Slug': 'live'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+
+        stream = aiter(response.streaming_content)
+        self.assertIn(b'retry:', await anext(stream))
+        channel = tenant_channel(self.shop.id)
+        get_broker().publish(channel, {'type': 'appointment.created', 'appointment_id': 1, 'barber_id': self.other_barber.id})
+        get_broker().publish(channel, {'type': 'appointment.created', 'appointment_id': 2, 'barber_id': self.barber.id})
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        self.assertTrue(chunk.startswith(b'event: appointment.created\ndata: '))
+        self.assertIn(b'"appointment_id": 2', chunk)
+        await stream.aclose()
+
+
+class PublicAsyncReadTests(TestCase):
+    def setUp(self):
+        from .models import Barbershop, ScheduleException
+        self.user = User.objects.create_user(username='barber_public', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Pública', slug='publica', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Público', email='pub@t.com', buffer_minutes=0)
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+        self.day = timezone.localdate() + timedelta(days=7)
+        Availability.objects.create(
+            barbershop=self.shop, barber=self.barber, day_of_week=(self.day.weekday() + 1) % 7,
+            start_time=time(9, 0), end_time=time(12, 0),
+        )
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, client_name='Ocupado', status='confirmed',
+            date=timezone.make_aware(datetime.combine(self.day, time(10, 0))),
+        )
+        TimeSlot.objects.create(appointment=apt, start_time=apt.date, end_time=apt.date + timedelta(minutes=30))
+        ScheduleException.objects.create(
+            barbershop=self.shop, barber=self.barber, date=self.day, type='blocked',
+            start_time=time(11, 0), end_time=time(12, 0), reason='Almoço',
+        )
+
+    def test_async_slots_match_sync_path(self):
+        """A view assíncrona devolve exatamente o cálculo síncrono (agendamento e bloqueio parcial respeitados)"""
+        slots, reason = BookingService.get_available_slots(self.shop, self.barber.id, str(self.service.id), self.day)
+        expected = [s.strftime('%H:%M') for s in slots]
+        self.assertEqual(expected, ['09:00', '09:15', '09:30', '10:30'])
+
+        response = self.client.get('/api/b/publica/public/available-slots/', {
+            'barberId': self.barber.id, 'serviceIds': self.service.id, 'date': self.day.isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'available_slots': expected, 'block_reason': reason})
+
+        response = self.client.get('/api/b/publica/public/available-slots/', {'barberId': self.barber.id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_compute_does_not_touch_database(self):
+        inputs = BookingService.load_slot_inputs(self.shop, self.barber.id, [self.service.id], self.day)
+        with self.assertNumQueries(0):
+            slots, _ = BookingService.compute_available_slots(inputs, self.day)
+        self.assertEqual(len(slots), 4)
+
+        inputs['day_block'] = ['Feriado']
+        self.assertEqual(BookingService.compute_available_slots(inputs, self.day), ([], 'Feriado'))
+
+    async def test_public_reads(self):
+        """Config, serviços, barbeiros e manifest pelo caminho assíncrono, isolados por barbearia"""
+        response = await self.async_client.get('/api/b/publica/public/config/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slug'], 'publica')
+
+        services = (await self.async_client.get('/api/b/publica/public/services/')).json()
+        self.assertEqual([s['name'] for s in services], ['Corte'])
+        self.assertEqual(services[0]['price'], 40.0)
+
+        barbers = (await self.async_client.get('/api/b/publica/public/barbers/')).json()
+        self.assertEqual([b['name'] for b in barbers], ['Barbeiro Público'])
+
+        response = await self.async_client.get('/api/public/config/', {'barbershop_slug': 'publica'})
+        self.assertEqual(response.json()['name'], 'Barbearia Pública')
+        response = await self.async_client.get('/api/b/nao-existe/public/services/')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post('/api/b/publica/public/services/')
+        self.assertEqual(response.status_code, 405)
+
+        manifest = (await self.async_client.get('/api/pwa-manifest/publica/')).json()
+        self.assertEqual(manifest['start_url'], '/b/publica/')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop, Product
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_pages', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Páginas', slug='paginas', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Páginas', email='pag@t.com')
+        self.client.force_authenticate(user=self.user)
+        base = timezone.now()
+        # Empates de data no meio: o id desempata sem pular nem repetir linhas
+        dates = [base, base, base - timedelta(hours=1), base - timedelta(hours=1), base - timedelta(hours=2)]
+        self.appointments = [
+            Appointment.objects.create(barbershop=self.shop, barber=self.barber, client_name=f'C{i}', date=d)
+            for i, d in enumerate(dates)
+        ]
+        for i in range(3):
+            Product.objects.create(barbershop=self.shop, name=f'Produto {i}', category='venda', cost_price=10)
+
+    def _walk(self, url, limit):
+        ids, cursor, pages = [], None, 0
+        while True:
+            params = {'limit': limit}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [str(row['id']) for row in response.data['results']]
+            cursor = response.data['next_cursor']
+            pages += 1
+            if not cursor:
+                return ids, pages
+
+    def test_walks_all_rows_newest_first(self):
+        ids, pages = self._walk('/api/appointments/', 2)
+        expected = sorted(self.appointments, key=lambda a: (a.date, a.id), reverse=True)
+        self.assertEqual(ids, [str(a.id) for a in expected])
+        self.assertEqual(pages, 3)
+
+        ids, _ = self._walk('/api/products/', 2)
+        self.assertEqual(len(ids), 3)
+
+    def test_limits_and_invalid_cursor(self):
+        response = self.client.get('/api/appointments/', {'limit': 201})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'INVALID_PARAMS')
+        response = self.client.get('/api/appointments/', {'cursor': 'lixo'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'INVALID_CURSOR')
+        self.assertEqual(len(self.client.get('/api/appointments/').data['results']), 5)
+
+    def test_legacy_mode_returns_capped_list(self):
+        """Cabeçalho de compatibilidade: lista simples, cortada no limite com aviso"""
+        from unittest import mock
+        from .pagination import KeysetPagination
+        response = self.client.get('/api/appointments/', HTTP_X_PAGINATION='legacy')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 5)
+        self.assertNotIn('X-Result-Truncated', response)
+
+        with mock.patch.object(KeysetPagination, 'LEGACY_MAX_ROWS', 3):
+            response = self.client.get('/api/appointments/', HTTP_X_PAGINATION='legacy')
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response['X-Result-Truncated'], 'true')
+
+    def test_ordering_only_in_legacy_mode(self):
+        """?ordering= é recusado com cursor e respeitado na lista simples"""
+        response = self.client.get('/api/products/', {'ordering': 'name'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'INVALID_PARAMS')
+
+        response = self.client.get('/api/products/', {'ordering': '-name'}, HTTP_X_PAGINATION='legacy')
+        self.assertEqual([p['name'] for p in response.data], ['Produto 2', 'Produto 1', 'Produto 0'])
+        response = self.client.get('/api/products/', {'ordering': 'name'}, HTTP_X_PAGINATION='legacy')
+        self.assertEqual([p['name'] for p in response.data], ['Produto 0', 'Produto 1', 'Produto 2'])
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_sparse', password='password', email='sparse@t.com')
+        self.shop = Barbershop.objects.create(name='Barbearia Enxuta', slug='enxuta', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Enxuto', email='enx@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+        self.client.force_authenticate(user=self.user)
+        self.headers = {'HTTP_X_BARBERSHOP_SLUG': 'enxuta'}
+
+    def _create_appointments(self, count):
+        for i in range(count):
+            apt = Appointment.objects.create(
+                barbershop=self.shop, barber=self.barber, client_name=f'Cliente {i}',
+                date=timezone.now() + timedelta(hours=i),
+            )
+            apt.services.add(self.service)
+
+    def test_calendar_fields_only_load_needed_columns(self):
+        """?fields= reduz a resposta e o SELECT; número de queries não cresce com as linhas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._create_appointments(2)
+        params = {'fields': 'id,date,barberId,status'}
+        self.client.get('/api/appointments/', params, **self.headers)  # perfil do usuário fica em cache
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get('/api/appointments/', params, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'date', 'barberId', 'status'})
+        select = next(q['sql'] for q in few.captured_queries if 'FROM "api_appointment"' in q['sql'])
+        self.assertNotIn('client_name', select)
+
+        self._create_appointments(3)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get('/api/appointments/', params, **self.headers)
+        self.assertEqual(len(many), len(few))
+
+        # Representação completa: serviços pré-carregados em uma query, sem N+1
+        with CaptureQueriesContext(connection) as full:
+            response = self.client.get('/api/appointments/', **self.headers)
+        self.assertEqual(response.data['results'][0]['service_names'], 'Corte')
+        self.assertLessEqual(len(full), len(few) + 1)
+
+    def test_expand_nested_user(self):
+        barber = self.client.get('/api/barbers/', **self.headers).data[0]
+        self.assertEqual(barber['user'], self.user.id)
+        barber = self.client.get('/api/barbers/', {'expand': 'user', 'fields': 'id,name,user'}, **self.headers).data[0]
+        self.assertEqual(set(barber), {'id', 'name', 'user'})
+        self.assertEqual(barber['user']['email'], 'sparse@t.com')
+
+    def test_unknown_fields_rejected(self):
+        response = self.client.get('/api/services/', {'fields': 'id,senha'}, **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'INVALID_FIELDS')
+        response = self.client.get('/api/barbers/', {'expand': 'barbershop'}, **self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+class ORJSONRendererTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_json', password='password', email='json@t.com')
+        self.shop = Barbershop.objects.create(name='Barbearia Ágil', slug='agil', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Ágil', email='agil@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte Navalhado', price='42.50', duration=30)
+        self.client.force_authenticate(user=self.user)
+        self.headers = {'HTTP_X_BARBERSHOP_SLUG': 'agil'}
+
+    def test_same_output_as_drf_renderer(self):
+        """Decimal, datetime (UTC com Z), date, UUID e acentos saem iguais ao JSONRenderer do DRF"""
+        import json
+        import uuid
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        from .serializers import AppointmentSerializer
+        apt = Appointment.objects.create(
+            barbershop=self.shop, barber=self.barber, client_name='João', date=timezone.now().replace(microsecond=0),
+        )
+        apt.services.add(self.service)
+        data = {
+            'appointment': AppointmentSerializer(apt).data,
+            'raw': {'price': Decimal('42.50'), 'when': timezone.now(), 'day': timezone.localdate(), 'token': uuid.uuid4()},
+        }
+        fast = ORJSONRenderer().render(data)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertIn('"price":42.5', fast.decode())
+        self.assertTrue(json.loads(fast)['raw']['when'].endswith('Z'))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_api_round_trip(self):
+        response = self.client.get('/api/services/', **self.headers)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()[0]['price'], 42.5)
+        response = self.client.post(
+            '/api/services/', data='{"name": "Barba", "price": 30.5, "duration": 20}',
+            content_type='application/json', **self.headers,
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['name'], 'Barba')
+
+    def test_malformed_json_returns_400(self):
+        response = self.client.post(
+            '/api/services/', data='{"name": ', content_type='application/json', **self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+
+
+class ConditionalConfigTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from .models import Barbershop
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='barber_etag', password='password', email='etag@t.com')
+        self.shop = Barbershop.objects.create(name='Barbearia Estável', slug='estavel', owner=self.user)
+        self.barber = Barber.objects.create(user=self.user, barbershop=self.shop, name='Barbeiro Estável', email='est@t.com')
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+
+    def test_not_modified_without_queries(self):
+        for url in ['/api/b/estavel/services/', '/api/b/estavel/barbers/', '/api/b/estavel/loyalty-rewards/',
+                    '/api/b/estavel/config/', '/api/b/estavel/public/config/', '/api/pwa-manifest/estavel/']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('s-maxage=', response['Cache-Control'])
+            self.assertIn('must-revalidate', response['Cache-Control'])
+            etag = response['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_writes_change_etag(self):
+        from .models import LoyaltyReward
+        url = '/api/b/estavel/services/'
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get('/api/b/estavel/barbers/')['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, {'search': 'Corte'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LoyaltyReward.objects.create(barbershop=self.shop, name='Corte Grátis', points_required=100, type='service')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Leituras e escritas fora da configuração não mudam a versão
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(barbershop=self.shop, barber=self.barber, client_name='Cliente', date=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_barbershop_update_refreshes_cached_lookup(self):
+        url = '/api/b/estavel/public/config/'
+        first = self.client.get(url)
+        self.assertEqual(first.json()['name'], 'Barbearia Estável')
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/b/estavel/config/', {'name': 'Barbearia Nova', 'slug': 'nova'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/b/nova/public/config/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Barbearia Nova')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_write_methods_and_errors_have_no_etag(self):
+        response = self.client.get('/api/b/inexistente/services/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/b/estavel/services/', {'name': 'Barba', 'price': 30, 'duration': 20}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_trial_days_left_changes_with_etag_day(self):
+        """trial_days_left vira à meia-noite local, no mesmo momento em que muda o dia do ETag"""
+        from unittest import mock
+        from .models import Barbershop
+        from .serializers import BarbershopSerializer
+        Barbershop.objects.filter(id=self.shop.id).update(created_at=timezone.make_aware(datetime(2026, 1, 10, 20, 0)))
+        self.shop.refresh_from_db()
+        url = '/api/b/estavel/public/config/'
+
+        def read(hour, day=11):
+            with mock.patch('django.utils.timezone.now', return_value=timezone.make_aware(datetime(2026, 1, day, hour, 0))):
+                response = self.client.get(url)
+                return BarbershopSerializer(self.shop).data['trial_days_left'], response['ETag']
+
+        morning, evening = read(8), read(21)
+        self.assertEqual(morning, evening)
+        self.assertEqual(morning[0], 14)
+        self.assertEqual(read(21, day=10)[0], 15)
+        self.assertNotEqual(read(21, day=10)[1], morning[1])
+
+
+class BookingBootstrapTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .models import Barbershop, ScheduleException
+        cache.clear()
+        self.user = User.objects.create_user(username='barber_boot', password='password')
+        self.shop = Barbershop.objects.create(name='Barbearia Inicial', slug='inicial', owner=self.user)
+        self.barber = Barber.objects.create(barbershop=self.shop, name='Barbeiro A', email='a@boot.com', buffer_minutes=0)
+        self.other = Barber.objects.create(barbershop=self.shop, name='Barbeiro B', email='b@boot.com', buffer_minutes=0)
+        Barber.objects.create(barbershop=self.shop, name='Inativo', email='c@boot.com', is_active=False)
+        self.service = Service.objects.create(barbershop=self.shop, name='Corte', price=40, duration=30)
+        Service.objects.create(barbershop=self.shop, name='Pacote', price=90, duration=90)
+        Service.objects.create(barbershop=self.shop, name='Antigo', price=10, duration=15, is_active=False)
+        self.open_day = timezone.localdate() + timedelta(days=2)
+        self.blocked_day = timezone.localdate() + timedelta(days=3)
+        for day in (self.open_day, self.blocked_day):
+            for barber in (self.barber, self.other):
+                Availability.objects.create(
+                    barbershop=self.shop, barber=barber, day_of_week=(day.weekday() + 1) % 7,
+                    start_time=time(9, 0), end_time=time(10, 0),
+                )
+        ScheduleException.objects.create(barbershop=self.shop, barber=None, date=self.blocked_day, type='blocked', reason='Feriado')
+        self.url = '/api/b/inicial/public/bootstrap/'
+
+    def _fill(self, barber, day):
+        """Ocupa o expediente (9h-10h) do barbeiro no dia"""
+        with self.captureOnCommitCallbacks(execute=True):
+            apt = Appointment.objects.create(
+                barbershop=self.shop, barber=barber, client_name='Ocupado', status='confirmed',
+                date=timezone.make_aware(datetime.combine(day, time(9, 0))),
+            )
+            TimeSlot.objects.create(appointment=apt, start_time=apt.date, end_time=apt.date + timedelta(hours=1))
+
+    def test_payload_matches_per_day_slots(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['barbershop']['slug'], 'inicial')
+        self.assertEqual({s['name'] for s in data['services']}, {'Corte', 'Pacote'})
+        self.assertEqual({b['name'] for b in data['barbers']}, {'Barbeiro A', 'Barbeiro B'})
+        self.assertEqual(len(data['availability']), 7)
+        self.assertEqual(data['availability'][self.open_day.isoformat()], {'has_slots': True, 'barbers': [self.barber.id, self.other.id]})
+        self.assertEqual(data['availability'][self.blocked_day.isoformat()], {'has_slots': False, 'barbers': []})
+
+        # Mesmo resultado do cálculo por barbeiro/dia com o serviço mais curto
+        for offset in range(7):
+            day = timezone.localdate() + timedelta(days=offset)
+            expected = [
+                b.id for b in (self.barber, self.other)
+                if BookingService.get_available_slots(self.shop, b.id, str(self.service.id), day)[0]
+            ]
+            self.assertEqual(data['availability'][day.isoformat()]['barbers'], expected)
+
+    def test_fixed_query_count_and_cache(self):
+        self.client.get('/api/b/inicial/public/config/')  # barbearia no cache de slugs
+        with self.assertNumQueries(6):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+        # Mais barbeiros e agenda não aumentam o número de consultas
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(3):
+                barber = Barber.objects.create(barbershop=self.shop, name=f'Extra {i}', email=f'x{i}@boot.com')
+                Availability.objects.create(
+                    barbershop=self.shop, barber=barber, day_of_week=(self.open_day.weekday() + 1) % 7,
+                    start_time=time(9, 0), end_time=time(18, 0),
+                )
+        with self.assertNumQueries(6):
+            data = self.client.get(self.url).json()
+        self.assertEqual(len(data['barbers']), 5)
+
+    def test_schedule_events_invalidate_cache(self):
+        day = self.open_day.isoformat()
+        self.assertTrue(self.client.get(self.url).json()['availability'][day]['has_slots'])
+        self._fill(self.barber, self.open_day)
+        self.assertEqual(self.client.get(self.url).json()['availability'][day]['barbers'], [self.other.id])
+        self._fill(self.other, self.open_day)
+        self.assertFalse(self.client.get(self.url).json()['availability'][day]['has_slots'])
+
+    def test_status_changes_invalidate_cache(self):
+        """pending -> confirmed passa a ocupar o horário e confirmed -> completed o libera"""
+        day = self.open_day.isoformat()
+        with self.captureOnCommitCallbacks(execute=True):
+            apt = Appointment.objects.create(
+                barbershop=self.shop, barber=self.barber, client_name='Pendente', status='pending',
+                date=timezone.make_aware(datetime.combine(self.open_day, time(9, 0))),
+            )
+            TimeSlot.objects.create(appointment=apt, start_time=apt.date, end_time=apt.date + timedelta(hours=1))
+        self.assertEqual(self.client.get(self.url).json()['availability'][day]['barbers'], [self.barber.id, self.other.id])
+
+        for status, barbers in (('confirmed', [self.other.id]), ('completed', [self.barber.id, self.other.id])):
+            apt = Appointment.objects.get(id=apt.id)
+            apt.status = status
+            with self.captureOnCommitCallbacks(execute=True):
+                apt.save()
+            self.assertEqual(self.client.get(self.url).json()['availability'][day]['barbers'], barbers, status)
+
+    def test_unknown_barbershop(self):
+        self.assertEqual(self.client.get('/api/b/inexistente/public/bootstrap/').status_code, 404)
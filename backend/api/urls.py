@@ -6,9 +6,11 @@ from .views import (
     ScheduleExceptionViewSet, TransactionViewSet, PromotionViewSet,
     ProductViewSet, whatsapp_login, get_me, current_barbershop,
     n8n_today_summary, n8n_next_appointments, barber_register, owner_login, DailyAvailabilityViewSet,
-    check_cpf, pwa_manifest, forgot_password_request, reset_password_confirm
+    check_cpf, forgot_password_request, reset_password_confirm, analytics, changes,
+    events_stream, events_ticket
 )
 from .webhooks import cacto_webhook
+from . import public
 from rest_framework_simplejwt.views import TokenRefreshView
 
 router = DefaultRouter()
@@ -31,10 +33,14 @@ urlpatterns = [
     path('auth/check-cpf/', check_cpf, name='check-cpf'),
     path('auth/forgot-password/', forgot_password_request, name='forgot-password'),
     path('auth/reset-password/', reset_password_confirm, name='reset-password'),
-    path('pwa-manifest/', pwa_manifest, name='pwa-manifest-default'),
-    path('pwa-manifest/<str:slug>/', pwa_manifest, name='pwa-manifest'),
+    path('pwa-manifest/', public.pwa_manifest, name='pwa-manifest-default'),
+    path('pwa-manifest/<str:slug>/', public.pwa_manifest, name='pwa-manifest'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('auth/me/', get_me, name='get-me'),
+    path('analytics/', analytics, name='analytics'),
+    path('changes/', changes, name='changes'),
+    path('events/ticket/', events_ticket, name='events-ticket'),
+    path('events/', events_stream, name='events-stream'),
     
     # n8n / AI Endpoints
     path('n8n/today-summary/', n8n_today_summary, name='n8n-today-summary'),
@@ -43,6 +49,13 @@ urlpatterns = [
     # Webhooks
     path('webhooks/cacto/', cacto_webhook, name='cacto-webhook'),
     
+    # Leituras públicas assíncronas (página de agendamento)
+    path('public/bootstrap/', public.booking_bootstrap, name='public-bootstrap'),
+    path('public/config/', public.barbershop_config, name='public-config'),
+    path('public/services/', public.service_list, name='public-services'),
+    path('public/barbers/', public.barber_list, name='public-barbers'),
+    path('public/available-slots/', public.available_slots, name='public-available-slots'),
+
     path('config/', current_barbershop, name='current-barbershop'),
     path('', include(router.urls)),
 ]
@@ -1,43 +1,128 @@
-import sys
+import math
+import os
 from PIL import Image, ImageOps
 from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.exceptions import ValidationError
 
-def compress_image(image, quality=70, max_width=800):
+# Orçamento padrão de pixels decodificados (~48 MP); o valor efetivo vem de settings.IMAGE_MAX_PIXELS
+IMAGE_MAX_PIXELS = 50_000_000
+
+# Orientações EXIF em que largura e altura trocam de lugar após o exif_transpose
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def open_for_resize(source, max_width, max_pixels=IMAGE_MAX_PIXELS):
     """
-    Comprime e redimensiona uma imagem para otimizar o carregamento.
-    Corrige a orientação EXIF e usa JPEG Progressivo.
+    Abre a imagem decodificando o mínimo possível para chegar em `max_width`.
+    Só o cabeçalho é lido antes de checar o orçamento de pixels; JPEGs são
+    decodificados direto em escala reduzida (1/2, 1/4, 1/8) via draft mode.
     """
-    if not image:
-        return None
-    
-    # Abre a imagem usando Pillow
-    img = Image.open(image)
+    img = Image.open(source)
+    width, height = img.size
+    if width * height > max_pixels:
+        img.close()
+        raise ImageTooLarge(f"Imagem com {width}x{height} pixels excede o limite de {max_pixels}")
+
+    if img.format == 'JPEG':
+        # A largura final pode ser a altura do arquivo se o EXIF indicar rotação
+        final_width = height if img.getexif().get(0x0112, 1) in ROTATED_ORIENTATIONS else width
+        scale = max_width / float(final_width)
+        if scale < 1:
+            # draft escolhe a menor escala que ainda cobre o tamanho pedido
+            img.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
 
     # Corrige a orientação baseada no EXIF (evita imagem deitada)
-    img = ImageOps.exif_transpose(img)
-    
+    return ImageOps.exif_transpose(img)
+
+
+def resize_to_width(img, max_width):
+    """Redimensiona proporcionalmente se for maior que max_width (nunca amplia)"""
+    if img.width <= max_width:
+        return img
+    height = int(float(img.height) * (max_width / float(img.width)))
+    # reducing_gap faz um reduce() inteiro antes do LANCZOS em formatos sem draft (PNG, WebP)
+    return img.resize((max_width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def validate_image_pixels(image):
+    """Validador de upload: recusa imagens acima do orçamento lendo só o cabeçalho"""
+    from django.conf import settings
+    if not image:
+        return
+    max_pixels = getattr(settings, 'IMAGE_MAX_PIXELS', IMAGE_MAX_PIXELS)
+    position = image.tell()
+    try:
+        with Image.open(image) as img:
+            width, height = img.size
+    except Image.DecompressionBombError:
+        width = height = max_pixels
+    except OSError:
+        # Arquivo que não é imagem: o próprio ImageField já recusa
+        return
+    finally:
+        image.seek(position)
+    if width * height > max_pixels:
+        raise ValidationError(
+            f"A imagem excede o limite de {max_pixels // 1_000_000} megapixels.",
+            code='IMAGE_TOO_LARGE'
+        )
+
+
+def optimize_image(source, quality=70, max_width=800, max_pixels=IMAGE_MAX_PIXELS):
+    """
+    Redimensiona e recodifica uma imagem como JPEG progressivo.
+    `source` pode ser um caminho ou um objeto arquivo; retorna um BytesIO.
+    """
+    img = open_for_resize(source, max_width, max_pixels)
+
     # Converte RGBA para RGB se necessário (para JPG)
-    if img.mode in ("RGBA", "P"):
+    if img.mode in ("RGBA", "P", "LA"):
         img = img.convert("RGB")
-    
-    # Redimensiona proporcionalmente se for maior que max_width
-    if img.width > max_width:
-        ratio = max_width / float(img.width)
-        height = int(float(img.height) * float(ratio))
-        img = img.resize((max_width, height), Image.Resampling.LANCZOS)
-    
+
+    img = resize_to_width(img, max_width)
+
     # Salva em um buffer BytesIO
     output = BytesIO()
     img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
     output.seek(0)
-    
-    # Retorna como um arquivo Django pronto para ser salvo no ImageField
-    return InMemoryUploadedFile(
-        output,
-        'ImageField',
-        f"{image.name.split('.')[0]}.jpg",
-        'image/jpeg',
-        sys.getsizeof(output),
-        None
-    )
+    return output
+
+def process_image_file(src_path, dst_path, quality=70, max_width=800, max_pixels=IMAGE_MAX_PIXELS):
+    """
+    Versão para o pool de processos: lê o original do disco e grava o JPEG
+    otimizado em `dst_path`. Não depende do Django (roda em processo filho).
+    """
+    output = optimize_image(src_path, quality=quality, max_width=max_width, max_pixels=max_pixels)
+    with open(dst_path, 'wb') as f:
+        f.write(output.getbuffer())
+    return dst_path
+
+VARIANT_SAVE_OPTIONS = {
+    'jpg': {'format': 'JPEG', 'quality': 75, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+def render_variant(src_path, dst_path, width, fmt, max_pixels=IMAGE_MAX_PIXELS):
+    """
+    Gera uma variante responsiva (largura + formato) a partir do original.
+    Nunca amplia a imagem. Também roda no pool de processos do backfill.
+    """
+    img = open_for_resize(src_path, width, max_pixels)
+
+    if fmt == 'jpg' and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif img.mode == "P":
+        img = img.convert("RGBA")
+
+    img = resize_to_width(img, width)
+
+    # Grava em arquivo temporário e troca atomicamente (requisições concorrentes)
+    tmp_path = f"{dst_path}.{os.getpid()}.tmp"
+    img.save(tmp_path, **VARIANT_SAVE_OPTIONS[fmt])
+    os.replace(tmp_path, dst_path)
+    return dst_path
@@ -22,6 +22,8 @@ from .serializers import (
     ScheduleExceptionSerializer, TransactionSerializer, PromotionSerializer,
     ProductSerializer, BarberSerializer, DailyAvailabilitySerializer
 )
+from .conditional import ConditionalConfigMixin, conditional_config
+from .pagination import KeysetPagination
 from .services import BookingService, WebhookService
 from datetime import datetime
 from django.utils import timezone
@@ -31,7 +33,37 @@ from django.conf import settings
 import uuid
 from .pix import generate_pix_qr_code
 
-class TenantModelViewSet(viewsets.ModelViewSet):
+class SparseFieldsetViewMixin:
+    """
+    ?fields=id,date,... e ?expand=user nas leituras: os valores vão para o contexto
+    do serializer e, em list/retrieve, a queryset carrega só o necessário
+    (select/prefetch das relações usadas e only() quando há ?fields=).
+    """
+    def _csv_param(self, name):
+        value = self.request.query_params.get(name, '')
+        return frozenset(part.strip() for part in value.split(',') if part.strip())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.method == 'GET':
+            context['fields'] = self._csv_param('fields')
+            context['expand'] = self._csv_param('expand')
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in ('list', 'retrieve'):
+            serializer = self.get_serializer()
+            if hasattr(serializer, 'optimize_queryset'):
+                # A paginação por cursor lê a chave da última linha
+                extra = [self.keyset_field] if getattr(self, 'keyset_field', None) else []
+                queryset = serializer.optimize_queryset(
+                    queryset, narrow=bool(serializer.context.get('fields')), extra=extra
+                )
+        return queryset
+
+
+class TenantModelViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """Mixin para filtrar automaticamente por barbearia (tenant)"""
     def get_queryset(self):
         barbershop = getattr(self.request, 'barbershop', None)
@@ -66,6 +98,7 @@ class TenantModelViewSet(viewsets.ModelViewSet):
         
         serializer.save(barbershop=barbershop)
 
+@conditional_config
 @api_view(['GET', 'PATCH'])
 @permission_classes([AllowAny])
 def current_barbershop(request, barbershop_slug=None):
@@ -103,6 +136,9 @@ def current_barbershop(request, barbershop_slug=None):
         return Response(serializer.data)
         
     elif request.method == 'PATCH':
+        # A instância do middleware pode vir do cache de slugs: edita a linha atual do banco
+        barbershop.refresh_from_db()
+
         # RECUPERAÇÃO DE ACESSO: Se o usuário logado não é o dono, mas estamos em ambiente de desenvolvimento/lab,
         # permitimos o ajuste automático da propriedade para o usuário ID 1 (principal admin).
         if request.user.id == 1 and barbershop.owner_id != 1:
@@ -503,65 +539,216 @@ def reset_password_confirm(request, **kwargs):
     return Response({"success": True, "message": "Senha alterada com sucesso!"})
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def analytics(request, **kwargs):
+    """
+    Séries para os gráficos do dono: faturamento por barbeiro, agendamentos por dia
+    da semana, ocupação e finanças.
+
+    Query: start/end (YYYY-MM-DD, padrão últimos 30 dias) e bucket=day|week|month.
+    A resposta fica em cache por barbearia e bucket até a próxima alteração.
+    """
+    from datetime import timedelta
+    from django.core.cache import cache
+    from .analytics import ANALYTICS_CACHE_TIMEOUT, BUCKETS, MAX_RANGE_DAYS, build_analytics
+    from .caching import tenant_cache_key
+
+    barbershop = getattr(request, 'barbershop', None)
+    if not barbershop and hasattr(request.user, 'barber_profile'):
+        barbershop = request.user.barber_profile.barbershop
+    if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != barbershop:
+        return Response({"detail": "Sem permissão"}, status=403)
+
+    bucket = request.query_params.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return Response({"error": "INVALID_BUCKET", "message": "Use day, week ou month."}, status=400)
+    try:
+        end = datetime.strptime(request.query_params['end'], '%Y-%m-%d').date() if request.query_params.get('end') else timezone.localdate()
+        start = datetime.strptime(request.query_params['start'], '%Y-%m-%d').date() if request.query_params.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return Response({"error": "INVALID_DATE_FORMAT"}, status=400)
+    if end < start or (end - start).days >= MAX_RANGE_DAYS:
+        return Response({"error": "INVALID_DATE_RANGE", "message": f"Intervalo máximo de {MAX_RANGE_DAYS} dias."}, status=400)
+
+    key = tenant_cache_key(barbershop.id, 'analytics', bucket, start.isoformat(), end.isoformat())
+    data = cache.get(key)
+    if data is None:
+        data = build_analytics(barbershop, start, end, bucket)
+        cache.set(key, data, ANALYTICS_CACHE_TIMEOUT)
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def changes(request, **kwargs):
+    """
+    Sincronização incremental de agendamentos, clientes, serviços e produtos.
+
+    Query: since (token da chamada anterior; sem ele, só devolve o token inicial,
+    que deve ser pedido antes de carregar as listas) e types (lista separada por
+    vírgula). Token expirado ou delta grande demais: 410, recarregar as listas.
+    """
+    from .changes import SyncError, collect_changes, parse_types
+
+    barbershop = getattr(request, 'barbershop', None)
+    if not barbershop and hasattr(request.user, 'barber_profile'):
+        barbershop = request.user.barber_profile.barbershop
+        request.barbershop = barbershop
+    if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != barbershop:
+        return Response({"detail": "Sem permissão"}, status=403)
+
+    try:
+        types = parse_types(request.query_params.get('types'))
+        data = collect_changes(request, barbershop, request.query_params.get('since'), types)
+    except SyncError as e:
+        return Response({"error": e.code, "message": e.message}, status=e.status)
+    return Response(data)
+
+
+def _stream_barbershop(request):
+    """Autentica o stream (Bearer ou ?ticket= de events/ticket/) e devolve a barbearia do barbeiro"""
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+    from .events import redeem_stream_ticket
+
+    barbershop = getattr(request, 'barbershop', None)
+    ticket = request.GET.get('ticket')
+    if ticket:
+        redeemed = redeem_stream_ticket(ticket)
+        if redeemed is None:
+            return None
+        _, barbershop_id = redeemed
+        if barbershop is None:
+            barbershop = Barbershop.objects.filter(id=barbershop_id, is_active=True).first()
+        return barbershop if barbershop and barbershop.id == barbershop_id else None
+
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    if not header:
+        return None
+    try:
+        user = auth.get_user(auth.get_validated_token(auth.get_raw_token(header)))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    if not hasattr(user, 'barber_profile'):
+        return None
+    barbershop = barbershop or user.barber_profile.barbershop
+    if user.barber_profile.barbershop != barbershop:
+        return None
+    return barbershop
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def events_ticket(request, **kwargs):
+    """Ticket de uso único (SSE_TICKET_SECONDS) para abrir /events com EventSource: GET /events/?ticket=..."""
+    from .events import issue_stream_ticket
+
+    barbershop = getattr(request, 'barbershop', None)
+    if not hasattr(request.user, 'barber_profile'):
+        return Response({"detail": "Sem permissão"}, status=403)
+    barber = request.user.barber_profile
+    if barbershop and barber.barbershop_id != barbershop.id:
+        return Response({"detail": "Sem permissão"}, status=403)
+    ticket = issue_stream_ticket(request.user.id, barber.barbershop_id)
+    return Response({"ticket": ticket, "expires_in": settings.SSE_TICKET_SECONDS})
+
+
+async def events_stream(request, **kwargs):
+    """
+    Eventos ao vivo da agenda (Server-Sent Events) da barbearia.
+
+    Query: ticket (de POST events/ticket/, se não houver Authorization; o JWT não
+    vai na URL) e barber (só eventos desse barbeiro). Eventos: appointment.created/cancelled/completed/updated/deleted,
+    slots.changed e resync (eventos perdidos: recarregar a agenda). Um comentário
+    de heartbeat é enviado a cada SSE_HEARTBEAT_SECONDS e a conexão é encerrada
+    após SSE_MAX_STREAM_SECONDS (o navegador reconecta sozinho).
+    """
+    import asyncio
+    import json
+    from asgiref.sync import sync_to_async
+    from django.http import JsonResponse, StreamingHttpResponse
+    from .events import get_broker, tenant_channel
+
+    barbershop = await sync_to_async(_stream_barbershop)(request)
+    if barbershop is None:
+        return JsonResponse({"detail": "Sem permissão"}, status=403)
+    barber_id = request.GET.get('barber')
+    if barber_id and not barber_id.isdigit():
+        return JsonResponse({"error": "INVALID_PARAMS", "message": "'barber' deve ser um id."}, status=400)
+    barber_id = int(barber_id) if barber_id else None
+
+    heartbeat = settings.SSE_HEARTBEAT_SECONDS
+    subscription = get_broker().subscribe(tenant_channel(barbershop.id))
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SSE_MAX_STREAM_SECONDS
+        async with subscription:
+            yield f"retry: {settings.SSE_RETRY_MS}\n: conectado\n\n"
+            while loop.time() < deadline:
+                event = await subscription.get(timeout=min(heartbeat, max(deadline - loop.time(), 0)))
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield 'event: resync\ndata: {}\n\n'
+                if event is None:
+                    yield ': heartbeat\n\n'
+                    continue
+                # slots.changed sem barbeiro (ex.: disponibilidade geral) vale para todos
+                if barber_id and event.get('barber_id') not in (None, barber_id):
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx não deve bufferizar o stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def n8n_today_summary(request, **kwargs):
-    """Resumo simplificado para n8n/IA"""
+    """Resumo simplificado para n8n/IA (cacheado por barbearia e dia)"""
+    from .n8n import today_summary
+
     barbershop = request.barbershop
     if not barbershop:
         return Response({"error": "TENANT_REQUIRED"}, status=400)
-    
-    from datetime import date
-    from django.db.models import Count, Sum
-    
-    today = date.today()
-    appointments = Appointment.objects.filter(barbershop=barbershop, date__date=today)
-    
-    summary = {
-        "barbershop": barbershop.name,
-        "date": today.isoformat(),
-        "total_appointments": appointments.count(),
-        "confirmed": appointments.filter(status='confirmed').count(),
-        "completed": appointments.filter(status='completed').count(),
-        "cancelled": appointments.filter(status='cancelled').count(),
-        "revenue_today": Transaction.objects.filter(
-            barbershop=barbershop, 
-            date__date=today, 
-            type='income', 
-            status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-    }
-    
-    return Response(summary)
+
+    return Response(today_summary(barbershop))
+
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def n8n_next_appointments(request, **kwargs):
-    """Próximos agendamentos formatados para IA ler facilmente"""
+    """
+    Próximos agendamentos formatados para IA ler facilmente.
+
+    Query: hours (horizonte, padrão 168), limit (padrão 10, máx. 100) e cursor
+    (valor de `next_cursor` da página anterior). Responde 304 quando o ETag
+    enviado em If-None-Match ainda vale.
+    """
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from .n8n import FeedError, NextAppointmentsFeed
+
     barbershop = request.barbershop
     if not barbershop:
         return Response({"error": "TENANT_REQUIRED"}, status=400)
-    
-    now = timezone.now()
-    appointments = Appointment.objects.filter(
-        barbershop=barbershop, 
-        date__gte=now, 
-        status='confirmed'
-    ).order_by('date')[:10]
-    
-    data = []
-    for app in appointments:
-        data.append({
-            "id": str(app.id),
-            "client": app.client_name,
-            "service": app.service.name,
-            "barber": app.barber.name,
-            "time": app.date.strftime("%H:%M"),
-            "date": app.date.strftime("%d/%m/%Y"),
-            "whatsapp": app.customer.phone if app.customer else "N/A"
-        })
-        
-    return Response({"appointments": data})
+
+    try:
+        feed = NextAppointmentsFeed(barbershop, request.query_params)
+    except FeedError as e:
+        return Response({"error": e.code, "message": e.message}, status=400)
+
+    etag = feed.etag()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = Response(feed.page())
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @api_view(['GET'])
@@ -578,6 +765,7 @@ def get_me(request, **kwargs):
         profile_id = barber.id
         extra_data = {
             'profile_picture': barber.profile_picture.url if barber.profile_picture else None,
+            'image_status': barber.image_status,
             'full_name': barber.name,
             'email': barber.email,
             'whatsapp': barber.whatsapp,
@@ -596,6 +784,7 @@ def get_me(request, **kwargs):
         extra_data = {
             'birth_date': customer.birth_date,
             'profile_picture': customer.profile_picture.url if customer.profile_picture else None,
+            'image_status': customer.image_status,
             'phone': customer.phone,
             'full_name': customer.name,
             'barbershop_slug': last_stat.barbershop.slug if last_stat else None
@@ -634,13 +823,13 @@ def check_cpf(request, barbershop_slug=None, *args, **kwargs):
     return Response({"message": "CPF não encontrado"}, status=404)
 
 
-class BarberViewSet(TenantModelViewSet):
+class BarberViewSet(ConditionalConfigMixin, TenantModelViewSet):
     queryset = Barber.objects.all()
     serializer_class = BarberSerializer
     permission_classes = [AllowAny]
 
 
-class ServiceViewSet(TenantModelViewSet):
+class ServiceViewSet(ConditionalConfigMixin, TenantModelViewSet):
     """ViewSet para gerenciar serviços"""
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
@@ -650,7 +839,7 @@ class ServiceViewSet(TenantModelViewSet):
     ordering_fields = ['name', 'price', 'created_at']
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """ViewSet para gerenciar clientes (Global, mas vinculado ao Tenant)"""
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
@@ -658,6 +847,8 @@ class CustomerViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'phone']
     ordering_fields = ['name']
+    pagination_class = KeysetPagination
+    keyset_field = 'created_at'
 
     def get_queryset(self):
         barbershop = getattr(self.request, 'barbershop', None)
@@ -678,26 +869,29 @@ class CustomerViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def redeem_points(self, request, pk=None):
         """Resgatar pontos de fidelidade na barbearia atual"""
+        from .services import LoyaltyService
+
         customer = self.get_object()
         barbershop = request.barbershop
-        cb = CustomerBarbershop.objects.filter(customer=customer, barbershop=barbershop).first()
-        
-        if not cb:
-            return Response({'success': False, 'error': 'Cliente não vinculado a esta barbearia'}, status=400)
 
         try:
             points_to_redeem = int(request.data.get('points', 0))
         except (ValueError, TypeError):
             return Response({'success': False, 'error': 'Valor de pontos inválido'}, status=400)
-        
-        if cb.points >= points_to_redeem:
-            cb.points -= points_to_redeem
-            cb.save()
-            return Response({'success': True, 'remaining_points': cb.points})
+        if points_to_redeem <= 0:
+            return Response({'success': False, 'error': 'Valor de pontos inválido'}, status=400)
+
+        # Débito condicional no banco: duas requisições simultâneas não gastam o mesmo saldo
+        remaining = LoyaltyService.redeem_points(customer.id, barbershop.id, points_to_redeem)
+        if remaining is not None:
+            return Response({'success': True, 'remaining_points': remaining})
+
+        if not CustomerBarbershop.objects.filter(customer=customer, barbershop=barbershop).exists():
+            return Response({'success': False, 'error': 'Cliente não vinculado a esta barbearia'}, status=400)
         return Response({'success': False, 'error': 'Pontos insuficientes'}, status=400)
 
 
-class LoyaltyRewardViewSet(TenantModelViewSet):
+class LoyaltyRewardViewSet(ConditionalConfigMixin, TenantModelViewSet):
     """ViewSet para recompensas de fidelidade"""
     queryset = LoyaltyReward.objects.all()
     serializer_class = LoyaltyRewardSerializer
@@ -705,6 +899,44 @@ class LoyaltyRewardViewSet(TenantModelViewSet):
     ordering_fields = ['points_required', 'created_at']
 
 
+PIX_SHEET_CHARGES_PER_PAGE = 6
+
+
+def _render_pix_sheet(barbershop, appointments, charges):
+    """Gera, em streaming, uma folha HTML imprimível com uma cobrança Pix por cartão"""
+    from django.utils.html import escape
+
+    yield (
+        '<!DOCTYPE html><html lang="pt-br"><head><meta charset="utf-8">'
+        f'<title>Cobranças Pix - {escape(barbershop.name)}</title>'
+        '<style>'
+        'body{font-family:sans-serif;margin:0}'
+        '.page{display:grid;grid-template-columns:1fr 1fr;gap:12px;padding:12px;page-break-after:always}'
+        '.card{border:1px dashed #999;padding:8px;text-align:center}'
+        '.card img{width:180px;height:180px}'
+        '.code{font-family:monospace;font-size:8px;word-break:break-all}'
+        '</style></head><body>'
+    )
+    for index, (appointment, (pix_code, qr_code_base64)) in enumerate(zip(appointments, charges)):
+        if index % PIX_SHEET_CHARGES_PER_PAGE == 0:
+            if index:
+                yield '</div>'
+            yield '<div class="page">'
+        yield (
+            '<div class="card">'
+            f'<strong>{escape(appointment.client_name)}</strong><br>'
+            f'{timezone.localtime(appointment.date).strftime("%d/%m %H:%M")} - '
+            f'R$ {float(appointment.total_price or 0):.2f}<br>'
+            f'<img src="{qr_code_base64}" alt="QR Code Pix"><br>'
+            f'<small>{escape(appointment.payment_id)}</small>'
+            f'<div class="code">{escape(pix_code)}</div>'
+            '</div>'
+        )
+    if appointments:
+        yield '</div>'
+    yield '</body></html>'
+
+
 class AppointmentViewSet(TenantModelViewSet):
     """ViewSet para gerenciar agendamentos"""
     queryset = Appointment.objects.all()
@@ -713,6 +945,8 @@ class AppointmentViewSet(TenantModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'platform', 'date']
     ordering_fields = ['date', 'created_at']
+    pagination_class = KeysetPagination
+    keyset_field = 'date'
 
     def get_queryset(self):
         """
@@ -733,6 +967,33 @@ class AppointmentViewSet(TenantModelViewSet):
         # Ordenar por data decrescente (mais recentes primeiro)
         return queryset.order_by('-date')
 
+    @action(detail=False, methods=['get'])
+    def export(self, request, barbershop_slug=None):
+        """
+        Exporta o histórico de agendamentos em streaming.
+
+        Query: fmt=csv|xlsx (padrão csv), start/end (YYYY-MM-DD), status e platform.
+        """
+        from .exports import (
+            APPOINTMENT_EXPORT_HEADER, EXPORT_FORMATS, ExportError, appointment_rows,
+            filter_date_range, streaming_export,
+        )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        barbershop = getattr(request, 'barbershop', None)
+        if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != barbershop:
+            return Response({"detail": "Sem permissão"}, status=403)
+
+        fmt = request.query_params.get('fmt', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return Response({"error": "INVALID_FORMAT", "message": "Formatos aceitos: csv, xlsx"}, status=400)
+        try:
+            queryset = filter_date_range(queryset, request.query_params)
+        except ExportError as e:
+            return Response({"error": e.code, "message": e.message}, status=400)
+
+        return streaming_export(APPOINTMENT_EXPORT_HEADER, appointment_rows(queryset), fmt, f"agendamentos-{barbershop.slug}")
+
     def create(self, request, *args, **kwargs):
         barbershop = request.barbershop
         barber_id = request.data.get('barberId')
@@ -831,6 +1092,45 @@ class AppointmentViewSet(TenantModelViewSet):
         serializer = self.get_serializer(appointment)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk_complete(self, request, barbershop_slug=None):
+        """
+        Conclui vários agendamentos de uma vez (fechamento do dia).
+
+        Body: {"ids": [1, 2, ...]} ou {"date": "YYYY-MM-DD"}, opcionalmente com "barberId".
+        """
+        self.get_queryset()
+        barbershop = getattr(request, 'barbershop', None)
+        if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != barbershop:
+            return Response({"detail": "Sem permissão"}, status=403)
+
+        ids = request.data.get('ids')
+        date_str = request.data.get('date')
+        if ids is None and not date_str:
+            return Response({"error": "MISSING_PARAMS", "message": "Informe 'ids' ou 'date'."}, status=400)
+
+        day = None
+        barber_id = request.data.get('barberId')
+        try:
+            if barber_id not in (None, ''):
+                barber_id = int(barber_id)
+            if ids is not None:
+                if not isinstance(ids, list):
+                    raise ValueError
+                ids = [int(i) for i in ids]
+            if date_str:
+                day = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return Response({
+                "error": "INVALID_PARAMS",
+                "message": "Use uma lista de ids, a data no formato YYYY-MM-DD e barberId numérico.",
+            }, status=400)
+
+        completed = BookingService.complete_appointments(
+            barbershop, appointment_ids=ids, day=day, barber_id=barber_id or None
+        )
+        return Response({"completed": len(completed), "ids": completed})
+
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Retorna os agendamentos de hoje"""
@@ -913,6 +1213,111 @@ class AppointmentViewSet(TenantModelViewSet):
         except Exception as e:
             return Response({"error": "PIX_GENERATION_FAILED", "message": str(e)}, status=500)
 
+    @action(detail=False, methods=['post'], url_path='pix-batch')
+    def pix_batch(self, request, barbershop_slug=None):
+        """
+        Gera cobranças Pix para todos os agendamentos de um período (abertura do caixa).
+
+        Parâmetros (query ou corpo): start, end (YYYY-MM-DD, padrão hoje),
+        output=list|sheet e qr=true|false (apenas para output=list).
+        """
+        from datetime import timedelta
+        from django.db import transaction
+        from django.db.models import Sum
+        from django.http import StreamingHttpResponse
+        from .pix import generate_pix_batch
+
+        barbershop = getattr(request, 'barbershop', None)
+        if not barbershop and hasattr(request.user, 'barber_profile'):
+            barbershop = request.user.barber_profile.barbershop
+        if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != barbershop:
+            return Response({"detail": "Sem permissão"}, status=403)
+
+        if not barbershop.pix_key:
+            return Response({"error": "PIX_KEY_NOT_CONFIGURED", "message": "Barbearia não configurou chave Pix."}, status=400)
+
+        params = request.data if request.data else request.query_params
+        try:
+            start = datetime.strptime(params.get('start'), '%Y-%m-%d').date() if params.get('start') else timezone.localdate()
+            end = datetime.strptime(params.get('end'), '%Y-%m-%d').date() if params.get('end') else start
+        except ValueError:
+            return Response({"error": "INVALID_DATE_FORMAT"}, status=400)
+        if end < start or end - start > timedelta(days=31):
+            return Response({"error": "INVALID_DATE_RANGE", "message": "Intervalo máximo de 31 dias."}, status=400)
+
+        output = params.get('output', 'list')
+        render_qr = output == 'sheet' or str(params.get('qr', 'true')).lower() not in ['false', '0']
+
+        # Limites do dia local como datetimes: usa o índice (barbershop, date), ao contrário de date__date
+        tz = timezone.get_current_timezone()
+        appointments = list(
+            Appointment.objects.filter(
+                barbershop=barbershop,
+                date__gte=timezone.make_aware(datetime.combine(start, datetime.min.time()), tz),
+                date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz),
+            )
+            .exclude(status__in=['cancelled', 'blocked'])
+            .exclude(payment_status='PAID')
+            .annotate(total_price=Sum('services__price'))
+            .only('id', 'client_name', 'date', 'payment_id', 'payment_status')
+            .order_by('date')
+        )
+
+        # Um único UPDATE em lote para os que ainda não tinham cobrança. As linhas
+        # são travadas e relidas: dois lotes simultâneos não geram payment_ids
+        # diferentes para o mesmo agendamento (o segundo reaproveita o do primeiro)
+        pending = [a for a in appointments if a.payment_status == 'PENDING']
+        if pending:
+            with transaction.atomic():
+                current = {
+                    id: (payment_id, payment_status)
+                    for id, payment_id, payment_status in Appointment.objects.select_for_update()
+                    .filter(id__in=[a.id for a in pending]).values_list('id', 'payment_id', 'payment_status')
+                }
+                to_update = []
+                for appointment in pending:
+                    appointment.payment_id, appointment.payment_status = current.get(
+                        appointment.id, (appointment.payment_id, appointment.payment_status)
+                    )
+                    if appointment.payment_status == 'PENDING':
+                        appointment.payment_status = 'WAITING_PAYMENT'
+                        if not appointment.payment_id:
+                            appointment.payment_id = f"AGEND-{uuid.uuid4().hex[:8].upper()}"
+                        to_update.append(appointment)
+                if to_update:
+                    Appointment.objects.bulk_update(to_update, ['payment_id', 'payment_status'])
+
+        charges = generate_pix_batch(
+            key=barbershop.pix_key,
+            name=barbershop.name,
+            city=barbershop.address[:15] if barbershop.address else "SAO PAULO",
+            charges=[(a.total_price or 0, a.payment_id) for a in appointments],
+            render_qr=render_qr
+        )
+
+        if output == 'sheet':
+            response = StreamingHttpResponse(
+                _render_pix_sheet(barbershop, appointments, charges),
+                content_type='text/html; charset=utf-8'
+            )
+            response['Content-Disposition'] = f'inline; filename="pix-{start.isoformat()}.html"'
+            return response
+
+        items = []
+        for appointment, (pix_code, qr_code_base64) in zip(appointments, charges):
+            item = {
+                "id": str(appointment.id),
+                "client": appointment.client_name,
+                "time": timezone.localtime(appointment.date).strftime('%d/%m %H:%M'),
+                "amount": float(appointment.total_price or 0),
+                "payment_id": appointment.payment_id,
+                "brcode": pix_code,
+            }
+            if qr_code_base64:
+                item["qr_code_base64"] = qr_code_base64
+            items.append(item)
+        return Response({"count": len(items), "charges": items})
+
     @action(detail=True, methods=['post'], url_path='confirm-payment')
     def confirm_payment(self, request, pk=None, barbershop_slug=None):
         """Confirma manualmente o pagamento de um agendamento"""
@@ -922,21 +1327,9 @@ class AppointmentViewSet(TenantModelViewSet):
         if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != appointment.barbershop:
              return Response({"detail": "Sem permissão"}, status=403)
 
-        appointment.payment_status = 'PAID'
-        # Removemos o appointment.status = 'confirmed' para não alterar o status do agendamento, 
-        # apenas o status do pagamento.
-        appointment.save()
-        
-        # Opcional: Criar transação financeira
-        from .models import Transaction
-        Transaction.objects.create(
-            barbershop=appointment.barbershop,
-            category='service',
-            amount=sum([s.price for s in appointment.services.all()]),
-            type='income',
-            description=f"Pagamento Confirmado - {appointment.client_name}",
-            date=timezone.now()
-        )
+        # Altera apenas o status do pagamento (não o do agendamento); a receita é
+        # criada uma única vez por agendamento, mesmo com confirmações repetidas
+        appointment = BookingService.confirm_payment(appointment.id)
 
         # Retorna o agendamento atualizado para o frontend
         serializer = self.get_serializer(appointment)
@@ -1123,36 +1516,100 @@ class TransactionViewSet(TenantModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['type', 'status', 'category', 'payment_method']
     ordering_fields = ['date', 'amount', 'created_at']
+    pagination_class = KeysetPagination
+    keyset_field = 'date'
 
     @action(detail=False, methods=['get'])
-    def summary(self, request):
-        """Retorna resumo financeiro"""
-        from django.db.models import Sum
-        from datetime import date, timedelta
-        
-        barbershop = request.barbershop
-        thirty_days_ago = date.today() - timedelta(days=30)
-        recent_transactions = self.get_queryset().filter(date__gte=thirty_days_ago)
-        
-        total_income = recent_transactions.filter(
-            type='income', status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        total_expense = recent_transactions.filter(
-            type='expense', status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        pending_expense = recent_transactions.filter(
-            type='expense', status='pending'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
+    def summary(self, request, *args, **kwargs):
+        """
+        Retorna resumo financeiro dos últimos `days` dias (padrão 30, máx. 3650).
+        Lido dos rollups diários em uma única query, sem varrer as transações.
+        """
+        from django.db.models import Q, Sum
+        from datetime import timedelta
+        from .models import DailyFinancialRollup
+
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 3650)
+        except ValueError:
+            return Response({"error": "INVALID_DAYS", "message": "days deve ser um número inteiro"}, status=400)
+
+        self.get_queryset()  # resolve a barbearia do contexto
+        barbershop = getattr(request, 'barbershop', None)
+        since = timezone.localdate() - timedelta(days=days)
+
+        totals = DailyFinancialRollup.objects.filter(barbershop=barbershop, day__gte=since).aggregate(
+            total_income=Sum('total', filter=Q(type='income', status='paid'), default=0),
+            total_expense=Sum('total', filter=Q(type='expense', status='paid'), default=0),
+            pending_expense=Sum('total', filter=Q(type='expense', status='pending'), default=0),
+        )
+
         return Response({
-            'total_income': float(total_income),
-            'total_expense': float(total_expense),
-            'pending_expense': float(pending_expense),
-            'balance': float(total_income - total_expense)
+            'total_income': float(totals['total_income']),
+            'total_expense': float(totals['total_expense']),
+            'pending_expense': float(totals['pending_expense']),
+            'balance': float(totals['total_income'] - totals['total_expense'])
         })
 
+    @action(detail=False, methods=['post'])
+    def reconcile(self, request, *args, **kwargs):
+        """
+        Concilia pagamentos Pix a partir de um extrato bancário (CSV ou OFX).
+
+        Multipart: file (obrigatório), statement_format=csv|ofx (padrão: pela extensão),
+        dry_run=true para apenas simular e accept_mismatch=true para dar baixa
+        também nos lançamentos com valor abaixo do esperado.
+        """
+        from .reconciliation import reconcile_statement, detect_format
+
+        barbershop = getattr(request, 'barbershop', None)
+        if not barbershop and hasattr(request.user, 'barber_profile'):
+            barbershop = request.user.barber_profile.barbershop
+        if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != barbershop:
+            return Response({"detail": "Sem permissão"}, status=403)
+
+        statement = request.FILES.get('file')
+        if not statement:
+            return Response({"error": "FILE_REQUIRED", "message": "Envie o extrato no campo 'file'."}, status=400)
+
+        fmt = request.data.get('statement_format') or detect_format(statement.name)
+        if fmt not in ['csv', 'ofx']:
+            return Response({"error": "INVALID_FORMAT", "message": "Formatos aceitos: csv, ofx"}, status=400)
+        dry_run = str(request.data.get('dry_run', 'false')).lower() in ['true', '1']
+        accept_mismatch = str(request.data.get('accept_mismatch', 'false')).lower() in ['true', '1']
+
+        result = reconcile_statement(barbershop, statement, fmt=fmt, dry_run=dry_run, accept_mismatch=accept_mismatch)
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """
+        Exporta o histórico de transações em streaming.
+
+        Query: fmt=csv|xlsx (padrão csv), start/end (YYYY-MM-DD) e os mesmos
+        filtros da listagem (type, status, category, payment_method).
+        """
+        from .exports import (
+            EXPORT_FORMATS, TRANSACTION_EXPORT_COLUMNS, ExportError, filter_date_range,
+            streaming_export, transaction_rows,
+        )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        barbershop = getattr(request, 'barbershop', None)
+        if not hasattr(request.user, 'barber_profile') or request.user.barber_profile.barbershop != barbershop:
+            return Response({"detail": "Sem permissão"}, status=403)
+
+        fmt = request.query_params.get('fmt', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return Response({"error": "INVALID_FORMAT", "message": "Formatos aceitos: csv, xlsx"}, status=400)
+        try:
+            queryset = filter_date_range(queryset, request.query_params)
+        except ExportError as e:
+            return Response({"error": e.code, "message": e.message}, status=400)
+
+        header = [label for _, label in TRANSACTION_EXPORT_COLUMNS]
+        return streaming_export(header, transaction_rows(queryset), fmt, f"transacoes-{barbershop.slug}")
+
 
 class PromotionViewSet(TenantModelViewSet):
     """ViewSet para promoções"""
@@ -1171,63 +1628,6 @@ class PromotionViewSet(TenantModelViewSet):
         return Response(serializer.data)
 
 
-from django.http import JsonResponse
-
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def pwa_manifest(request, slug=None):
-    """
-    Retorna o manifest.json dinâmico baseado no slug da barbearia.
-    """
-    from .models import Barbershop
-    
-    # Valores padrão
-    name = "AutoOpera"
-    short_name = "AutoOpera"
-    start_url = "/"
-    theme_color = "#0F4C5C"
-    icon_src = "/src/assets/autoopera-logo.png" # Ícone padrão do app
-    
-    if slug:
-        try:
-            barbershop = Barbershop.objects.get(slug=slug)
-            name = barbershop.name
-            short_name = barbershop.name[:12]
-            start_url = f"/b/{slug}/"
-            if barbershop.logo:
-                # Forçamos o caminho relativo para evitar localhost:8000 no manifest
-                from urllib.parse import urlparse
-                icon_src = urlparse(barbershop.logo.url).path
-        except Barbershop.DoesNotExist:
-            pass
-            
-    manifest = {
-        "name": name,
-        "short_name": short_name,
-        "description": f"{name} | Agendamento Online",
-        "start_url": start_url,
-        "display": "standalone",
-        "background_color": "#F5F5F5",
-        "theme_color": theme_color,
-        "orientation": "portrait",
-        "icons": [
-            {
-                "src": icon_src,
-                "sizes": "192x192",
-                "type": "image/png",
-                "purpose": "any maskable"
-            },
-            {
-                "src": icon_src,
-                "sizes": "512x512",
-                "type": "image/png",
-                "purpose": "any maskable"
-            }
-        ]
-    }
-    return JsonResponse(manifest)
-
-
 class ProductViewSet(TenantModelViewSet):
     """ViewSet para controle de estoque per-barbershop"""
     queryset = Product.objects.all()
@@ -1237,6 +1637,8 @@ class ProductViewSet(TenantModelViewSet):
     filterset_fields = ['category']
     search_fields = ['name']
     ordering_fields = ['name', 'stock', 'created_at']
+    pagination_class = KeysetPagination
+    keyset_field = 'created_at'
 
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
@@ -1245,3 +1647,18 @@ class ProductViewSet(TenantModelViewSet):
         low_stock_products = self.get_queryset().filter(stock__lte=F('min_stock'))
         serializer = self.get_serializer(low_stock_products, many=True)
         return Response(serializer.data)
+
+
+def image_variant(request, path):
+    """Serve uma variante responsiva de imagem, gerando e gravando em disco na primeira requisição"""
+    from django.http import Http404
+    from .images import ensure_variant, parse_variant_name, VARIANT_PREFIX
+    from .media import serve_file
+    from .storage import is_hashed_name
+
+    name = VARIANT_PREFIX + path
+    if not ensure_variant(name):
+        raise Http404("Variante inválida")
+    # Original com nome por hash: a variante também nunca muda de conteúdo
+    immutable = is_hashed_name(parse_variant_name(name)[0])
+    return serve_file(request, settings.MEDIA_ROOT, name, settings.MEDIA_ACCEL_PREFIX, immutable=immutable)
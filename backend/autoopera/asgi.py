@@ -2,6 +2,9 @@
 ASGI config for autoopera project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+In production uvicorn serves only the async routes (the SSE stream in
+api.views.events_stream and the api.public reads) next to the gunicorn WSGI
+app, which keeps the sync API and its streaming exports.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -91,16 +91,34 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
     'x-barbershop-slug',
+    'x-pagination',
 ]
 CORS_EXPOSE_HEADERS = [
     'Authorization',
     'Content-Type',
     'X-Barbershop-Slug',
+    'X-Result-Truncated',
 ]
 
+# JSON da API: 'orjson' (padrão, api.renderers) ou 'stdlib' (JSONRenderer/JSONParser do DRF)
+JSON_BACKEND = os.environ.get('JSON_BACKEND', 'orjson')
+JSON_BACKEND_CLASSES = {
+    'orjson': ('api.renderers.ORJSONRenderer', 'api.renderers.ORJSONParser'),
+    'stdlib': ('rest_framework.renderers.JSONRenderer', 'rest_framework.parsers.JSONParser'),
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': None,
+    'DEFAULT_RENDERER_CLASSES': [
+        JSON_BACKEND_CLASSES[JSON_BACKEND][0],
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        JSON_BACKEND_CLASSES[JSON_BACKEND][1],
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
@@ -142,6 +160,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'autoopera.wsgi.application'
+ASGI_APPLICATION = 'autoopera.asgi.application'
 
 
 # Database
@@ -201,7 +220,8 @@ STATIC_ROOT = os.environ.get('STATIC_ROOT', str(BASE_DIR_BACKEND / "backend_stat
 
 STORAGES = {
     "default": {
-        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        # Nomes por hash do conteúdo: deduplica uploads e permite cache imutável
+        "BACKEND": "api.storage.ContentAddressedStorage",
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
@@ -214,6 +234,11 @@ WHITENOISE_USE_FINDERS = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.environ.get('MEDIA_ROOT', str(BASE_DIR_BACKEND / "media"))
 
+# Entrega de arquivos via nginx: o Django responde só com X-Accel-Redirect para estas locations internas
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', 'False') == 'True'
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+STATIC_ACCEL_PREFIX = '/protected-static/'
+
 # Garantir que o Django não anexe o host local nas URLs das imagens
 # Isso força o DRF a usar caminhos relativos na rede local
 USE_X_FORWARDED_HOST = True
@@ -226,4 +251,60 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Upload limits
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
+# Uploads acima de 2.5MB vão para arquivo temporário em disco em vez de ficar em memória
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5MB
+FILE_UPLOAD_TEMP_DIR = os.environ.get('FILE_UPLOAD_TEMP_DIR') or None
+
+# Orçamento de pixels por imagem (protege contra decompression bombs)
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', '50000000'))
+
+# Cache compartilhado entre os workers: Redis se REDIS_URL estiver definido (requer o pacote redis),
+# senão arquivos em disco (mesmo host)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', '/tmp/autoopera-cache'),
+        }
+    }
+
+# Configuração pública da barbearia (config/serviços/barbeiros/recompensas/manifest): ETag por versão;
+# s-maxage para o proxy_cache do nginx e TTL do cache slug -> barbearia do middleware
+CONFIG_CACHE_SECONDS = int(os.environ.get('CONFIG_CACHE_SECONDS', '30'))
+BARBERSHOP_CACHE_SECONDS = int(os.environ.get('BARBERSHOP_CACHE_SECONDS', '300'))
+# Carga inicial da página de agendamento (public/bootstrap/): invalidada por escritas; o TTL cobre
+# os horários de hoje que passam
+BOOTSTRAP_CACHE_SECONDS = int(os.environ.get('BOOTSTRAP_CACHE_SECONDS', '60'))
+
+# Pix em lote: número de processos para renderizar QR Codes (padrão: nº de CPUs)
+PIX_BATCH_WORKERS = int(os.environ.get('PIX_BATCH_WORKERS', '0')) or None
+
+# Fidelidade: pontos não utilizados expiram após N dias (manage.py expire_loyalty_points)
+LOYALTY_POINTS_EXPIRY_DAYS = int(os.environ.get('LOYALTY_POINTS_EXPIRY_DAYS', '365'))
+
+# Sincronização incremental (/changes): por quantos dias as exclusões ficam registradas
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# Eventos ao vivo (/events, SSE): broker em memória (um processo) ou
+# 'api.events.PostgresBroker' (NOTIFY/LISTEN, vários workers/containers). Com o
+# stream no uvicorn e as escritas no gunicorn, use o PostgresBroker nos dois
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'api.events.LocalBroker')
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', '3600'))
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', '3000'))
+# Validade do ticket de uso único que abre o stream pelo EventSource (POST /events/ticket/)
+SSE_TICKET_SECONDS = int(os.environ.get('SSE_TICKET_SECONDS', '60'))
+
+# Processamento de imagens fora da requisição (pool de processos)
+IMAGE_PROCESSING_ASYNC = os.environ.get('IMAGE_PROCESSING_ASYNC', 'True') == 'True'
+IMAGE_PROCESSING_WORKERS = int(os.environ.get('IMAGE_PROCESSING_WORKERS', '2'))
+
+# Larguras das variantes responsivas (srcset) geradas sob demanda em media/variants/
+IMAGE_VARIANT_WIDTHS = (96, 192, 400, 800, 1200)
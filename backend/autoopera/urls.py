@@ -1,8 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.conf import settings
-from django.conf.urls.static import static
-from django.views.static import serve
+from api.media import media_file, static_file
+from api.views import image_variant
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,8 +9,10 @@ urlpatterns = [
     path('api/b/<slug:barbershop_slug>/', include('api.urls')),
 ]
 
-# Configuração para servir mídia e estáticos no Django (funciona em produção)
+# Mídia e estáticos: em produção o Django só autoriza/resolve e o nginx envia o arquivo (X-Accel-Redirect)
 urlpatterns += [
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-    re_path(r'^static/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
+    # Variantes responsivas: o nginx serve as já geradas; as que faltam caem aqui e são criadas
+    re_path(r'^media/variants/(?P<path>.*)$', image_variant),
+    re_path(r'^media/(?P<path>.*)$', media_file),
+    re_path(r'^static/(?P<path>.*)$', static_file),
 ]
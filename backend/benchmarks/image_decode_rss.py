@@ -0,0 +1,76 @@
+"""
+Pico de memória (RSS) para otimizar uma foto grande, antes e depois do decode limitado.
+
+Cada variante roda num processo separado para que o pico de uma não contamine a outra.
+
+    python benchmarks/image_decode_rss.py [--megapixels 48] [--max-width 800]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def full_decode(path, max_width):
+    """Caminho antigo: decodifica na resolução nativa e só então redimensiona"""
+    from io import BytesIO
+    from PIL import Image, ImageOps
+    img = ImageOps.exif_transpose(Image.open(path))
+    if img.mode in ("RGBA", "P", "LA"):
+        img = img.convert("RGB")
+    if img.width > max_width:
+        img = img.resize((max_width, int(img.height * max_width / img.width)), Image.Resampling.LANCZOS)
+    img.save(BytesIO(), format='JPEG', quality=70, optimize=True, progressive=True)
+
+
+def bounded_decode(path, max_width):
+    from api.utils import optimize_image
+    optimize_image(path, max_width=max_width)
+
+
+def child(mode, path, max_width):
+    sys.path.insert(0, BACKEND_DIR)
+    {'full': full_decode, 'bounded': bounded_decode}[mode](path, max_width)
+    # ru_maxrss em KB no Linux
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megapixels', type=float, default=48)
+    parser.add_argument('--max-width', type=int, default=800)
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.max_width)
+        return
+
+    width = int((args.megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+    fd, path = tempfile.mkstemp(suffix='.jpg')
+    os.close(fd)
+    # Gera a imagem em outro processo: no Linux o ru_maxrss do pai vaza para os filhos via fork
+    subprocess.run(
+        [sys.executable, '-c', f"from PIL import Image; Image.effect_noise(({width}, {height}), 64).convert('RGB').save({path!r}, quality=90)"],
+        check=True
+    )
+
+    try:
+        print(f"Imagem: {width}x{height} ({os.path.getsize(path) / 1024 / 1024:.1f} MB), max_width={args.max_width}")
+        for mode in ('full', 'bounded'):
+            out = subprocess.run(
+                [sys.executable, __file__, '--max-width', str(args.max_width), '--child', mode, path],
+                capture_output=True, text=True, check=True
+            )
+            print(f"  {mode:<8} pico RSS: {int(out.stdout.strip()) / 1024:.0f} MB")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
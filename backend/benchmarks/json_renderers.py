@@ -0,0 +1,83 @@
+"""
+Renderização e parsing JSON: JSONRenderer/JSONParser do DRF x ORJSONRenderer/
+ORJSONParser (api.renderers), em payloads no formato das listas do painel.
+
+Os payloads imitam a saída dos serializers (datas já em texto ISO, Decimal nos
+preços, strings acentuadas, listas aninhadas) e não tocam no banco. Antes de
+medir, confere que os dois renderers produzem o mesmo JSON.
+
+    python benchmarks/json_renderers.py [--rows 50 200 2000] [--repeat 200]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'autoopera.settings')
+
+
+def appointment_rows(count):
+    start = datetime(2026, 1, 5, 9, 0)
+    return [{
+        'id': i,
+        'barberId': i % 4 + 1,
+        'customerId': i % 300 + 1,
+        'client_name': f'Cliente Número {i}',
+        'clientPhone': f'+55 11 9{i:08d}',
+        'date': (start + timedelta(minutes=30 * i)).isoformat() + 'Z',
+        'status': ['confirmed', 'completed', 'cancelled'][i % 3],
+        'serviceIds': [1, 2] if i % 2 else [1],
+        'service_names': 'Corte, Barba' if i % 2 else 'Corte',
+        'total_price': Decimal('75.00') if i % 2 else Decimal('45.50'),
+        'notes': 'Prefere máquina 2 nas laterais' if i % 5 == 0 else '',
+        'reminder_sent': False,
+    } for i in range(count)]
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[50, 200, 2000])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from api.renderers import ORJSONParser, ORJSONRenderer
+
+    drf_renderer, fast_renderer = JSONRenderer(), ORJSONRenderer()
+    drf_parser, fast_parser = JSONParser(), ORJSONParser()
+
+    print(f"{'linhas':>7} {'KB':>8} {'render DRF':>11} {'render orjson':>14} {'x':>6} {'parse DRF':>10} {'parse orjson':>13} {'x':>6}")
+    for rows in args.rows:
+        payload = {'results': appointment_rows(rows), 'next_cursor': None}
+        body = drf_renderer.render(payload)
+        if json.loads(fast_renderer.render(payload)) != json.loads(body):
+            raise SystemExit("saídas diferentes entre os renderers")
+
+        render_drf = timed(lambda: drf_renderer.render(payload), args.repeat)
+        render_fast = timed(lambda: fast_renderer.render(payload), args.repeat)
+        parse_drf = timed(lambda: drf_parser.parse(io.BytesIO(body), parser_context={}), args.repeat)
+        parse_fast = timed(lambda: fast_parser.parse(io.BytesIO(body)), args.repeat)
+        print(f"{rows:>7} {len(body) / 1024:>8.1f} {render_drf:>9.3f}ms {render_fast:>12.3f}ms {render_drf / render_fast:>5.1f}x"
+              f" {parse_drf:>8.3f}ms {parse_fast:>11.3f}ms {parse_drf / parse_fast:>5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
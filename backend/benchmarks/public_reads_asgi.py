@@ -0,0 +1,185 @@
+"""
+Leituras públicas (config, serviços, barbeiros e horários livres): rotas
+DRF síncronas x views assíncronas de api.public, em req/s e latência p99.
+
+Cada cenário sobe o servidor real num processo separado, aquece, mede o RSS do
+processo principal + workers e dispara carga com conexões keep-alive simultâneas.
+A comparação justa é com a mesma memória: por padrão os dois caminhos rodam no
+mesmo uvicorn (mesmos workers, mesmo RSS); com gunicorn instalado, o caminho
+síncrono também roda em `gunicorn autoopera.wsgi` para referência, e a coluna
+req/s por 100 MB normaliza a diferença de memória entre os servidores.
+
+Usa o banco configurado em DJANGO_SETTINGS_MODULE (rode contra uma base com dados):
+
+    python benchmarks/public_reads_asgi.py --slug minha-barbearia \\
+        [--barber 1 --service 1 --date 2026-11-03] [--workers 2] [--concurrency 64] [--duration 10]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SYNC_PATHS = ['config/', 'services/', 'barbers/', 'appointments/available_slots/']
+ASYNC_PATHS = ['public/config/', 'public/services/', 'public/barbers/', 'public/available-slots/']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_command(kind, port, workers):
+    if kind == 'asgi':
+        return [sys.executable, '-m', 'uvicorn', 'autoopera.asgi:application', '--port', str(port),
+                '--workers', str(workers), '--no-access-log', '--log-level', 'warning']
+    return ['gunicorn', 'autoopera.wsgi:application', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--log-level', 'warning']
+
+
+def tree_rss_mb(pid):
+    """RSS do processo e de todos os descendentes (Linux /proc)"""
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending.extend(int(child) for child in f.read().split())
+        except FileNotFoundError:
+            continue
+    return total_kb / 1024
+
+
+async def request_once(port, path, state):
+    """GET com keep-alive; reabre a conexão se o servidor fechar (gunicorn sync)"""
+    if state.get('writer') is None:
+        state['reader'], state['writer'] = await asyncio.open_connection('127.0.0.1', port)
+    reader, writer = state['reader'], state['writer']
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: keep-alive\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError
+    length, close = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value.strip().lower() == 'close':
+            close = True
+    await reader.readexactly(length)
+    if close:
+        writer.close()
+        state['writer'] = None
+    return int(status_line.split()[1])
+
+
+async def load(port, paths, concurrency, duration):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal errors
+        state = {}
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                status = await request_once(port, path, state)
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                errors += 1
+                state['writer'] = None
+                continue
+            if status >= 400:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        if state.get('writer') is not None:
+            state['writer'].close()
+
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    return latencies, errors
+
+
+def wait_ready(port, path, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            asyncio.run(request_once(port, path, {}))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("servidor não subiu")
+
+
+def run_scenario(label, kind, paths, args):
+    port = free_port()
+    proc = subprocess.Popen(server_command(kind, port, args.workers), cwd=BACKEND_DIR)
+    try:
+        wait_ready(port, paths[0])
+        asyncio.run(load(port, paths, args.concurrency, 2))  # aquecimento
+        rss = tree_rss_mb(proc.pid)
+        latencies, errors = asyncio.run(load(port, paths, args.concurrency, args.duration))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    latencies.sort()
+    rps = len(latencies) / args.duration
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+    print(f"{label:<26} {rps:>9.0f} {p50:>9.1f} {p99:>9.1f} {rss:>9.0f} {rps / rss * 100:>12.0f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--slug', required=True)
+    parser.add_argument('--barber', help='id para o endpoint de horários livres')
+    parser.add_argument('--service', help='id para o endpoint de horários livres')
+    parser.add_argument('--date', help='AAAA-MM-DD para o endpoint de horários livres')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=int, default=10)
+    args = parser.parse_args()
+
+    with_slots = all([args.barber, args.service, args.date])
+    query = '?' + urlencode({'barberId': args.barber, 'serviceIds': args.service, 'date': args.date}) if with_slots else ''
+
+    def urls(paths):
+        prefix = f'/api/b/{args.slug}/'
+        chosen = paths if with_slots else paths[:-1]
+        return [prefix + p + (query if 'slots' in p else '') for p in chosen]
+
+    scenarios = []
+    if shutil.which('gunicorn'):
+        scenarios.append(('wsgi gunicorn / sync', 'wsgi', urls(SYNC_PATHS)))
+    scenarios += [
+        ('asgi uvicorn / sync', 'asgi', urls(SYNC_PATHS)),
+        ('asgi uvicorn / async', 'asgi', urls(ASYNC_PATHS) + [f'/api/pwa-manifest/{args.slug}/']),
+    ]
+
+    print(f"workers={args.workers} concurrency={args.concurrency} duration={args.duration}s")
+    print(f"{'cenário':<26} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'RSS MB':>9} {'req/s/100MB':>12} {'erros':>7}")
+    for label, kind, paths in scenarios:
+        run_scenario(label, kind, paths, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -130,6 +130,27 @@ export const barbershopApi = {
   update: (data: FormData) => api.patch<Barbershop>('/config/', data).then(r => r.data),
 };
 
+// Listas paginadas por cursor no backend: o formato antigo (lista simples, com teto de linhas)
+// continua disponível com este cabeçalho
+const LEGACY_LIST = { headers: { 'X-Pagination': 'legacy' } };
+
+// Leituras da página de agendamento (views assíncronas, sem login)
+export interface BookingBootstrap {
+  barbershop: Barbershop;
+  services: Service[];
+  barbers: Barber[];
+  availability: Record<string, { has_slots: boolean; barbers: number[] }>;
+}
+
+export const publicApi = {
+  getBootstrap: () => api.get<BookingBootstrap>('public/bootstrap/').then(r => r.data),
+  getBarbershop: () => api.get<Barbershop>('public/config/').then(r => r.data),
+  getServices: () => api.get<Service[]>('public/services/').then(r => r.data),
+  getBarbers: () => api.get<Barber[]>('public/barbers/').then(r => r.data),
+  getAvailableSlots: (barberId: string, serviceIds: string, date: string) =>
+    api.get<{available_slots: string[], block_reason: string | null}>('public/available-slots/', { params: { barberId, serviceIds, date } }).then(r => r.data),
+};
+
 export const barbersApi = {
   getAll: () => api.get<Barber[]>('barbers/').then(r => r.data),
   create: (data: Partial<Barber>) => api.post<Barber>('barbers/', data).then(r => r.data),
@@ -145,7 +166,7 @@ export const servicesApi = {
 };
 
 export const customersApi = {
-  getAll: () => api.get<Customer[]>('customers/').then(r => r.data),
+  getAll: () => api.get<Customer[]>('customers/', LEGACY_LIST).then(r => r.data),
   create: (data: Partial<Customer>) => api.post<Customer>('customers/', data).then(r => r.data),
   update: (id: string, data: Partial<Customer>) => api.patch<Customer>(`customers/${id}/`, data).then(r => r.data),
   delete: (id: string) => api.delete(`customers/${id}/`),
@@ -153,7 +174,7 @@ export const customersApi = {
 };
 
 export const appointmentsApi = {
-  getAll: () => api.get<Appointment[]>('appointments/').then(r => r.data),
+  getAll: () => api.get<Appointment[]>('appointments/', LEGACY_LIST).then(r => r.data),
   getToday: () => api.get<Appointment[]>('appointments/today/').then(r => r.data),
   getAvailableSlots: (barberId: string, serviceIds: string, date: string) => 
     api.get<{available_slots: string[], block_reason: string | null}>('appointments/available_slots/', { params: { barberId, serviceIds, date } }).then(r => r.data),
@@ -166,14 +187,14 @@ export const appointmentsApi = {
 };
 
 export const transactionsApi = {
-  getAll: () => api.get<Transaction[]>('transactions/').then(r => r.data),
+  getAll: () => api.get<Transaction[]>('transactions/', LEGACY_LIST).then(r => r.data),
   getSummary: () => api.get('transactions/summary/').then(r => r.data),
   create: (data: Partial<Transaction>) => api.post<Transaction>('transactions/', data).then(r => r.data),
   update: (id: string, data: Partial<Transaction>) => api.patch<Transaction>(`transactions/${id}/`, data).then(r => r.data),
 };
 
 export const productsApi = {
-  getAll: () => api.get<Product[]>('products/').then(r => r.data),
+  getAll: () => api.get<Product[]>('products/', LEGACY_LIST).then(r => r.data),
   getLowStock: () => api.get<Product[]>('products/low_stock/').then(r => r.data),
   create: (data: Partial<Product>) => api.post<Product>('products/', data).then(r => r.data),
   update: (id: string, data: Partial<Product>) => api.put<Product>(`products/${id}/`, data).then(r => r.data),
@@ -7,7 +7,7 @@ import {
   CreditCard, Wallet, Camera, CheckCircle2, Copy, Loader2
 } from 'lucide-react';
 import { useAuth } from '../AuthContext';
-import { servicesApi, barbersApi, appointmentsApi, customersApi, barbershopApi, getMediaUrl } from '../api';
+import { publicApi, barbersApi, appointmentsApi, customersApi, getMediaUrl, BookingBootstrap } from '../api';
 import { Service, Barber, Barbershop } from '../types';
 import { compressImage } from '../utils/image';
 import { format, addDays, startOfToday, isSameDay, isTomorrow } from 'date-fns';
@@ -31,6 +31,7 @@ const CustomerBooking: React.FC = () => {
     const [barbers, setBarbers] = useState<Barber[]>([]);
     const [services, setServices] = useState<Service[]>([]);
     const [barbershop, setBarbershop] = useState<Barbershop | null>(null);
+    const [availability, setAvailability] = useState<BookingBootstrap['availability']>({});
     const [loading, setLoading] = useState(true);
     
     // History states
@@ -77,14 +78,12 @@ const CustomerBooking: React.FC = () => {
     useEffect(() => {
         const loadInitialData = async () => {
             try {
-                const [bData, sData, shopData] = await Promise.all([
-                    barbersApi.getAll(),
-                    servicesApi.getAll(),
-                    barbershopApi.get()
-                ]);
-                setBarbers(bData);
-                setServices(sData);
-                setBarbershop(shopData);
+                // Uma requisição só: barbearia, serviços, barbeiros e dias com horário livre
+                const data = await publicApi.getBootstrap();
+                setBarbers(data.barbers);
+                setServices(data.services);
+                setBarbershop(data.barbershop);
+                setAvailability(data.availability);
             } catch (err) {
                 toast.error("Erro ao carregar dados.");
             } finally {
@@ -108,7 +107,7 @@ const CustomerBooking: React.FC = () => {
             const dateStr = format(selectedDate, 'yyyy-MM-dd');
             const serviceIds = selectedServices.map(s => s.id).join(',');
             // API calls now use serviceIds parameter
-            const data = await appointmentsApi.getAvailableSlots(
+            const data = await publicApi.getAvailableSlots(
                 selectedBarber.id,
                 serviceIds,
                 dateStr
@@ -588,6 +587,9 @@ const CustomerBooking: React.FC = () => {
                                                 {[...Array(14)].map((_, i) => {
                                                     const date = addDays(startOfToday(), i);
                                                     const isActive = isSameDay(date, selectedDate);
+                                                    // Resumo do bootstrap (próximos 7 dias): esmaece dias sem horário para o barbeiro escolhido
+                                                    const dayInfo = availability[format(date, 'yyyy-MM-dd')];
+                                                    const isFull = !!dayInfo && (selectedBarber ? !dayInfo.barbers.includes(Number(selectedBarber.id)) : !dayInfo.has_slots);
                                                     return (
                                                         <button 
                                                             key={i}
@@ -596,7 +598,7 @@ const CustomerBooking: React.FC = () => {
                                                                 isActive 
                                                                 ? 'bg-primary border-primary text-white shadow-xl shadow-primary/20 scale-105' 
                                                                 : 'bg-white border-border text-text/30 hover:border-primary/20'
-                                                            }`}
+                                                            }${isFull && !isActive ? ' opacity-40' : ''}`}
                                                         >
                                                             <span className={`text-[8px] sm:text-[9px] font-black uppercase tracking-widest ${isActive ? 'text-white/60' : 'text-text/20'}`}>
                                                                 {isSameDay(date, startOfToday()) ? 'HOJE' : isTomorrow(date) ? 'AMN' : format(date, 'EEE', { locale: ptBR }).toUpperCase()}